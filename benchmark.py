@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+ECWDA 客户端热点基准测试
+离线运行 (不需要手机和网络)，只测电脑端 CPU 开销：
+截图解码、找色、多点找色、取色/比色、区域统计、模板匹配、投屏缩放和脚本回放
+
+用法:
+    python benchmark.py                           # 默认分辨率，输出表格
+    python benchmark.py --output bench.json       # 同时保存 JSON 结果
+    python benchmark.py --compare bench.json      # 与基线对比，变慢超过阈值时返回 1
+    python benchmark.py --resolutions se 15pm --full --filter find_
+"""
+
+import argparse
+import base64
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Optional, Dict, List, Callable, Any
+
+import PIL
+from PIL import Image, ImageDraw
+
+from ecwda import ECWDA, Frame
+from script_generator import play_actions
+from yolo_tracker import ObjectTracker
+
+
+# 常见 iPhone 分辨率: (点宽, 点高, 倍率)
+RESOLUTIONS = {
+    "se": (375, 667, 2),       # iPhone SE 2/3      750 x 1334
+    "14": (390, 844, 3),       # iPhone 12-14      1170 x 2532
+    "15pm": (430, 932, 3),     # iPhone 15 Pro Max 1290 x 2796
+}
+
+
+def make_screenshot(width: int, height: int, seed: int = 0) -> str:
+    """
+    生成一张接近真实界面的截图 (渐变背景、色块、噪点图片区域)，返回 PNG 的 base64
+
+    纯色图片的 PNG 压缩率远高于真实截图，解码耗时会被低估，所以加入了噪点区域。
+    """
+    rng = random.Random(seed)
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    row = height // 14
+    for i in range(2, 13):
+        y = i * row
+        draw.rectangle((width // 20, y, width - width // 20, y + row - 8), fill=(255, 255, 255))
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((width // 12, y + 10, width // 12 + row - 28, y + row - 18), fill=color)
+    noise = Image.effect_noise((width // 2, height // 5), 64).convert("RGB")
+    img.paste(noise, (width // 4, height // 3))
+    # 多点找色的目标: 红点右侧 10 像素处为绿点
+    draw.rectangle((width - 60, height - 60, width - 56, height - 56), fill=(255, 0, 0))
+    draw.rectangle((width - 50, height - 60, width - 46, height - 56), fill=(0, 255, 0))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+class _OfflineResponse:
+    status_code = 200
+
+    def json(self) -> Dict:
+        return {"value": {}}
+
+
+class OfflineECWDA(ECWDA):
+    """不访问网络的客户端: 截图返回固定图片，YOLO 返回固定结果，输入操作只计数"""
+
+    def __init__(self, img_base64: str, points: tuple):
+        super().__init__("http://offline", cache_profile=False)
+        self.metrics = None
+        self.session_id = "offline"
+        self.routing = "local"
+        self.screen_width, self.screen_height = points
+        self.img_base64 = img_base64
+        self.detections: List[Dict] = []
+        self.inputs = 0
+
+    def screenshot(self, save_path: Optional[str] = None) -> Optional[str]:
+        return self.img_base64
+
+    def yolo_detect(self, confidence: float = 0.5, max_results: int = 10,
+                    region: Optional[Dict] = None, labels: Optional[List[str]] = None) -> List[Dict]:
+        return [dict(d) for d in self.detections]
+
+    def _request(self, method: str, path: str, json: Any = None, **kwargs):
+        self.inputs += 1
+        return _OfflineResponse()
+
+
+class Benchmark:
+    """计时工具: 预热后重复运行，记录每次耗时"""
+
+    def __init__(self, repeat: int = 5, warmup: int = 1, name_filter: Optional[str] = None):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.name_filter = name_filter
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self, name: str, resolution: str, fn: Callable[[], Any],
+            repeat: Optional[int] = None, setup: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            name: 用例名
+            resolution: 分辨率标识
+            fn: 被测函数
+            repeat: 覆盖默认重复次数 (慢用例使用)
+            setup: 每次计时前调用 (不计入耗时)，用于清除缓存
+        """
+        if self.name_filter and self.name_filter not in name:
+            return
+        for _ in range(self.warmup):
+            if setup:
+                setup()
+            fn()
+        samples = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        result = {
+            "name": name,
+            "resolution": resolution,
+            "repeat": len(samples),
+            "min": min(samples),
+            "median": statistics.median(samples),
+            "mean": statistics.fmean(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        }
+        self.results.append(result)
+        print(f"  {name:<40} {result['median'] * 1000:>10.2f} ms  (min {result['min'] * 1000:.2f})")
+
+
+def bench_resolution(bench: Benchmark, key: str, full: bool):
+    pw, ph, scale = RESOLUTIONS[key]
+    width, height = pw * scale, ph * scale
+    label = f"{key} {width}x{height}"
+    print(f"\n[{label}]")
+
+    img_base64 = make_screenshot(width, height)
+    ec = OfflineECWDA(img_base64, (pw, ph))
+    png = base64.b64decode(img_base64)
+    decoded = Image.open(io.BytesIO(png)).convert("RGB")
+    region = {"x": width // 2 - 150, "y": height // 2 - 150, "width": 300, "height": 300}
+    corner = {"x": width - 120, "y": height - 120, "width": 120, "height": 120}
+    offsets = [{"offset": [10, 0], "color": "#00FF00"}]
+
+    # 截图解码
+    bench.run("decode.base64", label, lambda: base64.b64decode(img_base64))
+    bench.run("decode.png", label, lambda: Image.open(io.BytesIO(png)).convert("RGB"))
+    bench.run("frame.image (hash + decode)", label, lambda: Frame(img_base64).image)
+
+    # 取色 / 比色 (每次都会解码整张截图)
+    bench.run("get_pixel_color", label, lambda: ec.get_pixel_color(10, 10))
+    bench.run("cmp_color", label, lambda: ec.cmp_color(10, 10, "#000000"))
+
+    # 找色 / 多点找色
+    bench.run("find_color (300x300 miss)", label,
+              lambda: ec.find_color("#123456", region, tolerance=0))
+    bench.run("find_color (corner hit)", label,
+              lambda: ec.find_color("#FF0000", corner, tolerance=0))
+    bench.run("find_multi_color (300x300 miss)", label,
+              lambda: ec.find_multi_color("#123456", offsets, region, tolerance=0))
+    bench.run("find_multi_color (corner hit)", label,
+              lambda: ec.find_multi_color("#FF0000", offsets, corner, tolerance=0))
+    if full:
+        bench.run("find_color (full screen miss)", label,
+                  lambda: ec.find_color("#123456", tolerance=0), repeat=1)
+        bench.run("find_multi_color (full screen hit)", label,
+                  lambda: ec.find_multi_color("#FF0000", offsets, tolerance=0), repeat=1)
+
+    # 区域统计 (积分图)
+    frame_holder = {}
+    bench.run("region_mean (decode + build tables)", label,
+              lambda: ec.region_mean(region, frame=frame_holder["f"]),
+              setup=lambda: frame_holder.update(f=Frame(img_base64)))
+    cached = Frame(img_base64)
+    ec.region_mean(region, frame=cached)
+    bench.run("region_mean (cached tables)", label, lambda: ec.region_mean(region, frame=cached))
+
+    # 模板匹配 (ObjectTracker 中间帧的模板微调)
+    ec.detections = [{"label": "icon", "confidence": 0.9, "x": pw // 12, "y": ph // 7,
+                      "width": 40, "height": 40}]
+    tracker = ObjectTracker(ec, detect_every=10 ** 9)
+    frame = Frame(img_base64)
+    tracker.update(frame)
+    bench.run("tracker.update (template refine)", label, lambda: tracker.update(frame))
+
+    # 投屏: 缩放 + PhotoImage
+    mirror_size = (int(pw * 1.5), int(ph * 1.5))
+    bench.run("mirror.resize (bilinear)", label,
+              lambda: decoded.resize(mirror_size, Image.Resampling.BILINEAR))
+    bench.run("generator.resize (lanczos)", label,
+              lambda: decoded.resize(mirror_size, Image.Resampling.LANCZOS))
+    photo = _photo_image_factory()
+    if photo:
+        resized = decoded.resize(mirror_size, Image.Resampling.BILINEAR)
+        bench.run("mirror.PhotoImage", label, lambda: photo(resized))
+
+
+def bench_playback(bench: Benchmark, n_actions: int = 1000):
+    """录制脚本回放的解释开销 (输入操作不发请求，sleep 不等待)"""
+    print("\n[playback]")
+    rng = random.Random(1)
+    kinds = ["tap", "tap", "tap", "swipe", "longPress", "doubleTap", "sleep", "home",
+             "swipe_up", "swipe_down"]
+    actions = []
+    for _ in range(n_actions):
+        kind = rng.choice(kinds)
+        if kind in ("tap", "doubleTap"):
+            params = {"x": rng.randrange(390), "y": rng.randrange(844)}
+        elif kind == "longPress":
+            params = {"x": rng.randrange(390), "y": rng.randrange(844), "duration": 1}
+        elif kind == "swipe":
+            params = {"fromX": 100, "fromY": 600, "toX": 100, "toY": 200}
+        elif kind == "sleep":
+            params = {"seconds": 0.5}
+        else:
+            params = {}
+        actions.append({"action": kind, "params": params})
+
+    ec = OfflineECWDA("", (390, 844))
+    bench.run(f"play_actions ({n_actions} actions)", "-",
+              lambda: play_actions(ec, actions, sleep=lambda s: None))
+
+
+def _photo_image_factory() -> Optional[Callable]:
+    """ImageTk.PhotoImage 需要 Tk 显示环境，没有时跳过"""
+    try:
+        import tkinter as tk
+        from PIL import ImageTk
+
+        root = tk.Tk()
+        root.withdraw()
+        return ImageTk.PhotoImage
+    except Exception as e:
+        print(f"  (跳过 PhotoImage: {e})")
+        return None
+
+
+def compare(results: List[Dict], baseline_path: str, threshold: float) -> List[str]:
+    """与基线对比，返回变慢超过 threshold (比例) 的用例"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["name"], r["resolution"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["name"], r["resolution"]))
+        if not base or base["median"] <= 0:
+            continue
+        ratio = r["median"] / base["median"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{r['name']} [{r['resolution']}]: "
+                               f"{base['median'] * 1000:.2f} -> {r['median'] * 1000:.2f} ms "
+                               f"(x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ECWDA 客户端热点基准测试 (离线)")
+    parser.add_argument("--resolutions", nargs="*", default=["14"], choices=list(RESOLUTIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--full", action="store_true", help="包含全屏逐像素找色 (很慢)")
+    parser.add_argument("--filter", default=None, help="只运行名称包含该字符串的用例")
+    parser.add_argument("--output", default=None, help="保存 JSON 结果")
+    parser.add_argument("--compare", default=None, help="基线 JSON 文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定变慢的比例，默认 20%%")
+    args = parser.parse_args()
+
+    bench = Benchmark(repeat=args.repeat, name_filter=args.filter)
+    for key in args.resolutions:
+        bench_resolution(bench, key, args.full)
+    bench_playback(bench)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if args.compare:
+        regressions = compare(bench.results, args.compare, args.threshold)
+        if regressions:
+            print("\n性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+设备档案
+记录一台设备的屏幕尺寸、缩放比例、连接延迟和带宽，支持哪些 ECWDA 扩展接口，
+以及设备端 / 电脑端两种实现的实测耗时，按设备 (UDID 或名称) 保存在本地磁盘。
+客户端启动时直接使用档案中的屏幕尺寸，创建会话后在后台核对
+
+目录结构:
+    ~/.ecwda/devices/<设备>-<sha1 前 8 位>.json    (可用环境变量 ECWDA_PROFILE_DIR 修改)
+
+耗时模型: 每种实现记为 [固定开销, 每像素开销]，
+    find_color 的耗时 = 固定开销 + 搜索像素数 * 每像素开销
+    电脑端的固定开销是截图传输 + 解码，设备端的固定开销是一次请求往返 + 设备截图
+
+用法:
+    ec = ECWDA("http://localhost:8100", device_id="iPhone-15")
+    ec.geometry                             # 直接是档案中的尺寸，不需要等待会话
+    profile = ec.probe_capabilities()       # 首次探测并保存，之后直接读取
+    profile.choose("findColor", 100 * 100)  # -> "native" / "local"
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Optional, Dict, List, Any
+
+
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".ecwda", "devices")
+
+# 档案格式版本，格式不兼容时修改，旧档案视为不存在
+PROFILE_VERSION = 1
+
+# 档案过期时间（秒），过期后重新探测
+PROFILE_MAX_AGE = 7 * 24 * 3600
+
+NATIVE = "native"
+LOCAL = "local"
+
+
+class DeviceProfile:
+    """单台设备的校准信息、能力和耗时"""
+
+    def __init__(self, key: str, info: Optional[Dict[str, Any]] = None,
+                 features: Optional[List[str]] = None,
+                 timings: Optional[Dict[str, List[float]]] = None,
+                 frame_size: Optional[List[int]] = None,
+                 probed_at: Optional[float] = None,
+                 name: Optional[str] = None, os_version: Optional[str] = None,
+                 screen_size: Optional[List[int]] = None,
+                 link: Optional[Dict[str, float]] = None,
+                 validated_at: Optional[float] = None):
+        """
+        Args:
+            key: 设备标识
+            info: /wda/ecwda/info 的返回，没有扩展接口时为 None
+            features: 支持的扩展功能，如 ["findColor", "pixel", "ocr"]
+            timings: {"findColor.native": [固定开销, 每像素开销], ...}，单位秒
+            frame_size: 截图像素尺寸 [宽, 高]
+            probed_at: 能力探测时间戳，None 表示还没有探测
+            name: 设备名称 (/status)
+            os_version: 系统版本 (/status)
+            screen_size: 屏幕尺寸 [宽, 高] (点)
+            link: 连接特性 {"rtt": 往返延迟秒, "bandwidth": 截图下载字节/秒}
+            validated_at: 最近一次向设备核对尺寸和延迟的时间戳
+        """
+        self.key = key
+        self.info = info
+        self.features = list(features or [])
+        self.timings = dict(timings or {})
+        self.frame_size = list(frame_size) if frame_size else None
+        self.probed_at = probed_at
+        self.name = name
+        self.os_version = os_version
+        self.screen_size = list(screen_size) if screen_size else None
+        self.link = dict(link or {})
+        self.validated_at = validated_at
+
+    @property
+    def age(self) -> float:
+        """距离能力探测过去的秒数，没有探测过为无穷大"""
+        if self.probed_at is None:
+            return float("inf")
+        return time.time() - self.probed_at
+
+    @property
+    def scale(self) -> Optional[float]:
+        """截图像素 / 屏幕点，如 3.0；尺寸未知时为 None"""
+        if not self.frame_size or not self.screen_size or not self.screen_size[0]:
+            return None
+        return self.frame_size[0] / self.screen_size[0]
+
+    @property
+    def frame_pixels(self) -> int:
+        """整屏像素数，未知时为 0"""
+        return self.frame_size[0] * self.frame_size[1] if self.frame_size else 0
+
+    def supports(self, feature: str) -> bool:
+        """设备是否提供该扩展功能"""
+        return feature in self.features
+
+    def mark_unsupported(self, feature: str):
+        """运行中发现接口不存在 (404) 时调用，之后不再走设备端"""
+        if feature in self.features:
+            self.features.remove(feature)
+
+    def estimate(self, op: str, impl: str, pixels: int = 0) -> Optional[float]:
+        """
+        估算一次调用的耗时
+
+        Args:
+            op: 操作名，如 "findColor" / "pixel"
+            impl: NATIVE / LOCAL
+            pixels: 搜索像素数，0 表示整屏
+
+        Returns:
+            float: 秒，没有测量数据时为 None
+        """
+        cost = self.timings.get(f"{op}.{impl}")
+        if not cost:
+            return None
+        base, per_pixel = cost
+        return base + per_pixel * (pixels or self.frame_pixels)
+
+    def choose(self, op: str, pixels: int = 0) -> str:
+        """
+        选择更快的实现，设备不支持或没有测量数据时选电脑端
+
+        Args:
+            op: 操作名
+            pixels: 搜索像素数，0 表示整屏
+
+        Returns:
+            str: NATIVE / LOCAL
+        """
+        if not self.supports(op):
+            return LOCAL
+        native = self.estimate(op, NATIVE, pixels)
+        local = self.estimate(op, LOCAL, pixels)
+        if native is None:
+            return LOCAL
+        if local is None or native < local:
+            return NATIVE
+        return LOCAL
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": PROFILE_VERSION,
+            "key": self.key,
+            "probed_at": self.probed_at,
+            "info": self.info,
+            "features": self.features,
+            "timings": self.timings,
+            "frame_size": self.frame_size,
+            "scale": self.scale,
+            "name": self.name,
+            "os_version": self.os_version,
+            "screen_size": self.screen_size,
+            "link": self.link,
+            "validated_at": self.validated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DeviceProfile":
+        return cls(data["key"], info=data.get("info"), features=data.get("features"),
+                   timings=data.get("timings"), frame_size=data.get("frame_size"),
+                   probed_at=data.get("probed_at"), name=data.get("name"),
+                   os_version=data.get("os_version"), screen_size=data.get("screen_size"),
+                   link=data.get("link"), validated_at=data.get("validated_at"))
+
+
+class ProfileStore:
+    """按设备保存档案的目录，每台设备一个 JSON 文件"""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root: 目录，默认取环境变量 ECWDA_PROFILE_DIR，否则为 ~/.ecwda/devices
+        """
+        self.root = root or os.environ.get("ECWDA_PROFILE_DIR") or PROFILE_DIR
+
+    def path(self, key: str) -> str:
+        """设备对应的文件路径 (可读的前缀 + 哈希，避免 URL 中的特殊字符和重名)"""
+        name = re.sub(r"[^\w.-]+", "_", key).strip("_")[:48]
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.root, f"{name}-{digest}.json")
+
+    def load(self, key: str) -> Optional[DeviceProfile]:
+        """读取档案，不存在、损坏或版本不符时返回 None"""
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != PROFILE_VERSION or data.get("key") != key:
+                return None
+            return DeviceProfile.from_dict(data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, profile: DeviceProfile):
+        """写入档案 (先写临时文件再替换，多个进程 / 线程同时写不会留下半个文件)"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(profile.key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def remove(self, key: str) -> bool:
+        """删除档案，下次使用时重新探测"""
+        try:
+            os.remove(self.path(key))
+            return True
+        except OSError:
+            return False
@@ -8,25 +8,1154 @@ import requests
 import base64
 import time
 import json
-from typing import Optional, Dict, List, Tuple, Any
+import io
+import math
+import hashlib
+import functools
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from itertools import accumulate
+from operator import add
+from typing import Optional, Dict, List, Tuple, Any, Callable, Iterator, NamedTuple, Union
 
+from metrics import REGISTRY, MetricsRegistry
+from tracing import span, trace_methods
+from traffic import TrafficRecorder, TrafficReplayer
+from device_profile import DeviceProfile, ProfileStore, PROFILE_MAX_AGE, NATIVE, LOCAL
+from page_source import (CompactTree, TreeDiff, iter_source_elements, find_source_element,
+                         load_source_tree, subtree_hashes, tree_diff)
 
+
+# 平方查找表，构建平方和积分图时使用
+_SQUARES = [i * i for i in range(256)]
+
+
+class SummedAreaTable:
+    """
+    积分图 (Summed-Area Table)
+
+    一次线性预计算后，任意矩形的像素和都可以用 4 次查表在 O(1) 内得到。
+    表按行连续存放在一个数组中，(width + 1) * (height + 1) 项，
+    table[y * (width + 1) + x] 为左上角 (0, 0) 到 (x - 1, y - 1) 的像素和，首行首列为 0。
+    最大和不超过 32 位时每项 4 字节 (普通通道和掩码)，平方和使用 8 字节。
+    """
+
+    def __init__(self, data: bytes, width: int, height: int, squared: bool = False):
+        """
+        Args:
+            data: 单通道像素数据 (按行排列，每像素 1 字节)
+            width: 图像宽度
+            height: 图像高度
+            squared: 是否累加像素值的平方 (用于计算方差)
+        """
+        self.width = width
+        self.height = height
+        self._stride = width + 1
+
+        limit = max(data, default=0) ** 2 if squared else max(data, default=0)
+        typecode = "I" if limit * width * height < 2 ** 32 else "q"
+        prev = array(typecode, bytes(array(typecode).itemsize * self._stride))
+        table = array(typecode, prev)
+        for y in range(height):
+            row = data[y * width:(y + 1) * width]
+            if squared:
+                row = map(_SQUARES.__getitem__, row)
+            prefix = accumulate(row, initial=0)
+            prev = array(typecode, map(add, prev, prefix))
+            table.extend(prev)
+        self._table = table
+
+    def sum(self, x: int, y: int, width: int, height: int) -> int:
+        """矩形区域像素和 (调用方保证区域在图像范围内)"""
+        table = self._table
+        top = y * self._stride
+        bottom = (y + height) * self._stride
+        return table[bottom + x + width] - table[bottom + x] - table[top + x + width] + table[top + x]
+
+    @property
+    def size_bytes(self) -> int:
+        """表占用的内存（字节）"""
+        return self._table.itemsize * len(self._table)
+
+
+def color_mask(bands: Tuple[Any, ...], color: Tuple[int, int, int], tolerance: int,
+               value: int = 255, box: Optional[Tuple[int, int, int, int]] = None):
+    """
+    颜色匹配掩码: 各通道与目标颜色之差都不超过容差的像素为 value，其余为 0
+
+    Args:
+        bands: RGB 三个通道 (PIL 图片 split() 的结果)
+        color: 目标颜色 (R, G, B)
+        tolerance: 容差值
+        value: 匹配像素的取值，计数用 1 (积分图)，查找位置用 255 (getbbox)
+        box: 只计算该区域 (x0, y0, x1, y1)，不传为整张图
+
+    Returns:
+        Image: L 模式掩码
+    """
+    from PIL import ImageChops
+
+    mask = None
+    for band, target in zip(bands, color):
+        lut = [value if abs(v - target) <= tolerance else 0 for v in range(256)]
+        part = (band.crop(box) if box else band).point(lut)
+        mask = part if mask is None else ImageChops.darker(mask, part)
+    return mask
+
+
+def clip_region(region: Optional[Dict], width: int,
+                height: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    将区域裁剪到 width x height 的图像范围内
+
+    Args:
+        region: {"x", "y", "width", "height"}，不传为整张图
+        width: 图像宽度
+        height: 图像高度
+
+    Returns:
+        tuple: (x, y, width, height)，区域为空时返回 None
+    """
+    if not region:
+        return (0, 0, width, height)
+
+    x0 = max(0, int(region.get("x", 0)))
+    y0 = max(0, int(region.get("y", 0)))
+    x1 = min(width, int(region.get("x", 0)) + int(region.get("width", width)))
+    y1 = min(height, int(region.get("y", 0)) + int(region.get("height", height)))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+class Frame:
+    """
+    一帧截图
+
+    保存截图数据、内容哈希以及懒加载的解码图像和积分图，
+    同一帧上的多次区域统计只需要一次截图和一次预计算。
+    """
+
+    def __init__(self, img_base64: str):
+        """
+        Args:
+            img_base64: /screenshot 返回的 base64 图片
+        """
+        self.base64 = img_base64
+        self.timestamp = time.time()
+        self.hash = hashlib.sha1(img_base64.encode("ascii")).hexdigest()
+        self._image = None
+        self._tables: Dict[Any, SummedAreaTable] = {}
+        # 同一帧可能被多个线程共享，懒加载的解码和积分图只构建一次
+        self._lock = threading.RLock()
+
+    @property
+    def image(self):
+        """解码后的 RGB 图像 (PIL.Image)"""
+        if self._image is None:
+            from PIL import Image
+
+            with self._lock:
+                if self._image is None:
+                    with span("decode.base64"):
+                        img_data = base64.b64decode(self.base64)
+                    with span("decode.png", bytes=len(img_data)):
+                        self._image = Image.open(io.BytesIO(img_data)).convert("RGB")
+        return self._image
+
+    @property
+    def width(self) -> int:
+        return self.image.width
+
+    @property
+    def height(self) -> int:
+        return self.image.height
+
+    def clip_region(self, region: Optional[Dict] = None) -> Optional[Tuple[int, int, int, int]]:
+        """
+        将区域裁剪到图像范围内
+
+        Returns:
+            tuple: (x, y, width, height)，区域为空时返回 None
+        """
+        return clip_region(region, self.width, self.height)
+
+    def _table(self, channel: int, squared: bool = False) -> SummedAreaTable:
+        """获取 (必要时构建) 某个通道的积分图"""
+        key = (channel, squared)
+        table = self._tables.get(key)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(key)
+                if table is None:
+                    band = self.image.getchannel(channel).tobytes()
+                    table = SummedAreaTable(band, self.width, self.height, squared)
+                    self._tables[key] = table
+        return table
+
+    def _mask_table(self, color: Tuple[int, int, int], tolerance: int) -> SummedAreaTable:
+        """获取 (必要时构建) 颜色匹配掩码的积分图，匹配像素记为 1"""
+        key = ("mask", color, tolerance)
+        table = self._tables.get(key)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(key)
+                if table is None:
+                    mask = color_mask(self.image.split(), color, tolerance, value=1)
+                    table = SummedAreaTable(mask.tobytes(), self.width, self.height)
+                    self._tables[key] = table
+        return table
+
+    def region_mean(self, region: Optional[Dict] = None) -> Optional[Tuple[float, float, float]]:
+        """区域内 RGB 各通道均值"""
+        rect = self.clip_region(region)
+        if not rect:
+            return None
+        area = rect[2] * rect[3]
+        return tuple(self._table(c).sum(*rect) / area for c in range(3))
+
+    def region_std(self, region: Optional[Dict] = None) -> Optional[Tuple[float, float, float]]:
+        """区域内 RGB 各通道标准差"""
+        rect = self.clip_region(region)
+        if not rect:
+            return None
+        area = rect[2] * rect[3]
+        result = []
+        for c in range(3):
+            mean = self._table(c).sum(*rect) / area
+            mean_sq = self._table(c, squared=True).sum(*rect) / area
+            result.append(math.sqrt(max(0.0, mean_sq - mean * mean)))
+        return tuple(result)
+
+    def region_fraction_matching(self, color: Tuple[int, int, int],
+                                 region: Optional[Dict] = None,
+                                 tolerance: int = 10) -> float:
+        """区域内与指定颜色匹配 (各通道差值 <= tolerance) 的像素比例"""
+        rect = self.clip_region(region)
+        if not rect:
+            return 0.0
+        return self._mask_table(color, tolerance).sum(*rect) / (rect[2] * rect[3])
+
+
+def _normalize_region(region: Optional[Dict]) -> Optional[Tuple[int, int, int, int]]:
+    """将区域字典归一化为可哈希的 (x, y, width, height)，空区域视为全屏"""
+    if not region:
+        return None
+    return (int(region.get("x", 0)), int(region.get("y", 0)),
+            int(region.get("width", 0)), int(region.get("height", 0)))
+
+
+class FrameResultCache:
+    """
+    按帧缓存的识别结果 (OCR、YOLO 检测等)
+
+    以 (帧内容哈希, 归一化区域, ...) 为键，LRU 淘汰，同时限制条目数和估算内存占用。
+    屏幕未变化时重复的识别请求直接命中缓存，不再请求设备。
+    结果以 JSON 文本保存，每次命中返回新解析的副本，调用方修改结果不会影响缓存。
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 4 * 1024 * 1024):
+        """
+        Args:
+            max_entries: 最大缓存条目数
+            max_bytes: 最大估算内存占用（字节）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, Tuple[str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[List[Dict]]:
+        """查询缓存，命中时返回结果副本"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(entry[0])
+
+    def put(self, key, results: List[Dict]):
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        text = json.dumps(results, ensure_ascii=False)
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old[1]
+            self._entries[key] = (text, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        """当前估算内存占用（字节）"""
+        return self._bytes
+
+
+def _node_type(node: Dict) -> str:
+    """归一化节点类型: XCUIElementTypeButton / Button / button 均视为 button"""
+    node_type = str(node.get("type") or node.get("elementType") or "").lower()
+    if node_type.startswith("xcuielementtype"):
+        node_type = node_type[len("xcuielementtype"):]
+    return node_type
+
+
+def _node_rect(node: Dict) -> Optional[Tuple[float, float, float, float]]:
+    """节点边框 (x, y, width, height)，兼容平铺字段和 rect/frame 字段"""
+    rect = node.get("rect") or node.get("frame") or node
+    try:
+        return (float(rect["x"]), float(rect["y"]),
+                float(rect["width"]), float(rect["height"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class NodeSnapshot:
+    """
+    页面节点快照
+
+    一次获取整页节点后，按文字、标签、类型和边框建立索引，
+    之后的查询都在本地完成，不再请求设备。
+    """
+
+    TEXT_KEYS = ("text", "label", "name", "value")
+    GRID_SIZE = 100
+
+    def __init__(self, nodes: List[Dict], frame_hash: Optional[str] = None):
+        """
+        Args:
+            nodes: 节点列表 (get_all_nodes 或 /source 解析结果)
+            frame_hash: 获取节点时的帧哈希
+        """
+        self.nodes = nodes
+        self.frame_hash = frame_hash
+        self.timestamp = time.time()
+        self._by_text: Dict[str, List[int]] = {}
+        self._by_label: Dict[str, List[int]] = {}
+        self._by_type: Dict[str, List[int]] = {}
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+
+        for i, node in enumerate(nodes):
+            for key in self.TEXT_KEYS:
+                text = node.get(key)
+                if text:
+                    ids = self._by_text.setdefault(str(text), [])
+                    if not ids or ids[-1] != i:
+                        ids.append(i)
+            label = node.get("label")
+            if label:
+                self._by_label.setdefault(str(label), []).append(i)
+            self._by_type.setdefault(_node_type(node), []).append(i)
+
+            rect = _node_rect(node)
+            if rect:
+                for cell in self._cells(rect):
+                    self._grid.setdefault(cell, []).append(i)
+
+    def _cells(self, rect: Tuple[float, float, float, float]):
+        """边框覆盖的网格单元"""
+        x, y, w, h = rect
+        g = self.GRID_SIZE
+        for gy in range(int(y // g), int((y + max(h, 0)) // g) + 1):
+            for gx in range(int(x // g), int((x + max(w, 0)) // g) + 1):
+                yield (gx, gy)
+
+    def _lookup(self, index: Dict[str, List[int]], text: str, partial: bool) -> List[Dict]:
+        if partial:
+            ids = set()
+            for key, key_ids in index.items():
+                if text in key:
+                    ids.update(key_ids)
+            ids = sorted(ids)
+        else:
+            ids = index.get(text, [])
+        return [self.nodes[i] for i in ids]
+
+    def find_by_text(self, text: str, partial: bool = True) -> List[Dict]:
+        """按文字查找 (匹配 text / label / name / value)"""
+        return self._lookup(self._by_text, text, partial)
+
+    def find_by_label(self, label: str, partial: bool = True) -> List[Dict]:
+        """按 label 查找"""
+        return self._lookup(self._by_label, label, partial)
+
+    def find_by_type(self, node_type: str) -> List[Dict]:
+        """按类型查找"""
+        key = _node_type({"type": node_type})
+        return [self.nodes[i] for i in self._by_type.get(key, [])]
+
+    def find_at(self, x: float, y: float) -> List[Dict]:
+        """包含指定坐标的节点，面积小 (最内层) 的在前"""
+        cell = (int(x // self.GRID_SIZE), int(y // self.GRID_SIZE))
+        hits = []
+        for i in self._grid.get(cell, []):
+            rx, ry, rw, rh = _node_rect(self.nodes[i])
+            if rx <= x < rx + rw and ry <= y < ry + rh:
+                hits.append((rw * rh, i))
+        return [self.nodes[i] for _, i in sorted(hits)]
+
+    def find_in(self, region: Dict) -> List[Dict]:
+        """与区域相交的节点"""
+        qx, qy = float(region.get("x", 0)), float(region.get("y", 0))
+        qw, qh = float(region.get("width", 0)), float(region.get("height", 0))
+        ids = set()
+        for cell in self._cells((qx, qy, qw, qh)):
+            for i in self._grid.get(cell, []):
+                rx, ry, rw, rh = _node_rect(self.nodes[i])
+                if rx < qx + qw and qx < rx + rw and ry < qy + qh and qy < ry + rh:
+                    ids.add(i)
+        return [self.nodes[i] for i in sorted(ids)]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    @classmethod
+    def from_tree(cls, tree: CompactTree, frame_hash: Optional[str] = None) -> "NodeSnapshot":
+        """由页面树生成快照，nodes[i] 对应树的第 i 个节点"""
+        return cls([tree.node(i) for i in range(len(tree))], frame_hash)
+
+
+class NodeCache:
+    """
+    节点快照缓存
+
+    快照在以下情况失效: 超过 ttl、截图内容发生变化、执行了点击/滑动等输入操作。
+    """
+
+    def __init__(self, ttl: float = 3.0):
+        """
+        Args:
+            ttl: 快照有效期（秒），<= 0 表示不使用缓存
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._snapshot: Optional[NodeSnapshot] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[NodeSnapshot]:
+        """返回仍然有效的快照"""
+        with self._lock:
+            snap = self._snapshot
+            if snap and self.ttl > 0 and time.time() - snap.timestamp <= self.ttl:
+                self.hits += 1
+                return snap
+            self._snapshot = None
+            self.misses += 1
+            return None
+
+    def put(self, snapshot: NodeSnapshot):
+        with self._lock:
+            self._snapshot = snapshot
+
+    def invalidate(self):
+        """使快照失效"""
+        with self._lock:
+            self._snapshot = None
+
+    def on_frame(self, frame_hash: str):
+        """收到新帧: 画面已变化则使快照失效"""
+        with self._lock:
+            snap = self._snapshot
+            if snap and snap.frame_hash and snap.frame_hash != frame_hash:
+                self._snapshot = None
+
+    def peek(self) -> Optional[NodeSnapshot]:
+        """返回当前快照 (不检查有效期，不计入命中统计)"""
+        return self._snapshot
+
+    def apply_diff(self, base: NodeSnapshot, diff: TreeDiff,
+                   frame_hash: Optional[str]) -> NodeSnapshot:
+        """
+        按页面树差异增量更新快照: 内容和位置都没变的节点沿用旧字典，其余从新树生成
+
+        Args:
+            base: 差异起点那棵树的快照 (NodeSnapshot.from_tree，节点顺序与树下标一致)
+            diff: tree_diff 结果
+            frame_hash: 差异终点对应的帧哈希
+
+        Returns:
+            NodeSnapshot: 与差异终点那棵树对应的新快照
+        """
+        tree = diff.new
+        old_of = diff.index_map()
+        nodes = []
+        for j in range(len(tree)):
+            i = old_of.get(j)
+            node = base.nodes[i] if i is not None else None
+            if (node is None or node["index"] != j or node["parent"] != tree.parent[j]
+                    or node["depth"] != tree.depth[j]
+                    or node["x"] != tree.x[j] or node["y"] != tree.y[j]):
+                node = tree.node(j)
+            nodes.append(node)
+        snap = NodeSnapshot(nodes, frame_hash)
+        self.put(snap)
+        return snap
+
+
+class SchedulerFull(Exception):
+    """命令队列已满"""
+
+
+class SchedulerStopped(RuntimeError):
+    """调度器已停止"""
+
+
+class CommandScheduler:
+    """
+    单设备命令调度器
+
+    WDA 在设备主线程上串行处理请求，并发发送只会让请求乱序、互相排队。
+    调度器用一个工作线程按优先级依次执行命令: 输入 > 截图 > 分析，
+    同一类命令严格按提交顺序执行。每类队列有最大深度，满时 submit 阻塞
+    (背压)，try_submit 直接返回 None (调度器停止后也返回 None)。
+    """
+
+    INPUT = "input"
+    SCREENSHOT = "screenshot"
+    ANALYSIS = "analysis"
+    PRIORITIES = (INPUT, SCREENSHOT, ANALYSIS)
+
+    def __init__(self, max_depth: Optional[Dict[str, int]] = None, name: str = "device"):
+        """
+        Args:
+            max_depth: 各类命令的最大排队数，默认 输入 32 / 截图 2 / 分析 8
+            name: 工作线程名称后缀
+        """
+        self.max_depth = {self.INPUT: 32, self.SCREENSHOT: 2, self.ANALYSIS: 8}
+        if max_depth:
+            self.max_depth.update(max_depth)
+        self._queues: Dict[str, deque] = {kind: deque() for kind in self.PRIORITIES}
+        self._stats = {kind: {"count": 0, "rejected": 0, "wait": 0.0, "max_wait": 0.0,
+                              "service": 0.0, "max_service": 0.0}
+                       for kind in self.PRIORITIES}
+        self._cond = threading.Condition()
+        self._running = True
+        self._worker = threading.Thread(target=self._run, daemon=True,
+                                        name=f"ecwda-scheduler-{name}")
+        self._worker.start()
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        提交命令，队列已满时阻塞等待
+
+        Args:
+            kind: 命令类别 INPUT / SCREENSHOT / ANALYSIS
+            fn: 要执行的函数，其余参数原样传入
+
+        Returns:
+            Future: 命令结果
+        """
+        return self._enqueue(kind, fn, args, kwargs, block=True)
+
+    def try_submit(self, kind: str, fn: Callable, *args, **kwargs) -> Optional[Future]:
+        """提交命令，队列已满或调度器已停止时返回 None"""
+        try:
+            return self._enqueue(kind, fn, args, kwargs, block=False)
+        except (SchedulerFull, SchedulerStopped):
+            return None
+
+    def call(self, kind: str, fn: Callable, *args, **kwargs) -> Any:
+        """提交命令并等待结果"""
+        return self.submit(kind, fn, *args, **kwargs).result()
+
+    def pending(self) -> Dict[str, int]:
+        """各类命令当前排队数"""
+        with self._cond:
+            return {kind: len(q) for kind, q in self._queues.items()}
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        各类命令的排队和执行耗时统计
+
+        Returns:
+            dict: {类别: {"count", "rejected", "avg_wait", "max_wait",
+                   "avg_service", "max_service"}}，耗时单位秒
+        """
+        with self._cond:
+            result = {}
+            for kind, s in self._stats.items():
+                n = s["count"]
+                result[kind] = {
+                    "count": n,
+                    "rejected": s["rejected"],
+                    "avg_wait": s["wait"] / n if n else 0.0,
+                    "max_wait": s["max_wait"],
+                    "avg_service": s["service"] / n if n else 0.0,
+                    "max_service": s["max_service"],
+                }
+            return result
+
+    def shutdown(self, wait: bool = False):
+        """停止调度器，取消所有未执行的命令"""
+        with self._cond:
+            self._running = False
+            for q in self._queues.values():
+                while q:
+                    q.popleft()[0].cancel()
+            self._cond.notify_all()
+        if wait and threading.current_thread() is not self._worker:
+            self._worker.join()
+
+    def _enqueue(self, kind: str, fn: Callable, args: tuple, kwargs: dict, block: bool) -> Future:
+        if kind not in self._queues:
+            raise ValueError(f"未知命令类别: {kind}")
+        future: Future = Future()
+        # 在工作线程内提交 (命令中嵌套调用) 直接执行，避免自己等待自己
+        if threading.current_thread() is self._worker:
+            self._execute(kind, future, fn, args, kwargs, time.perf_counter())
+            return future
+        with self._cond:
+            q = self._queues[kind]
+            while self._running and len(q) >= self.max_depth[kind]:
+                if not block:
+                    self._stats[kind]["rejected"] += 1
+                    raise SchedulerFull(kind)
+                self._cond.wait()
+            if not self._running:
+                raise SchedulerStopped("调度器已停止")
+            q.append((future, fn, args, kwargs, time.perf_counter()))
+            self._cond.notify_all()
+        return future
+
+    def _next(self):
+        with self._cond:
+            while self._running:
+                for kind in self.PRIORITIES:
+                    if self._queues[kind]:
+                        item = self._queues[kind].popleft()
+                        self._cond.notify_all()
+                        return kind, item
+                self._cond.wait()
+            return None
+
+    def _run(self):
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+            kind, (future, fn, args, kwargs, queued) = entry
+            if future.set_running_or_notify_cancel():
+                self._execute(kind, future, fn, args, kwargs, queued)
+
+    def _execute(self, kind: str, future: Future, fn: Callable, args: tuple, kwargs: dict,
+                 queued: float):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finished = time.perf_counter()
+        with self._cond:
+            s = self._stats[kind]
+            s["count"] += 1
+            s["wait"] += started - queued
+            s["max_wait"] = max(s["max_wait"], started - queued)
+            s["service"] += finished - started
+            s["max_service"] = max(s["max_service"], finished - started)
+
+
+def _payload_key(payload: Any) -> Optional[str]:
+    return None if payload is None else json.dumps(payload, sort_keys=True)
+
+
+class SingleFlight:
+    """
+    合并并发的相同调用
+
+    同一个 key 的调用正在进行时，后来的调用不再执行，而是等待并共享第一个调用的结果
+    (或异常)。fresh > 0 时，结束不久的结果在该时间窗口内也会直接复用。
+    """
+
+    def __init__(self, max_recent: int = 32):
+        """
+        Args:
+            max_recent: 保留最近结果的最大条数 (仅 fresh > 0 的调用会保留)
+        """
+        self.max_recent = max_recent
+        self.calls = 0
+        self.shared = 0
+        self._inflight: Dict[Any, Future] = {}
+        self._recent: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, key: Any, fn: Callable[[], Any], fresh: float = 0.0) -> Any:
+        """
+        执行调用，相同 key 的并发调用只执行一次
+
+        Args:
+            key: 调用标识 (可哈希)
+            fn: 无参数函数
+            fresh: 复用最近结果的时间窗口（秒）
+
+        Returns:
+            fn 的返回值
+        """
+        with self._lock:
+            if fresh > 0:
+                recent = self._recent.get(key)
+                if recent and time.time() - recent[0] <= fresh:
+                    self.shared += 1
+                    return recent[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            if fresh > 0:
+                self._recent[key] = (time.time(), result)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_recent:
+                    self._recent.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def forget(self):
+        """清空最近结果 (进行中的调用不受影响)"""
+        with self._lock:
+            self._recent.clear()
+
+
+def _endpoint(path: str) -> str:
+    """去掉路径中的会话 ID，同一接口的统计合并在一起"""
+    if path.startswith("/session/"):
+        _, _, tail = path[len("/session/"):].partition("/")
+        return "/session/{id}/" + tail if tail else "/session/{id}"
+    return path
+
+
+class LatencyTracker:
+    """
+    按接口统计请求延迟并推导超时时间
+
+    每个接口保留最近 window 次延迟，样本数达到 min_samples 后
+    超时 = clamp(p99 * factor, floor, 调用处给定的超时)。
+    USB 连接下点击约 30ms，超时会收紧到 floor；Wi-Fi 慢链路的延迟分布更宽，超时随之放宽。
+    超时的请求按超时时长记一个样本，避免超时越收越紧。
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20, percentile: float = 0.99,
+                 factor: float = 3.0, floor: float = 1.0):
+        """
+        Args:
+            window: 每个接口保留的样本数
+            min_samples: 开始自适应所需的最少样本数，不足时使用调用处给定的超时
+            percentile: 使用的延迟分位数
+            factor: 分位数的放大倍数
+            floor: 超时下限（秒）
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.factor = factor
+        self.floor = floor
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def quantile(self, endpoint: str, q: float) -> Optional[float]:
+        """某接口延迟的 q 分位数 (0-1)，没有样本返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, endpoint: str, cap: float) -> float:
+        """
+        推导某接口的超时时间
+
+        Args:
+            endpoint: 接口
+            cap: 调用处给定的超时，作为上限和样本不足时的默认值
+        """
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None or len(samples) < self.min_samples:
+                return cap
+            ordered = sorted(samples)
+        p = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return min(cap, max(self.floor, p * self.factor))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各接口的样本数和 p50 / p90 / p99 延迟（秒）"""
+        with self._lock:
+            snapshot = {k: sorted(v) for k, v in self._samples.items()}
+        result = {}
+        for endpoint, ordered in snapshot.items():
+            n = len(ordered)
+            result[endpoint] = {
+                "count": n,
+                "p50": ordered[int(0.5 * n)],
+                "p90": ordered[min(n - 1, int(0.9 * n))],
+                "p99": ordered[min(n - 1, int(0.99 * n))],
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class DeviceUnavailableError(Exception):
+    """设备不可达: 熔断器已打开，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    单设备熔断器
+
+    连续 failure_threshold 次连接失败 (连接错误或超时) 后打开，之后的调用立即抛出
+    DeviceUnavailableError，不再等待超时。打开期间后台线程每隔 probe_interval 秒
+    探测一次 /status，探测成功后自动关闭。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, probe: Callable[[], bool], failure_threshold: int = 3,
+                 probe_interval: float = 2.0, name: str = "device"):
+        """
+        Args:
+            probe: 探测函数，设备可达时返回 True
+            failure_threshold: 打开熔断所需的连续失败次数
+            probe_interval: 打开后探测的间隔（秒）
+            name: 设备名称，用于错误信息
+        """
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.name = name
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.opened = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probe = probe
+        self._probe_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.state == self.CLOSED
+
+    def check(self):
+        """熔断打开时抛出 DeviceUnavailableError"""
+        if self.state == self.OPEN:
+            with self._lock:
+                self.rejected += 1
+            raise DeviceUnavailableError(
+                f"设备 {self.name} 不可用: 连续 {self.consecutive_failures} 次连接失败"
+                f" ({self.last_error})")
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self, error: Optional[BaseException] = None):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if error is not None:
+                self.last_error = type(error).__name__
+            if self.state == self.OPEN or self.consecutive_failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self.opened += 1
+            self.opened_at = time.time()
+            if self._probe_thread is None or not self._probe_thread.is_alive():
+                self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+                self._probe_thread.start()
+
+    def reset(self):
+        """手动关闭熔断"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """熔断状态和计数"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures": self.failures,
+                "successes": self.successes,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "opened_at": self.opened_at,
+                "last_error": self.last_error,
+            }
+
+    def _probe_loop(self):
+        while self.state == self.OPEN:
+            time.sleep(self.probe_interval)
+            try:
+                ok = self._probe()
+            except Exception:
+                ok = False
+            if ok:
+                self.record_success()
+
+
+def _fail_fast(method):
+    """设备不可用时在执行方法体之前抛出 DeviceUnavailableError (不会被方法内的 except 吞掉)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.breaker.check()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class DeviceGeometry(NamedTuple):
+    """屏幕尺寸快照 (点坐标)，不可变，可以在线程间直接共享"""
+    width: int
+    height: int
+
+
+@trace_methods
 class ECWDA:
-    """ECWDA 客户端类"""
+    """
+    ECWDA 客户端类
+    
+    并发模型: 一个客户端可以被多个线程同时使用。
+    - 会话在第一次需要时创建，并发调用只会创建一个会话
+    - 屏幕尺寸保存为不可变的 DeviceGeometry 快照，整体替换；需要同时使用宽和高时
+      先取一次 ec.geometry，避免两次读取之间尺寸被更新
+    - 截图帧、OCR/YOLO/节点缓存、请求合并都是线程安全的
+    - 各线程的输入操作彼此之间没有顺序保证，需要顺序时通过 ec.submit 提交
+    """
     
-    def __init__(self, url: str = "http://localhost:8100"):
+    def __init__(self, url: str = "http://localhost:8100", device_id: Optional[str] = None,
+                 cache_profile: bool = True):
         """
         初始化 ECWDA 客户端
         
         Args:
             url: WDA 服务地址，默认 http://localhost:8100
+            device_id: 设备 UDID 或名称，作为本地设备档案的键，不传时按服务地址区分
+            cache_profile: 使用本地设备档案: 传入 device_id 时启动即使用档案中的屏幕尺寸，
+                           创建会话后在后台核对并更新档案
         """
         self.base_url = url.rstrip("/")
+        self.device_id = device_id
+        self.cache_profile = cache_profile
         self.session_id: Optional[str] = None
-        self.screen_width: int = 375
-        self.screen_height: int = 667
+        self.geometry = DeviceGeometry(375, 667)
+        self._session_lock = threading.RLock()
         self.timeout: int = 10
+        self._last_frame: Optional[Frame] = None
+        self.ocr_cache = FrameResultCache()
+        self.yolo_cache = FrameResultCache(max_entries=16)
+        self.yolo_confidence_floor: float = 0.25
+        self.yolo_max_results: int = 100
+        self.yolo_backend = None
+        self.node_cache = NodeCache()
+        self._scheduler: Optional[CommandScheduler] = None
+        self._scheduler_lock = threading.Lock()
+        # 各路径复用最近结果的时间窗口（秒），未配置的路径只合并进行中的请求
+        self.freshness: Dict[str, float] = {"/status": 1.0}
+        self._flight = SingleFlight()
+        self.breaker = CircuitBreaker(self._probe, name=self.base_url)
+        # 按接口延迟自适应超时，各调用处给定的超时作为上限
+        self.latency = LatencyTracker()
+        self.adaptive_timeouts = True
+        # 请求指标，默认汇总到进程级的 metrics.REGISTRY，设为 None 关闭
+        self.metrics: Optional[MetricsRegistry] = REGISTRY
+        # 实际发送请求的函数，录制 / 回放时被替换 (见 record_traffic / replay_traffic)
+        self._send: Callable[..., requests.Response] = requests.request
+        self._recorder: Optional[TrafficRecorder] = None
+        # 找色、取色用设备端还是电脑端实现: "auto" 按设备档案选更快的一方，"native" / "local" 固定
+        self.routing: str = "auto"
+        # auto 模式下本机还没有该设备的档案时，第一次找色前自动探测 (见 probe_capabilities)
+        self.auto_probe = True
+        self.profile: Optional[DeviceProfile] = None
+        self.profile_store = ProfileStore()
+        self._profile_lock = threading.RLock()
+        self._profile_checked = False
+        # 没有 device_id 时当前会话实际的截图尺寸 (会话 ID, (宽, 高))，见 _frame_size
+        self._session_frame: Optional[Tuple[Optional[str], Tuple[int, int]]] = None
+        if cache_profile:
+            self.profile = self.profile_store.load(self.device_key)
+            if self._cached_screen_size():
+                self.geometry = DeviceGeometry(*self.profile.screen_size)
+        
+    def _request(self, method: str, path: str, json: Any = None,
+                 timeout: Optional[float] = None, coalesce: Optional[bool] = None,
+                 fresh: Optional[float] = None, hold: float = 0.0,
+                 stream: bool = False) -> requests.Response:
+        """
+        发送请求 (所有设备请求的统一入口)
+        
+        GET 和 coalesce=True 的分析请求会被合并: 多个线程同时发出相同的请求时
+        只有一个真正发送到设备，响应共享给所有等待者。点击等输入操作不合并。
+        
+        Args:
+            method: "GET" / "POST"
+            path: 以 / 开头的路径
+            json: 请求体
+            timeout: 超时上限，默认 self.timeout；开启 adaptive_timeouts 时
+                     实际超时按该接口的历史延迟推导，不超过此值
+            coalesce: 是否合并相同请求，默认只合并 GET
+            fresh: 复用最近一次相同请求响应的时间窗口（秒），默认取 self.freshness[path]
+            hold: 操作本身持续的时间 (长按、滑动)，加在超时上，不计入延迟统计
+            stream: 流式读取响应体 (不合并，延迟按收到响应头计算)
+            
+        Returns:
+            requests.Response: 响应 (合并时多个调用方共享同一个对象，不要修改)
+        """
+        url = self.base_url + path
+        endpoint = _endpoint(path)
+        timeout = self.timeout if timeout is None else timeout
+        if self.adaptive_timeouts:
+            timeout = self.latency.timeout_for(endpoint, timeout)
+        
+        extra = {"stream": True} if stream else {}
+        
+        def send():
+            start = time.perf_counter()
+            try:
+                resp = self._send(method, url, json=json, timeout=timeout + hold, **extra)
+            except requests.Timeout as e:
+                self.latency.record(endpoint, timeout)
+                self.breaker.record_failure(e)
+                self._observe(method, endpoint, time.perf_counter() - start, None)
+                raise
+            except requests.ConnectionError as e:
+                self.breaker.record_failure(e)
+                self._observe(method, endpoint, time.perf_counter() - start, None)
+                raise
+            elapsed = time.perf_counter() - start
+            self.latency.record(endpoint, max(0.0, elapsed - hold))
+            self.breaker.record_success()
+            self._observe(method, endpoint, elapsed, resp, stream)
+            return resp
+        
+        self.breaker.check()
+        
+        if coalesce is None:
+            coalesce = method == "GET" and not stream
+        with span("http", method=method, endpoint=endpoint):
+            if not coalesce:
+                return send()
+            if fresh is None:
+                fresh = self.freshness.get(path, 0.0)
+            return self._flight.do((method, path, _payload_key(json)), send, fresh)
+        
+    def _observe(self, method: str, endpoint: str, elapsed: float,
+                 resp: Optional[requests.Response], stream: bool = False):
+        """记录请求指标，resp 为 None 表示连接失败或超时；流式响应不读取响应体，不计接收字节"""
+        if self.metrics is None:
+            return
+        if resp is None:
+            self.metrics.observe(self.base_url, endpoint, method, elapsed, error=True)
+            return
+        body = resp.request.body or b""
+        self.metrics.observe(self.base_url, endpoint, method, elapsed,
+                             bytes_sent=len(body), bytes_received=0 if stream else len(resp.content),
+                             error=resp.status_code >= 400)
+    
+    def _probe(self) -> bool:
+        """熔断打开后的探测 (绕过熔断器直接请求 /status)"""
+        return self._send("GET", f"{self.base_url}/status", timeout=3).status_code == 200
+    
+    @property
+    def available(self) -> bool:
+        """设备是否可用 (熔断器未打开)"""
+        return self.breaker.available
+    
+    def record_traffic(self, path: str, append: bool = False) -> TrafficRecorder:
+        """
+        开始录制请求和响应 (包括截图) 到目录，截图按内容去重存储
+        
+        Args:
+            path: 录制目录
+            append: 追加到已有录制，默认覆盖
+            
+        Returns:
+            TrafficRecorder: 录制器，recorder.count 为已录制的请求数
+        """
+        self.stop_recording()
+        self._recorder = TrafficRecorder(path, self._send, append=append)
+        self._send = self._recorder
+        return self._recorder
+    
+    def stop_recording(self):
+        """停止录制"""
+        if self._recorder is not None:
+            self._send = self._recorder._send
+            self._recorder.close()
+            self._recorder = None
+    
+    def replay_traffic(self, path: str, speed: Union[str, float] = "max",
+                       strict: bool = True) -> TrafficReplayer:
+        """
+        用录制的响应代替设备，之后的请求不再访问网络
         
+        Args:
+            path: record_traffic 录制的目录
+            speed: "max" 不等待；"original" 按录制时每个请求的耗时等待；数字为相对原速的倍数
+            strict: 遇到未录制的请求时抛出 KeyError，False 时返回 404
+            
+        Returns:
+            TrafficReplayer: 回放器，replayer.stats() 查看命中情况
+        """
+        self.stop_recording()
+        replayer = TrafficReplayer(path, speed=speed, strict=strict)
+        self._send = replayer
+        self._flight.forget()
+        self.latency.reset()
+        self.breaker.reset()
+        return replayer
+    
     def is_connected(self) -> bool:
         """
         检查连接状态
@@ -35,11 +1164,12 @@ class ECWDA:
             bool: 是否连接成功
         """
         try:
-            resp = requests.get(f"{self.base_url}/status", timeout=5)
+            resp = self._request("GET", "/status", timeout=5)
             return resp.status_code == 200
         except:
             return False
     
+    @_fail_fast
     def create_session(self, bundle_id: str = "com.apple.Preferences") -> bool:
         """
         创建会话
@@ -51,48 +1181,110 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/session",
-                json={
-                    "capabilities": {
-                        "bundleId": bundle_id
-                    }
-                },
-                timeout=self.timeout
-            )
-            data = resp.json()
-            self.session_id = data.get("sessionId")
-            
-            # 获取屏幕尺寸
-            if self.session_id:
-                self._update_screen_size()
+            with self._session_lock:
+                resp = self._request(
+                    "POST", "/session",
+                    json={
+                        "capabilities": {
+                            "bundleId": bundle_id
+                        }
+                    },
+                    timeout=self.timeout
+                )
+                data = resp.json()
+                session_id = data.get("sessionId")
                 
-            return self.session_id is not None
+                # 先获取屏幕尺寸再发布 session_id，其它线程拿到会话时尺寸已经是新的；
+                # 按 device_id 找到的档案中已有尺寸时直接使用，只有这种情况才在后台核对
+                if session_id:
+                    if not self._cached_screen_size():
+                        self._update_screen_size(session_id)
+                    else:
+                        threading.Thread(target=self._revalidate_profile, args=(session_id,),
+                                         name="ecwda-revalidate", daemon=True).start()
+                    
+                self.session_id = session_id
+                return session_id is not None
         except Exception as e:
             print(f"创建会话失败: {e}")
             return False
     
-    def _update_screen_size(self):
-        """更新屏幕尺寸"""
+    def _update_screen_size(self, session_id: Optional[str] = None) -> bool:
+        """更新屏幕尺寸 (整体替换 geometry 快照)，返回是否成功"""
         try:
-            resp = requests.get(
-                f"{self.base_url}/session/{self.session_id}/window/size",
+            resp = self._request(
+                "GET", f"/session/{session_id or self.session_id}/window/size",
                 timeout=5
             )
             data = resp.json()
             if "value" in data:
-                self.screen_width = data["value"].get("width", 375)
-                self.screen_height = data["value"].get("height", 667)
+                geometry = DeviceGeometry(data["value"].get("width", 375),
+                                          data["value"].get("height", 667))
+                with self._session_lock:
+                    self.geometry = geometry
+                return True
         except:
             pass
+        return False
     
     def _ensure_session(self):
-        """确保会话存在"""
-        if not self.session_id:
-            self.create_session()
+        """确保会话存在 (多个线程同时调用只会创建一个会话)"""
+        if self.session_id:
+            return
+        with self._session_lock:
+            if not self.session_id:
+                self.create_session()
+    
+    @property
+    def screen_width(self) -> int:
+        return self.geometry.width
+    
+    @screen_width.setter
+    def screen_width(self, value: int):
+        # 读取-替换-写回 与其它写入 geometry 的地方互斥，避免丢失并发更新的另一边
+        with self._session_lock:
+            self.geometry = self.geometry._replace(width=value)
+    
+    @property
+    def screen_height(self) -> int:
+        return self.geometry.height
+    
+    @screen_height.setter
+    def screen_height(self, value: int):
+        with self._session_lock:
+            self.geometry = self.geometry._replace(height=value)
+    
+    @property
+    def scheduler(self) -> CommandScheduler:
+        """本设备的命令调度器 (首次访问时创建)"""
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = CommandScheduler(name=self.base_url)
+            return self._scheduler
+    
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> Future:
+        """
+        通过调度器异步执行命令
+        
+        多个线程同时操作同一台设备时使用: 输入操作严格按提交顺序执行，
+        并优先于截图和分析。
+        
+        Args:
+            kind: CommandScheduler.INPUT / SCREENSHOT / ANALYSIS
+            fn: 要执行的函数，如 ec.click
+            
+        Returns:
+            Future: 命令结果
+            
+        示例:
+            ec.submit(CommandScheduler.INPUT, ec.click, 100, 200)
+            frame = ec.submit(CommandScheduler.SCREENSHOT, ec.get_frame).result()
+        """
+        return self.scheduler.submit(kind, fn, *args, **kwargs)
     
     # ========== 点击函数 ==========
     
+    @_fail_fast
     def click(self, x: int, y: int) -> bool:
         """
         点击指定坐标
@@ -105,9 +1297,10 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/tap/0",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/tap/0",
                 json={"x": x, "y": y},
                 timeout=self.timeout
             )
@@ -115,6 +1308,7 @@ class ECWDA:
         except:
             return False
     
+    @_fail_fast
     def long_click(self, x: int, y: int, duration: float = 1.0) -> bool:
         """
         长按指定坐标
@@ -128,16 +1322,19 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/touchAndHold",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/touchAndHold",
                 json={"x": x, "y": y, "duration": duration},
-                timeout=self.timeout + duration
+                timeout=self.timeout,
+                hold=duration
             )
             return resp.status_code == 200
         except:
             return False
     
+    @_fail_fast
     def double_click(self, x: int, y: int) -> bool:
         """
         双击指定坐标
@@ -150,9 +1347,10 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/doubleTap",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/doubleTap",
                 json={"x": x, "y": y},
                 timeout=self.timeout
             )
@@ -162,6 +1360,7 @@ class ECWDA:
     
     # ========== 滑动函数 ==========
     
+    @_fail_fast
     def swipe(self, from_x: int, from_y: int, to_x: int, to_y: int, 
               duration: float = 0.5) -> bool:
         """
@@ -178,9 +1377,10 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/dragFromToForDuration",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/dragFromToForDuration",
                 json={
                     "fromX": from_x,
                     "fromY": from_y,
@@ -188,7 +1388,8 @@ class ECWDA:
                     "toY": to_y,
                     "duration": duration
                 },
-                timeout=self.timeout + duration
+                timeout=self.timeout,
+                hold=duration
             )
             return resp.status_code == 200
         except:
@@ -196,30 +1397,35 @@ class ECWDA:
     
     def swipe_up(self, duration: float = 0.5) -> bool:
         """向上滑动"""
-        cx = self.screen_width // 2
-        return self.swipe(cx, int(self.screen_height * 0.7), 
-                         cx, int(self.screen_height * 0.3), duration)
+        g = self.geometry
+        cx = g.width // 2
+        return self.swipe(cx, int(g.height * 0.7), 
+                         cx, int(g.height * 0.3), duration)
     
     def swipe_down(self, duration: float = 0.5) -> bool:
         """向下滑动"""
-        cx = self.screen_width // 2
-        return self.swipe(cx, int(self.screen_height * 0.3), 
-                         cx, int(self.screen_height * 0.7), duration)
+        g = self.geometry
+        cx = g.width // 2
+        return self.swipe(cx, int(g.height * 0.3), 
+                         cx, int(g.height * 0.7), duration)
     
     def swipe_left(self, duration: float = 0.5) -> bool:
         """向左滑动"""
-        cy = self.screen_height // 2
-        return self.swipe(int(self.screen_width * 0.8), cy,
-                         int(self.screen_width * 0.2), cy, duration)
+        g = self.geometry
+        cy = g.height // 2
+        return self.swipe(int(g.width * 0.8), cy,
+                         int(g.width * 0.2), cy, duration)
     
     def swipe_right(self, duration: float = 0.5) -> bool:
         """向右滑动"""
-        cy = self.screen_height // 2
-        return self.swipe(int(self.screen_width * 0.2), cy,
-                         int(self.screen_width * 0.8), cy, duration)
+        g = self.geometry
+        cy = g.height // 2
+        return self.swipe(int(g.width * 0.2), cy,
+                         int(g.width * 0.8), cy, duration)
     
     # ========== 截图函数 ==========
     
+    @_fail_fast
     def screenshot(self, save_path: Optional[str] = None) -> Optional[str]:
         """
         截取屏幕截图
@@ -231,7 +1437,7 @@ class ECWDA:
             str: Base64 编码的图片或保存路径
         """
         try:
-            resp = requests.get(f"{self.base_url}/screenshot", timeout=self.timeout)
+            resp = self._request("GET", "/screenshot", timeout=self.timeout)
             data = resp.json()
             
             if "value" in data:
@@ -254,6 +1460,12 @@ class ECWDA:
         """
         获取指定坐标的颜色
         
+        设备提供 /wda/pixel 时按设备档案选择设备端或电脑端中更快的一方，见 probe_capabilities。
+        routing="auto" 且还没有档案时，第一次调用会先同步探测 (约 20 个请求，数秒)，
+        并保存到磁盘；不希望首次调用变慢时可以在启动时先调用 probe_capabilities()。
+        设备端不检查越界，坐标不在截图范围内 (或截图尺寸未知) 时使用电脑端；
+        设备端请求出错时也改用电脑端。
+        
         Args:
             x: X 坐标
             y: Y 坐标
@@ -261,6 +1473,19 @@ class ECWDA:
         Returns:
             str: 颜色值，如 "#FF5500"
         """
+        if self._route("pixel") == NATIVE and self._in_frame(x, y):
+            try:
+                data = self._native("pixel", "/wda/pixel", {"x": x, "y": y})
+                if data is not None:
+                    return data.get("color")
+            except DeviceUnavailableError:
+                raise
+            except Exception as e:
+                print(f"设备端取色失败，改用电脑端: {e}")
+        return self._get_pixel_color_local(x, y)
+    
+    def _get_pixel_color_local(self, x: int, y: int) -> Optional[str]:
+        """电脑端取色: 截图后在本地读取像素"""
         try:
             # 截图并获取像素颜色
             img_base64 = self.screenshot()
@@ -270,8 +1495,11 @@ class ECWDA:
             from PIL import Image
             import io
             
-            img_data = base64.b64decode(img_base64)
-            img = Image.open(io.BytesIO(img_data))
+            with span("decode.base64"):
+                img_data = base64.b64decode(img_base64)
+            with span("decode.png", bytes=len(img_data)):
+                img = Image.open(io.BytesIO(img_data))
+                img.load()
             
             # 获取像素
             pixel = img.getpixel((x, y))
@@ -286,6 +1514,12 @@ class ECWDA:
         """
         在屏幕中查找指定颜色
         
+        tolerance=0 时设备端和电脑端的结果一致，按设备档案和搜索区域大小选择更快的一方；
+        设备端按三通道差值之和判断容差，tolerance>0 时只有 routing="native" 才走设备端。
+        routing="auto" 且还没有档案时，第一次 tolerance=0 的调用会先同步探测
+        (约 20 个请求，数秒)，见 probe_capabilities；设备端请求出错时改用电脑端。
+        走设备端时区域先裁剪到截图范围内，截图尺寸未知或区域在截图外时使用电脑端
+        
         Args:
             color: 颜色值，如 "#FF5500"
             region: 查找区域 {"x": 0, "y": 0, "width": 375, "height": 667}
@@ -294,6 +1528,30 @@ class ECWDA:
         Returns:
             dict: 找到返回 {"x": 100, "y": 200}，否则返回 None
         """
+        pixels = region.get("width", 0) * region.get("height", 0) if region else 0
+        native = self._route("findColor", pixels, exact=tolerance == 0) == NATIVE
+        if native and region:
+            # 设备端不裁剪越界区域；截图尺寸未知或裁剪后为空时使用电脑端
+            size = self._frame_size()
+            rect = clip_region(region, *size) if size else None
+            native = rect is not None
+            if rect:
+                region = dict(zip(("x", "y", "width", "height"), rect))
+        if native:
+            try:
+                data = self._native("findColor", "/wda/findColor",
+                                    self._find_color_payload(color, region, tolerance))
+                if data is not None:
+                    return {"x": data["x"], "y": data["y"]} if data.get("found") else None
+            except DeviceUnavailableError:
+                raise
+            except Exception as e:
+                print(f"设备端找色失败，改用电脑端: {e}")
+        return self._find_color_local(color, region, tolerance)
+    
+    def _find_color_local(self, color: str, region: Optional[Dict] = None,
+                          tolerance: int = 10) -> Optional[Dict[str, int]]:
+        """电脑端找色: 截图后逐像素比较"""
         try:
             from PIL import Image
             import io
@@ -303,8 +1561,10 @@ class ECWDA:
             if not img_base64:
                 return None
             
-            img_data = base64.b64decode(img_base64)
-            img = Image.open(io.BytesIO(img_data)).convert("RGB")
+            with span("decode.base64"):
+                img_data = base64.b64decode(img_base64)
+            with span("decode.png", bytes=len(img_data)):
+                img = Image.open(io.BytesIO(img_data)).convert("RGB")
             
             # 解析目标颜色
             target_color = self._parse_color(color)
@@ -322,11 +1582,12 @@ class ECWDA:
                 x_end, y_end = img.width, img.height
             
             # 遍历像素查找
-            for y in range(y_start, min(y_end, img.height)):
-                for x in range(x_start, min(x_end, img.width)):
-                    pixel = img.getpixel((x, y))
-                    if self._color_match(pixel, target_color, tolerance):
-                        return {"x": x, "y": y}
+            with span("search"):
+                for y in range(y_start, min(y_end, img.height)):
+                    for x in range(x_start, min(x_end, img.width)):
+                        pixel = img.getpixel((x, y))
+                        if self._color_match(pixel, target_color, tolerance):
+                            return {"x": x, "y": y}
             
             return None
         except Exception as e:
@@ -357,8 +1618,10 @@ class ECWDA:
             if not img_base64:
                 return None
             
-            img_data = base64.b64decode(img_base64)
-            img = Image.open(io.BytesIO(img_data)).convert("RGB")
+            with span("decode.base64"):
+                img_data = base64.b64decode(img_base64)
+            with span("decode.png", bytes=len(img_data)):
+                img = Image.open(io.BytesIO(img_data)).convert("RGB")
             
             # 解析第一个颜色
             target_color = self._parse_color(first_color)
@@ -386,31 +1649,32 @@ class ECWDA:
                 x_end, y_end = img.width, img.height
             
             # 遍历查找
-            for y in range(y_start, min(y_end, img.height)):
-                for x in range(x_start, min(x_end, img.width)):
-                    pixel = img.getpixel((x, y))
-                    
-                    # 检查第一个颜色
-                    if not self._color_match(pixel, target_color, tolerance):
-                        continue
-                    
-                    # 检查所有偏移颜色
-                    all_match = True
-                    for oc in parsed_offsets:
-                        ox = x + oc["offset"][0]
-                        oy = y + oc["offset"][1]
+            with span("search"):
+                for y in range(y_start, min(y_end, img.height)):
+                    for x in range(x_start, min(x_end, img.width)):
+                        pixel = img.getpixel((x, y))
                         
-                        if ox < 0 or ox >= img.width or oy < 0 or oy >= img.height:
-                            all_match = False
-                            break
+                        # 检查第一个颜色
+                        if not self._color_match(pixel, target_color, tolerance):
+                            continue
                         
-                        offset_pixel = img.getpixel((ox, oy))
-                        if not self._color_match(offset_pixel, oc["color"], tolerance):
-                            all_match = False
-                            break
-                    
-                    if all_match:
-                        return {"x": x, "y": y}
+                        # 检查所有偏移颜色
+                        all_match = True
+                        for oc in parsed_offsets:
+                            ox = x + oc["offset"][0]
+                            oy = y + oc["offset"][1]
+                            
+                            if ox < 0 or ox >= img.width or oy < 0 or oy >= img.height:
+                                all_match = False
+                                break
+                            
+                            offset_pixel = img.getpixel((ox, oy))
+                            if not self._color_match(offset_pixel, oc["color"], tolerance):
+                                all_match = False
+                                break
+                        
+                        if all_match:
+                            return {"x": x, "y": y}
             
             return None
         except Exception as e:
@@ -441,6 +1705,118 @@ class ECWDA:
             return self._color_match(actual, target, tolerance)
         return False
     
+    # ========== 区域统计 ==========
+    
+    def get_frame(self, max_age: float = 0) -> Optional[Frame]:
+        """
+        获取当前帧 (区域统计的基础)
+        
+        Args:
+            max_age: 允许复用的上一帧最大时长（秒），0 表示总是重新截图
+            
+        Returns:
+            Frame: 当前帧，截图失败返回 None
+        """
+        frame = self._last_frame
+        if frame and max_age > 0 and time.time() - frame.timestamp <= max_age:
+            return frame
+        
+        img_base64 = self.screenshot()
+        if not img_base64:
+            return None
+        self._last_frame = Frame(img_base64)
+        self.node_cache.on_frame(self._last_frame.hash)
+        return self._last_frame
+    
+    def region_mean(self, region: Optional[Dict] = None,
+                    frame: Optional[Frame] = None) -> Optional[Tuple[float, float, float]]:
+        """
+        区域平均颜色
+        
+        Args:
+            region: 统计区域 {"x", "y", "width", "height"}，不传为全屏
+            frame: 使用的帧，不传则重新截图；多个区域共用同一帧时只需预计算一次
+            
+        Returns:
+            tuple: (R, G, B) 均值，失败返回 None
+        """
+        try:
+            frame = frame or self.get_frame()
+            if frame:
+                return frame.region_mean(region)
+        except DeviceUnavailableError:
+            raise
+        except Exception as e:
+            print(f"区域统计失败: {e}")
+        return None
+    
+    def region_std(self, region: Optional[Dict] = None,
+                   frame: Optional[Frame] = None) -> Optional[Tuple[float, float, float]]:
+        """
+        区域颜色标准差 (纯色区域接近 0，可用于判断加载遮罩、空白页)
+        
+        Args:
+            region: 统计区域
+            frame: 使用的帧
+            
+        Returns:
+            tuple: (R, G, B) 标准差，失败返回 None
+        """
+        try:
+            frame = frame or self.get_frame()
+            if frame:
+                return frame.region_std(region)
+        except DeviceUnavailableError:
+            raise
+        except Exception as e:
+            print(f"区域统计失败: {e}")
+        return None
+    
+    def region_brightness(self, region: Optional[Dict] = None,
+                          frame: Optional[Frame] = None) -> Optional[float]:
+        """
+        区域平均亮度 (0-255，可用于判断深色模式、按钮禁用状态)
+        
+        Args:
+            region: 统计区域
+            frame: 使用的帧
+            
+        Returns:
+            float: 亮度均值，失败返回 None
+        """
+        mean = self.region_mean(region, frame)
+        if not mean:
+            return None
+        return 0.299 * mean[0] + 0.587 * mean[1] + 0.114 * mean[2]
+    
+    def region_fraction_matching(self, color: str, region: Optional[Dict] = None,
+                                 tolerance: int = 10,
+                                 frame: Optional[Frame] = None) -> float:
+        """
+        区域内与指定颜色相近的像素比例
+        
+        Args:
+            color: 颜色值，如 "#FF5500"
+            region: 统计区域
+            tolerance: 容差值
+            frame: 使用的帧
+            
+        Returns:
+            float: 匹配比例 (0-1)
+        """
+        target = self._parse_color(color)
+        if not target:
+            return 0.0
+        try:
+            frame = frame or self.get_frame()
+            if frame:
+                return frame.region_fraction_matching(target, region, tolerance)
+        except DeviceUnavailableError:
+            raise
+        except Exception as e:
+            print(f"区域统计失败: {e}")
+        return 0.0
+    
     def _parse_color(self, color: str) -> Optional[Tuple[int, int, int]]:
         """解析颜色字符串"""
         try:
@@ -463,39 +1839,64 @@ class ECWDA:
     
     # ========== OCR 函数 ==========
     
-    def ocr(self, region: Optional[Dict] = None) -> List[Dict]:
+    def ocr(self, region: Optional[Dict] = None, frame: Optional[Frame] = None) -> List[Dict]:
         """
         OCR 文字识别（需要服务端支持）
         
         Args:
             region: 识别区域
+            frame: 调用方刚获取的当前帧，传入时按该帧缓存结果，见 ocr_native
             
         Returns:
             list: 识别结果 [{"text": "设置", "x": 100, "y": 200}]
         """
-        # TODO: 需要在 WDA 中添加 OCR 支持
-        # 目前返回空列表
-        return []
+        return self.ocr_native(region, frame=frame)
     
-    def find_text(self, text: str, region: Optional[Dict] = None) -> Optional[Dict[str, int]]:
+    def find_text(self, text: str, region: Optional[Dict] = None,
+                  frame: Optional[Frame] = None) -> Optional[Dict[str, int]]:
         """
         查找文字位置
         
         Args:
             text: 要查找的文字
             region: 查找区域
+            frame: 调用方刚获取的当前帧，传入时同一帧上的重复查找共用一次 OCR
             
         Returns:
             dict: 找到返回坐标
         """
-        results = self.ocr(region)
+        results = self.ocr(region, frame=frame)
         for item in results:
             if text in item.get("text", ""):
                 return {"x": item["x"], "y": item["y"]}
         return None
     
+    def find_texts(self, texts: List[str], region: Optional[Dict] = None,
+                   frame: Optional[Frame] = None) -> Dict[str, Optional[Dict[str, int]]]:
+        """
+        批量查找文字位置 (只做一次 OCR)
+        
+        Args:
+            texts: 要查找的文字列表
+            region: 查找区域
+            frame: 调用方刚获取的当前帧，传入时按该帧缓存 OCR 结果
+            
+        Returns:
+            dict: {文字: 坐标或 None}
+        """
+        results = self.ocr(region, frame=frame)
+        found: Dict[str, Optional[Dict[str, int]]] = {}
+        for text in texts:
+            found[text] = None
+            for item in results:
+                if text in item.get("text", ""):
+                    found[text] = {"x": item["x"], "y": item["y"]}
+                    break
+        return found
+    
     # ========== 设备函数 ==========
     
+    @_fail_fast
     def get_device_info(self) -> Dict[str, Any]:
         """
         获取设备信息
@@ -503,16 +1904,17 @@ class ECWDA:
         Returns:
             dict: 设备信息
         """
+        g = self.geometry
         info = {
             "name": "Unknown",
             "os_version": "Unknown",
-            "screen_width": self.screen_width,
-            "screen_height": self.screen_height,
+            "screen_width": g.width,
+            "screen_height": g.height,
             "battery": 100
         }
         
         try:
-            resp = requests.get(f"{self.base_url}/status", timeout=5)
+            resp = self._request("GET", "/status", timeout=5)
             data = resp.json()
             
             if "value" in data:
@@ -533,10 +1935,11 @@ class ECWDA:
         """
         self._ensure_session()
         self._update_screen_size()
-        return (self.screen_width, self.screen_height)
+        return tuple(self.geometry)
     
     # ========== 应用管理 ==========
     
+    @_fail_fast
     def launch_app(self, bundle_id: str) -> bool:
         """
         启动应用
@@ -548,9 +1951,10 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/apps/launch",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/apps/launch",
                 json={"bundleId": bundle_id},
                 timeout=self.timeout
             )
@@ -558,6 +1962,7 @@ class ECWDA:
         except:
             return False
     
+    @_fail_fast
     def terminate_app(self, bundle_id: str) -> bool:
         """
         关闭应用
@@ -569,9 +1974,10 @@ class ECWDA:
             bool: 是否成功
         """
         self._ensure_session()
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/session/{self.session_id}/wda/apps/terminate",
+            resp = self._request(
+                "POST", f"/session/{self.session_id}/wda/apps/terminate",
                 json={"bundleId": bundle_id},
                 timeout=self.timeout
             )
@@ -579,6 +1985,7 @@ class ECWDA:
         except:
             return False
     
+    @_fail_fast
     def home(self) -> bool:
         """
         返回主屏幕
@@ -586,9 +1993,10 @@ class ECWDA:
         Returns:
             bool: 是否成功
         """
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/homescreen",
+            resp = self._request(
+                "POST", "/wda/homescreen",
                 timeout=self.timeout
             )
             return resp.status_code == 200
@@ -630,6 +2038,7 @@ class ECWDA:
     
     # ========== 脱机脚本执行 ==========
     
+    @_fail_fast
     def execute_script(self, commands: List[Dict], script_id: Optional[str] = None) -> Dict:
         """
         执行脚本 (脱机模式)
@@ -646,8 +2055,8 @@ class ECWDA:
             if script_id:
                 payload["scriptId"] = script_id
                 
-            resp = requests.post(
-                f"{self.base_url}/wda/script/execute",
+            resp = self._request(
+                "POST", "/wda/script/execute",
                 json=payload,
                 timeout=self.timeout
             )
@@ -655,6 +2064,7 @@ class ECWDA:
         except Exception as e:
             return {"error": str(e)}
     
+    @_fail_fast
     def get_script_status(self) -> Dict:
         """
         获取脚本执行状态
@@ -663,14 +2073,15 @@ class ECWDA:
             dict: 状态信息
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/script/status",
+            resp = self._request(
+                "GET", "/wda/script/status",
                 timeout=self.timeout
             )
             return resp.json().get("value", {})
         except Exception as e:
             return {"error": str(e)}
     
+    @_fail_fast
     def stop_script(self) -> bool:
         """
         停止脚本执行
@@ -679,16 +2090,277 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/script/stop",
+            resp = self._request(
+                "POST", "/wda/script/stop",
                 timeout=self.timeout
             )
             return resp.status_code == 200
         except:
             return False
     
+    # ========== 设备能力 ==========
+    
+    @property
+    def device_key(self) -> str:
+        """设备标识，用作设备档案的键 (device_id，没有时为服务地址)"""
+        return self.device_id or self.base_url
+    
+    def probe_capabilities(self, force: bool = False, max_age: float = PROFILE_MAX_AGE,
+                           samples: int = 3) -> DeviceProfile:
+        """
+        探测设备支持的扩展接口，并测量找色、取色在设备端和电脑端的耗时，
+        结果按设备保存到磁盘 (~/.ecwda/devices)，之后直接读取
+        
+        routing="auto" 时 find_color / get_pixel_color 按该档案选择更快的实现；
+        没有档案时它们第一次调用会自动执行本方法，启动时先调用可以避免首次调用变慢
+        
+        Args:
+            force: 忽略已保存的档案，重新探测
+            max_age: 已保存的档案超过该时间（秒）后重新探测，默认 7 天
+            samples: 每项测量的次数，取中位数
+            
+        Returns:
+            DeviceProfile: 设备档案 (同时保存在 self.profile)
+        """
+        with self._profile_lock:
+            profile = None
+            if not force:
+                profile = self.profile or self.profile_store.load(self.device_key)
+            if profile is None or profile.age > max_age:
+                profile = self._measure_profile(samples)
+                self._save_profile(profile)
+            self.profile = profile
+            self._profile_checked = True
+            return profile
+    
+    def _measure_profile(self, samples: int) -> DeviceProfile:
+        """实际探测，设备无法连接时抛出请求异常"""
+        from PIL import Image
+        
+        def median(fn: Callable[[], Any]) -> float:
+            times = []
+            for _ in range(max(1, samples)):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            return sorted(times)[len(times) // 2]
+        
+        info = None
+        resp = self._request("GET", "/wda/ecwda/info", timeout=5)
+        if resp.status_code == 200:
+            info = resp.json().get("value") or None
+        features = list(info.get("features", [])) if isinstance(info, dict) else []
+        previous = self.profile
+        profile = DeviceProfile(self.device_key, info, features, probed_at=time.time(),
+                                screen_size=previous.screen_size if previous else None)
+        self._calibrate(profile)
+        
+        def native(feature: str, path: str, payload: Dict) -> Optional[float]:
+            resp = self._request("POST", path, json=payload, timeout=30)
+            if resp.status_code in (404, 405):
+                profile.mark_unsupported(feature)
+                return None
+            return median(lambda: self._request("POST", path, json=payload, timeout=30))
+        
+        # 电脑端: 截图传输 + 解码是固定开销，逐像素比较是每像素开销
+        def capture():
+            img_data = base64.b64decode(self.screenshot() or "")
+            return Image.open(io.BytesIO(img_data)).convert("RGB")
+        
+        img = capture()
+        profile.frame_size = [img.width, img.height]
+        self._session_frame = (self.session_id, (img.width, img.height))
+        shot = median(capture)
+        transfer = median(self.screenshot)
+        size = len(self.screenshot() or "")
+        profile.link["bandwidth"] = size / max(transfer - profile.link.get("rtt", 0.0), 1e-3)
+        block_w, block_h = min(64, img.width), min(64, img.height)
+        
+        def scan():
+            for y in range(block_h):
+                for x in range(block_w):
+                    self._color_match(img.getpixel((x, y)), (0, 0, 0), -1)
+        
+        profile.timings["findColor.local"] = [shot, median(scan) / (block_w * block_h)]
+        profile.timings["pixel.local"] = [shot, 0.0]
+        
+        # 设备端: tolerance=-1 不会命中，测的是搜索整个区域的耗时
+        if profile.supports("findColor"):
+            small = {"x": 0, "y": 0, "width": block_w, "height": block_h}
+            t_small = native("findColor", "/wda/findColor",
+                             self._find_color_payload("#000000", small, -1))
+            t_full = native("findColor", "/wda/findColor",
+                            self._find_color_payload("#000000", None, -1))
+            if t_small is not None and t_full is not None:
+                extra = profile.frame_pixels - block_w * block_h
+                per_pixel = max(0.0, t_full - t_small) / extra if extra > 0 else 0.0
+                profile.timings["findColor.native"] = [
+                    max(0.0, t_small - per_pixel * block_w * block_h), per_pixel]
+        if profile.supports("pixel"):
+            t_pixel = native("pixel", "/wda/pixel", {"x": 0, "y": 0})
+            if t_pixel is not None:
+                profile.timings["pixel.native"] = [t_pixel, 0.0]
+        return profile
+    
+    def _calibrate(self, profile: DeviceProfile, session_id: Optional[str] = None):
+        """向设备核对设备信息、往返延迟和屏幕尺寸 (需要会话)，写入档案"""
+        start = time.perf_counter()
+        resp = self._request("GET", "/status", timeout=5, coalesce=False)
+        profile.link["rtt"] = time.perf_counter() - start
+        ios = resp.json().get("value", {}).get("ios", {})
+        profile.name = ios.get("name") or profile.name
+        profile.os_version = ios.get("sdkVersion") or profile.os_version
+        session_id = session_id or self.session_id
+        if session_id and self._update_screen_size(session_id):
+            profile.screen_size = list(self.geometry)
+        profile.validated_at = time.time()
+    
+    def _revalidate_profile(self, session_id: str):
+        """
+        后台核对档案 (create_session 使用档案中的屏幕尺寸时运行)，尺寸有变化时 geometry 随之更新
+        
+        校准结果写入新的档案对象，在 _profile_lock 内合并到当前档案的副本后整体替换，
+        其它线程读到的 self.profile 不会是改了一半的档案
+        """
+        try:
+            calibrated = DeviceProfile(self.device_key)
+            self._calibrate(calibrated, session_id)
+            with self._profile_lock:
+                profile = calibrated
+                if self.profile is not None:
+                    profile = DeviceProfile.from_dict(self.profile.to_dict())
+                    profile.name = calibrated.name or profile.name
+                    profile.os_version = calibrated.os_version or profile.os_version
+                    profile.screen_size = calibrated.screen_size or profile.screen_size
+                    profile.link.update(calibrated.link)
+                    profile.validated_at = calibrated.validated_at
+                self.profile = profile
+                self._save_profile(profile)
+        except Exception:
+            pass
+    
+    def _cached_screen_size(self) -> bool:
+        """
+        是否可以直接使用档案中的屏幕尺寸 (不先同步请求 /window/size)
+        
+        只在传入 device_id 时成立: 没有 device_id 时档案按服务地址区分，
+        同一个地址 (如 iproxy 转发的 localhost:8100) 换了手机后档案属于上一台设备
+        """
+        profile = self.profile
+        return bool(self.cache_profile and self.device_id
+                    and profile is not None and profile.screen_size)
+    
+    def _save_profile(self, profile: DeviceProfile):
+        """保存档案，目录不可写时只保留在内存中"""
+        try:
+            self.profile_store.save(profile)
+        except OSError:
+            pass
+    
+    def _load_profile(self) -> Optional[DeviceProfile]:
+        """第一次需要时读取档案，没有或已过期时按 auto_probe 探测；每个客户端只尝试一次"""
+        if self._profile_checked:
+            return self.profile
+        with self._profile_lock:
+            if not self._profile_checked:
+                self._profile_checked = True
+                self.profile = self.profile or self.profile_store.load(self.device_key)
+                if self.auto_probe and (self.profile is None
+                                        or self.profile.age > PROFILE_MAX_AGE):
+                    try:
+                        self.probe_capabilities(force=True)
+                    except Exception as e:
+                        print(f"设备能力探测失败: {e}")
+        return self.profile
+    
+    def _route(self, op: str, pixels: int = 0, exact: bool = True) -> str:
+        """
+        选择设备端 / 电脑端实现
+        
+        Args:
+            op: 档案中的操作名，如 "findColor" / "pixel"
+            pixels: 搜索像素数，0 表示整屏
+            exact: 两种实现结果是否一致，不一致时 auto 模式保持电脑端
+            
+        Returns:
+            str: NATIVE / LOCAL
+        """
+        if self.routing != "auto":
+            return self.routing
+        if not exact:
+            return LOCAL
+        profile = self._load_profile()
+        if profile is None:
+            return LOCAL
+        # 没有 device_id 时档案按服务地址区分，截图尺寸与当前设备不符说明档案 (功能、耗时) 属于其它设备
+        if not self.device_id and profile.frame_size and \
+                self._frame_size() != tuple(profile.frame_size):
+            return LOCAL
+        return profile.choose(op, pixels)
+    
+    def _frame_size(self) -> Optional[Tuple[int, int]]:
+        """
+        当前设备的截图尺寸 (像素)
+        
+        传入 device_id 时使用档案中的尺寸；没有 device_id 时档案可能属于同一地址上的上一台设备，
+        每个会话第一次调用时截图读取实际尺寸
+        
+        Returns:
+            tuple: (宽, 高)，未知时返回 None
+        """
+        if self.device_id:
+            profile = self.profile
+            return tuple(profile.frame_size) if profile and profile.frame_size else None
+        self._ensure_session()
+        session_id = self.session_id
+        cached = self._session_frame
+        if cached and cached[0] == session_id:
+            return cached[1]
+        frame = self.get_frame()
+        if not frame:
+            return None
+        size = (frame.width, frame.height)
+        self._session_frame = (session_id, size)
+        return size
+    
+    def _in_frame(self, x: int, y: int) -> bool:
+        """坐标是否在截图范围内；截图尺寸未知时只有 routing="native" 才视为在范围内"""
+        size = self._frame_size()
+        if not size:
+            return self.routing == NATIVE
+        width, height = size
+        return 0 <= x < width and 0 <= y < height
+    
+    def _native(self, feature: str, path: str, payload: Dict) -> Optional[Dict]:
+        """
+        调用扩展接口
+        
+        Returns:
+            dict: 响应的 value；设备没有该路由 (404/405) 时从档案中去掉该功能并返回 None，
+                  由调用方改用电脑端实现；其它错误状态抛出 RuntimeError
+        """
+        resp = self._request("POST", path, json=payload, timeout=self.timeout, coalesce=True)
+        if resp.status_code in (404, 405):
+            profile = self.profile
+            if profile is not None and profile.supports(feature):
+                profile.mark_unsupported(feature)
+                self._save_profile(profile)
+            return None
+        if resp.status_code != 200:
+            raise RuntimeError(f"{path} 返回 HTTP {resp.status_code}")
+        return resp.json().get("value", {})
+    
+    @staticmethod
+    def _find_color_payload(color: str, region: Optional[Dict], tolerance: int) -> Dict:
+        """设备端找色请求体 (设备按三通道差值之和 <= (1 - similarity) * 765 判断)"""
+        payload = {"color": color, "tolerance": tolerance, "similarity": 1 - tolerance / 255}
+        if region:
+            payload["region"] = region
+        return payload
+    
     # ========== 扩展 API (需要 ECWDA 扩展) ==========
     
+    @_fail_fast
     def find_color_native(self, color: str, region: Optional[Dict] = None, 
                           tolerance: int = 10) -> Optional[Dict[str, int]]:
         """
@@ -703,14 +2375,11 @@ class ECWDA:
             dict: 找到返回坐标
         """
         try:
-            payload = {"color": color, "tolerance": tolerance}
-            if region:
-                payload["region"] = region
-            
-            resp = requests.post(
-                f"{self.base_url}/wda/findColor",
-                json=payload,
-                timeout=self.timeout
+            resp = self._request(
+                "POST", "/wda/findColor",
+                json=self._find_color_payload(color, region, tolerance),
+                timeout=self.timeout,
+                coalesce=True
             )
             data = resp.json().get("value", {})
             if data.get("found"):
@@ -719,6 +2388,7 @@ class ECWDA:
             pass
         return None
     
+    @_fail_fast
     def get_pixel_native(self, x: int, y: int) -> Optional[Dict]:
         """
         获取像素颜色 (使用原生 API)
@@ -731,42 +2401,63 @@ class ECWDA:
             dict: 颜色信息
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/pixel",
+            resp = self._request(
+                "POST", "/wda/pixel",
                 json={"x": x, "y": y},
-                timeout=self.timeout
+                timeout=self.timeout,
+                coalesce=True
             )
             return resp.json().get("value", {})
         except:
             return None
     
-    def ocr_native(self, region: Optional[Dict] = None) -> List[Dict]:
+    @_fail_fast
+    def ocr_native(self, region: Optional[Dict] = None, use_cache: bool = True,
+                   frame: Optional[Frame] = None) -> List[Dict]:
         """
         OCR 文字识别 (使用原生 API)
         
+        设备端识别的是它自己截取的画面，客户端不会为了缓存额外截图；
+        只有调用方传入刚获取的 frame 时才按该帧的内容哈希缓存，同一帧上的重复识别直接返回。
+        
         Args:
             region: 识别区域
+            use_cache: 是否使用 OCR 缓存 (需要同时传入 frame)
+            frame: 调用方刚获取的当前帧 (如 get_frame() 的返回)，作为缓存键
             
         Returns:
             list: 识别结果
         """
+        key = None
+        if use_cache and frame is not None:
+            key = (frame.hash, _normalize_region(region))
+            cached = self.ocr_cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
             payload = {}
             if region:
                 payload["region"] = region
             
-            resp = requests.post(
-                f"{self.base_url}/wda/ocr/recognize",
+            resp = self._request(
+                "POST", "/wda/ocr/recognize",
                 json=payload,
-                timeout=30  # OCR 可能需要更长时间
+                timeout=30,  # OCR 可能需要更长时间
+                coalesce=True
             )
             data = resp.json().get("value", {})
-            return data.get("texts", [])
+            results = data.get("texts", data.get("results", []))
         except:
             return []
+        
+        if key is not None and resp.status_code == 200:
+            self.ocr_cache.put(key, results)
+        return results
     
     # ========== Phase 2: 找图功能 ==========
     
+    @_fail_fast
     def find_image(self, template_path: str, region: Optional[Dict] = None,
                    threshold: float = 0.9) -> Optional[Dict]:
         """
@@ -782,17 +2473,19 @@ class ECWDA:
         """
         try:
             # 读取模板图片并转为 base64
-            with open(template_path, "rb") as f:
-                template_base64 = base64.b64encode(f.read()).decode()
+            with span("read_template"):
+                with open(template_path, "rb") as f:
+                    template_base64 = base64.b64encode(f.read()).decode()
             
             payload = {"template": template_base64, "threshold": threshold}
             if region:
                 payload["region"] = region
             
-            resp = requests.post(
-                f"{self.base_url}/wda/findImage",
+            resp = self._request(
+                "POST", "/wda/findImage",
                 json=payload,
-                timeout=30
+                timeout=30,
+                coalesce=True
             )
             data = resp.json().get("value", {})
             if data.get("found"):
@@ -828,6 +2521,7 @@ class ECWDA:
     
     # ========== Phase 2: 二维码识别 ==========
     
+    @_fail_fast
     def decode_qrcode(self, region: Optional[Dict] = None) -> List[Dict]:
         """
         识别屏幕上的二维码
@@ -843,10 +2537,11 @@ class ECWDA:
             if region:
                 payload["region"] = region
             
-            resp = requests.post(
-                f"{self.base_url}/wda/qrcode/decode",
+            resp = self._request(
+                "POST", "/wda/qrcode/decode",
                 json=payload,
-                timeout=30
+                timeout=30,
+                coalesce=True
             )
             data = resp.json().get("value", {})
             return data.get("codes", [])
@@ -855,6 +2550,7 @@ class ECWDA:
     
     # ========== Phase 2: 剪贴板 ==========
     
+    @_fail_fast
     def get_clipboard(self) -> str:
         """
         获取剪贴板内容
@@ -863,14 +2559,15 @@ class ECWDA:
             str: 剪贴板文本
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/clipboard",
+            resp = self._request(
+                "GET", "/wda/clipboard",
                 timeout=self.timeout
             )
             return resp.json().get("value", {}).get("content", "")
         except:
             return ""
     
+    @_fail_fast
     def set_clipboard(self, content: str) -> bool:
         """
         设置剪贴板内容
@@ -882,8 +2579,8 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/clipboard",
+            resp = self._request(
+                "POST", "/wda/clipboard",
                 json={"content": content},
                 timeout=self.timeout
             )
@@ -893,6 +2590,7 @@ class ECWDA:
     
     # ========== Phase 2: 文件操作 ==========
     
+    @_fail_fast
     def get_sandbox_path(self) -> Dict[str, str]:
         """
         获取沙盒目录路径
@@ -901,14 +2599,15 @@ class ECWDA:
             dict: {"documents", "caches", "tmp"}
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/file/sandbox",
+            resp = self._request(
+                "GET", "/wda/file/sandbox",
                 timeout=self.timeout
             )
             return resp.json().get("value", {})
         except:
             return {}
     
+    @_fail_fast
     def read_file(self, path: str) -> Optional[str]:
         """
         读取文件
@@ -920,8 +2619,8 @@ class ECWDA:
             str: 文件内容
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/file/read",
+            resp = self._request(
+                "POST", "/wda/file/read",
                 json={"path": path},
                 timeout=self.timeout
             )
@@ -929,6 +2628,7 @@ class ECWDA:
         except:
             return None
     
+    @_fail_fast
     def write_file(self, path: str, content: str) -> bool:
         """
         写入文件
@@ -941,8 +2641,8 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/file/write",
+            resp = self._request(
+                "POST", "/wda/file/write",
                 json={"path": path, "content": content},
                 timeout=self.timeout
             )
@@ -950,6 +2650,7 @@ class ECWDA:
         except:
             return False
     
+    @_fail_fast
     def list_files(self, path: str) -> List[Dict]:
         """
         列出目录内容
@@ -961,8 +2662,8 @@ class ECWDA:
             list: 文件列表
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/file/list",
+            resp = self._request(
+                "POST", "/wda/file/list",
                 json={"path": path},
                 timeout=self.timeout
             )
@@ -970,6 +2671,7 @@ class ECWDA:
         except:
             return []
     
+    @_fail_fast
     def delete_file(self, path: str) -> bool:
         """
         删除文件
@@ -981,8 +2683,8 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/file/delete",
+            resp = self._request(
+                "POST", "/wda/file/delete",
                 json={"path": path},
                 timeout=self.timeout
             )
@@ -992,6 +2694,7 @@ class ECWDA:
     
     # ========== Phase 2: 文本输入 ==========
     
+    @_fail_fast
     def input_text(self, text: str) -> bool:
         """
         输入文本（需要先点击输入框）
@@ -1002,9 +2705,10 @@ class ECWDA:
         Returns:
             bool: 是否成功
         """
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/inputText",
+            resp = self._request(
+                "POST", "/wda/inputText",
                 json={"text": text},
                 timeout=self.timeout
             )
@@ -1014,6 +2718,7 @@ class ECWDA:
     
     # ========== Phase 2: 打开 URL ==========
     
+    @_fail_fast
     def open_url(self, url: str) -> bool:
         """
         打开 URL（跳转到浏览器或 App）
@@ -1024,9 +2729,10 @@ class ECWDA:
         Returns:
             bool: 是否成功
         """
+        self.node_cache.invalidate()
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/openUrl",
+            resp = self._request(
+                "POST", "/wda/openUrl",
                 json={"url": url},
                 timeout=self.timeout
             )
@@ -1036,47 +2742,95 @@ class ECWDA:
     
     # ========== Phase 3: 节点操作 ==========
     
-    def find_node_by_text(self, text: str, partial: bool = True) -> List[Dict]:
+    def get_node_snapshot(self, refresh: bool = False) -> Optional[NodeSnapshot]:
+        """
+        获取页面节点快照 (带本地索引)
+        
+        一次请求获取整页节点，之后的按文字/类型/坐标查询都在本地完成。
+        
+        Args:
+            refresh: 是否忽略缓存强制重新获取
+            
+        Returns:
+            NodeSnapshot: 节点快照，获取失败返回 None
+        """
+        if not refresh:
+            snap = self.node_cache.get()
+            if snap:
+                return snap
+        
+        frame_hash = self._last_frame.hash if self._last_frame else None
+        nodes = self.get_all_nodes()
+        if not nodes:
+            tree = self.get_source_tree()
+            if tree:
+                nodes = tree.to_nodes()
+        if not nodes:
+            return None
+        
+        snap = NodeSnapshot(nodes, frame_hash)
+        self.node_cache.put(snap)
+        return snap
+    
+    @_fail_fast
+    def find_node_by_text(self, text: str, partial: bool = True,
+                          use_cache: bool = True) -> List[Dict]:
         """
         通过文字查找节点
         
         Args:
             text: 要查找的文字
             partial: 是否部分匹配
+            use_cache: 是否使用本地节点快照
             
         Returns:
             list: 节点列表
         """
+        if use_cache:
+            snap = self.get_node_snapshot()
+            if snap:
+                return snap.find_by_text(text, partial)
+        
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/node/findByText",
+            resp = self._request(
+                "POST", "/wda/node/findByText",
                 json={"text": text, "partial": partial},
-                timeout=self.timeout
+                timeout=self.timeout,
+                coalesce=True
             )
             return resp.json().get("value", {}).get("nodes", [])
         except:
             return []
     
-    def find_node_by_type(self, node_type: str) -> List[Dict]:
+    @_fail_fast
+    def find_node_by_type(self, node_type: str, use_cache: bool = True) -> List[Dict]:
         """
         通过类型查找节点
         
         Args:
             node_type: 节点类型 (button, textField, staticText, image, cell, link, switch, slider)
+            use_cache: 是否使用本地节点快照
             
         Returns:
             list: 节点列表
         """
+        if use_cache:
+            snap = self.get_node_snapshot()
+            if snap:
+                return snap.find_by_type(node_type)
+        
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/node/findByType",
+            resp = self._request(
+                "POST", "/wda/node/findByType",
                 json={"type": node_type},
-                timeout=self.timeout
+                timeout=self.timeout,
+                coalesce=True
             )
             return resp.json().get("value", {}).get("nodes", [])
         except:
             return []
     
+    @_fail_fast
     def get_all_nodes(self) -> List[Dict]:
         """
         获取页面所有可交互节点
@@ -1085,16 +2839,134 @@ class ECWDA:
             list: 节点列表
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/node/all",
+            resp = self._request(
+                "GET", "/wda/node/all",
                 timeout=self.timeout
             )
             return resp.json().get("value", {}).get("nodes", [])
         except:
             return []
     
+    @_fail_fast
+    def get_source(self) -> Optional[str]:
+        """
+        获取页面源码 (XML 页面树)
+        
+        Returns:
+            str: XML 字符串，失败返回 None
+        """
+        try:
+            resp = self._request("GET", "/source", timeout=30)
+            if resp.status_code == 200:
+                return resp.json().get("value")
+        except:
+            pass
+        return None
+    
+    def _stream_send(self, method: str, url: str, timeout: Optional[float] = None,
+                     **kwargs) -> requests.Response:
+        """page_source 流式下载使用的传输函数，经过 _request (熔断、自适应超时、指标、录制)"""
+        return self._request(method, url[len(self.base_url):], timeout=timeout, stream=True)
+    
+    @_fail_fast
+    def iter_source(self, predicate: Optional[Callable[[Dict], bool]] = None) -> Iterator[Dict]:
+        """
+        流式遍历页面元素 (边下载边解析，不把整段 XML 读入内存)
+        
+        Args:
+            predicate: 过滤条件，只产出满足条件的元素
+            
+        Yields:
+            dict: 元素属性，附加 depth / index / parent 字段
+        """
+        return iter_source_elements(self.base_url, predicate, send=self._stream_send)
+    
+    @_fail_fast
+    def find_source_element(self, predicate: Callable[[Dict], bool]) -> Optional[Dict]:
+        """
+        在页面源码中查找第一个满足条件的元素，找到后立即停止下载
+        
+        Args:
+            predicate: 匹配条件
+            
+        Returns:
+            dict: 元素，未找到或失败返回 None
+        """
+        try:
+            return find_source_element(self.base_url, predicate, send=self._stream_send)
+        except Exception as e:
+            print(f"查找元素失败: {e}")
+            return None
+    
+    @_fail_fast
+    def get_source_tree(self) -> Optional[CompactTree]:
+        """
+        获取整页紧凑树 (数组存储，适合保存几万个元素的大页面)
+        
+        Returns:
+            CompactTree: 页面树，失败返回 None
+        """
+        try:
+            return load_source_tree(self.base_url, send=self._stream_send)
+        except Exception as e:
+            print(f"获取页面树失败: {e}")
+            return None
+    
+    def watch_tree(self, callback: Callable[[TreeDiff], None], interval: float = 1.0,
+                   use_frames: bool = False) -> threading.Event:
+        """
+        后台监视页面树变化，只回调差异，并按差异增量更新节点快照
+        
+        Args:
+            callback: 回调函数，参数为 TreeDiff (inserted / removed / modified / moved)
+            interval: 轮询间隔（秒）
+            use_frames: 每次轮询先截图比较哈希，画面未变化时不请求页面源码
+                        (每次多一次整屏截图，只在页面源码很大、画面大多静止时划算)
+            
+        Returns:
+            threading.Event: 调用 set() 停止监视
+        """
+        stop = threading.Event()
+        
+        def loop():
+            prev_tree = prev_hashes = prev_frame = None
+            snap = None
+            while not stop.is_set():
+                try:
+                    frame_hash = None
+                    if use_frames:
+                        frame = self.get_frame()
+                        frame_hash = frame.hash if frame else None
+                        if prev_tree is not None and frame_hash and frame_hash == prev_frame:
+                            stop.wait(interval)
+                            continue
+                    
+                    tree = self.get_source_tree()
+                    if tree is not None:
+                        hashes = subtree_hashes(tree)
+                        diff = (tree_diff(prev_tree, tree, prev_hashes, hashes)
+                                if prev_tree is not None else None)
+                        if prev_tree is None or diff:
+                            # 缓存中仍是上一棵树的快照时按下标增量更新，否则整体重建
+                            base = self.node_cache.peek()
+                            if diff and base is not None and base is snap:
+                                snap = self.node_cache.apply_diff(base, diff, frame_hash)
+                            else:
+                                snap = NodeSnapshot.from_tree(tree, frame_hash)
+                                self.node_cache.put(snap)
+                        if diff:
+                            callback(diff)
+                        prev_tree, prev_hashes, prev_frame = tree, hashes, frame_hash
+                except Exception as e:
+                    print(f"监视页面树失败: {e}")
+                stop.wait(interval)
+        
+        threading.Thread(target=loop, daemon=True).start()
+        return stop
+    
+    @_fail_fast
     def click_node(self, text: Optional[str] = None, node_type: Optional[str] = None, 
-                   index: int = 0) -> bool:
+                   index: int = 0, use_cache: bool = True) -> bool:
         """
         点击节点
         
@@ -1102,10 +2974,29 @@ class ECWDA:
             text: 节点文字
             node_type: 节点类型
             index: 索引
+            use_cache: 是否使用本地节点快照定位，定位后直接点击节点中心；
+                       快照只含可交互节点，找不到 (如静态文字) 时仍由设备查找并点击
             
         Returns:
             bool: 是否成功
         """
+        if use_cache:
+            snap = self.get_node_snapshot()
+            if snap:
+                if text:
+                    nodes = snap.find_by_text(text)
+                    if node_type:
+                        wanted = _node_type({"type": node_type})
+                        nodes = [n for n in nodes if _node_type(n) == wanted]
+                elif node_type:
+                    nodes = snap.find_by_type(node_type)
+                else:
+                    nodes = snap.nodes
+                rect = _node_rect(nodes[index]) if index < len(nodes) else None
+                if rect:
+                    return self.click(int(rect[0] + rect[2] / 2), int(rect[1] + rect[3] / 2))
+        
+        self.node_cache.invalidate()
         try:
             payload = {"index": index}
             if text:
@@ -1113,8 +3004,8 @@ class ECWDA:
             if node_type:
                 payload["type"] = node_type
             
-            resp = requests.post(
-                f"{self.base_url}/wda/node/click",
+            resp = self._request(
+                "POST", "/wda/node/click",
                 json=payload,
                 timeout=self.timeout
             )
@@ -1122,16 +3013,22 @@ class ECWDA:
         except:
             return False
     
-    def click_text(self, text: str) -> bool:
+    def click_text(self, text: str, frame: Optional[Frame] = None) -> bool:
         """
         点击包含指定文字的节点
         
         Args:
             text: 文字
+            frame: 调用方刚获取的当前帧，传入时先用该帧的 OCR 结果 (按帧缓存) 定位文字，
+                   找不到再按节点点击
             
         Returns:
             bool: 是否成功
         """
+        if frame is not None:
+            pos = self.find_text(text, frame=frame)
+            if pos:
+                return self.click(pos["x"], pos["y"])
         return self.click_node(text=text)
     
     # ========== Phase 3: 工具函数 ==========
@@ -1148,8 +3045,8 @@ class ECWDA:
             int: 随机数
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/random",
+            resp = self._request(
+                "POST", "/wda/utils/random",
                 json={"min": min_val, "max": max_val},
                 timeout=self.timeout
             )
@@ -1169,8 +3066,8 @@ class ECWDA:
             str: MD5 值
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/md5",
+            resp = self._request(
+                "POST", "/wda/utils/md5",
                 json={"text": text},
                 timeout=self.timeout
             )
@@ -1190,8 +3087,8 @@ class ECWDA:
             str: 编码结果
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/base64/encode",
+            resp = self._request(
+                "POST", "/wda/utils/base64/encode",
                 json={"text": text},
                 timeout=self.timeout
             )
@@ -1210,8 +3107,8 @@ class ECWDA:
             str: 解码结果
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/base64/decode",
+            resp = self._request(
+                "POST", "/wda/utils/base64/decode",
                 json={"base64": b64},
                 timeout=self.timeout
             )
@@ -1219,6 +3116,7 @@ class ECWDA:
         except:
             return base64.b64decode(b64).decode()
     
+    @_fail_fast
     def vibrate(self) -> bool:
         """
         震动
@@ -1227,14 +3125,15 @@ class ECWDA:
             bool: 是否成功
         """
         try:
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/vibrate",
+            resp = self._request(
+                "POST", "/wda/utils/vibrate",
                 timeout=self.timeout
             )
             return resp.status_code == 200
         except:
             return False
     
+    @_fail_fast
     def save_to_album(self, image_path: str) -> bool:
         """
         保存图片到相册
@@ -1249,8 +3148,8 @@ class ECWDA:
             with open(image_path, "rb") as f:
                 image_base64 = base64.b64encode(f.read()).decode()
             
-            resp = requests.post(
-                f"{self.base_url}/wda/utils/saveToAlbum",
+            resp = self._request(
+                "POST", "/wda/utils/saveToAlbum",
                 json={"image": image_base64},
                 timeout=self.timeout
             )
@@ -1260,6 +3159,7 @@ class ECWDA:
     
     # ========== Phase 3: 应用管理 ==========
     
+    @_fail_fast
     def get_current_app(self) -> Dict:
         """
         获取当前应用信息
@@ -1268,8 +3168,8 @@ class ECWDA:
             dict: 应用信息 {"bundleId", "processId", "state"}
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/app/current",
+            resp = self._request(
+                "GET", "/wda/app/current",
                 timeout=self.timeout
             )
             return resp.json().get("value", {})
@@ -1278,6 +3178,7 @@ class ECWDA:
     
     # ========== YOLO 目标检测 ==========
     
+    @_fail_fast
     def yolo_load_model(self, model_name: str, class_labels: Optional[List[str]] = None) -> Dict:
         """
         加载 YOLO CoreML 模型
@@ -1294,13 +3195,14 @@ class ECWDA:
             1. App Bundle 中 (编译时添加)
             2. Documents 目录中 (运行时复制)
         """
+        self.yolo_cache.clear()
         try:
             payload = {"modelName": model_name}
             if class_labels:
                 payload["classLabels"] = class_labels
             
-            resp = requests.post(
-                f"{self.base_url}/wda/yolo/loadModel",
+            resp = self._request(
+                "POST", "/wda/yolo/loadModel",
                 json=payload,
                 timeout=30
             )
@@ -1308,8 +3210,10 @@ class ECWDA:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    @_fail_fast
     def yolo_detect(self, confidence: float = 0.5, max_results: int = 10,
-                    region: Optional[Dict] = None) -> List[Dict]:
+                    region: Optional[Dict] = None,
+                    labels: Optional[List[str]] = None) -> List[Dict]:
         """
         YOLO 目标检测
         
@@ -1317,6 +3221,7 @@ class ECWDA:
             confidence: 置信度阈值 (0-1)
             max_results: 最大返回数量
             region: 检测区域 {"x", "y", "width", "height"}
+            labels: 只返回这些标签 (发送到设备端过滤，数量上限在过滤后生效)
             
         Returns:
             list: 检测结果列表
@@ -1331,54 +3236,170 @@ class ECWDA:
                 ...
             ]
         """
+        if self.yolo_backend is not None:
+            return self._yolo_detect_host(confidence, max_results, region, labels)
+        
         try:
             payload = {"confidence": confidence, "maxResults": max_results}
             if region:
                 payload["region"] = region
+            if labels:
+                payload["labels"] = labels
             
-            resp = requests.post(
-                f"{self.base_url}/wda/yolo/detect",
+            resp = self._request(
+                "POST", "/wda/yolo/detect",
                 json=payload,
-                timeout=30
+                timeout=30,
+                coalesce=True
             )
             data = resp.json().get("value", {})
-            return data.get("detections", [])
+            detections = data.get("detections", [])
         except:
             return []
+        
+        # 设备端不支持 labels 参数时在本地过滤
+        if labels:
+            wanted = {label.lower() for label in labels}
+            detections = [d for d in detections if d.get("label", "").lower() in wanted]
+        return detections[:max_results]
     
-    def yolo_find(self, label: str, confidence: float = 0.5) -> Optional[Dict]:
+    def set_yolo_backend(self, backend) -> None:
+        """
+        设置电脑端推理后端 (如 yolo_onnx.OnnxYoloBackend)
+        
+        设置后 yolo_detect 在电脑上推理当前截图，不再调用设备端 /wda/yolo/detect，
+        返回格式不变。多台设备可以共享同一个后端，请求会被合并为批量推理。
+        
+        Args:
+            backend: 推理后端，传 None 恢复设备端推理
+        """
+        self.yolo_backend = backend
+        self.yolo_cache.clear()
+    
+    def frame_scale(self, frame: Frame) -> float:
+        """
+        截图像素与点坐标的比例
+        
+        先确保会话已创建，屏幕尺寸取自设备而不是客户端的默认值
+        
+        Args:
+            frame: 当前设备的截图帧
+        
+        Returns:
+            每个点对应的像素数，屏幕尺寸未知时为 1.0
+        """
+        self._ensure_session()
+        width = self.geometry.width
+        return frame.width / width if width else 1.0
+    
+    def _yolo_detect_host(self, confidence: float, max_results: int,
+                          region: Optional[Dict], labels: Optional[List[str]]) -> List[Dict]:
+        """使用电脑端后端检测当前帧"""
+        try:
+            frame = self.get_frame()
+            if not frame:
+                return []
+            scale = self.frame_scale(frame)
+            image, offset = frame.image, (0, 0)
+            if region:
+                rect = frame.clip_region({k: v * scale for k, v in region.items()})
+                if not rect:
+                    return []
+                x, y, w, h = rect
+                image, offset = image.crop((x, y, x + w, y + h)), (x, y)
+            return self.yolo_backend.detect(image, confidence, max_results, labels, scale, offset)
+        except Exception as e:
+            print(f"YOLO 推理失败: {e}")
+            return []
+    
+    def _yolo_frame_detections(self, confidence: float, region: Optional[Dict] = None,
+                               frame: Optional[Frame] = None,
+                               label: Optional[str] = None) -> List[Dict]:
+        """
+        检测结果
+        
+        调用方传入刚获取的 frame 时，以 yolo_confidence_floor 和 yolo_max_results
+        做一次不限标签的完整推理，按该帧的内容哈希缓存，同一帧上不同标签、不同阈值的查询
+        都在本地过滤、共享这一次推理。不传 frame 时不缓存 (客户端不会为了缓存额外截图)，
+        每次调用单独推理，标签和阈值直接发送到设备端过滤。
+        """
+        if frame is None:
+            return self.yolo_detect(confidence, self.yolo_max_results, region,
+                                    [label] if label else None)
+        
+        floor = min(confidence, self.yolo_confidence_floor)
+        key = (frame.hash, _normalize_region(region), floor)
+        cached = self.yolo_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        detections = self.yolo_detect(floor, self.yolo_max_results, region)
+        if detections:
+            self.yolo_cache.put(key, detections)
+        return detections
+    
+    def yolo_find_all(self, label: Optional[str] = None, confidence: float = 0.5,
+                      region: Optional[Dict] = None,
+                      frame: Optional[Frame] = None) -> List[Dict]:
+        """
+        查找指定标签的全部目标
+        
+        Args:
+            label: 目标标签，不传返回所有标签
+            confidence: 置信度阈值
+            region: 检测区域
+            frame: 调用方刚获取的当前帧，作为检测结果的缓存键 (不传则不缓存)
+            
+        Returns:
+            list: 目标列表，按置信度从高到低排序
+        """
+        detections = [
+            det for det in self._yolo_frame_detections(confidence, region, frame, label)
+            if det.get("confidence", 0) >= confidence
+            and (label is None or det.get("label", "").lower() == label.lower())
+        ]
+        detections.sort(key=lambda det: det.get("confidence", 0), reverse=True)
+        return detections
+    
+    def yolo_find(self, label: str, confidence: float = 0.5,
+                  region: Optional[Dict] = None,
+                  frame: Optional[Frame] = None) -> Optional[Dict]:
         """
         查找指定标签的目标
         
         Args:
             label: 目标标签
             confidence: 置信度阈值
+            region: 检测区域
+            frame: 调用方刚获取的当前帧，作为检测结果的缓存键 (不传则不缓存)
             
         Returns:
-            dict: 找到的第一个目标，未找到返回 None
+            dict: 置信度最高的目标，未找到返回 None
         """
-        detections = self.yolo_detect(confidence=confidence)
-        for det in detections:
-            if det.get("label", "").lower() == label.lower():
-                return det
-        return None
+        detections = self.yolo_find_all(label, confidence, region, frame)
+        return detections[0] if detections else None
     
-    def yolo_click(self, label: str, confidence: float = 0.5) -> bool:
+    def yolo_click(self, label: str, confidence: float = 0.5,
+                   region: Optional[Dict] = None,
+                   frame: Optional[Frame] = None) -> bool:
         """
         点击 YOLO 检测到的目标
         
         Args:
             label: 目标标签
             confidence: 置信度阈值
+            region: 检测区域
+            frame: 调用方刚获取的当前帧，作为检测结果的缓存键 (不传则不缓存)
             
         Returns:
             bool: 是否成功
         """
-        target = self.yolo_find(label, confidence)
+        target = self.yolo_find(label, confidence, region, frame)
         if target:
             return self.click(int(target["centerX"]), int(target["centerY"]))
         return False
     
+    @_fail_fast
     def yolo_model_info(self) -> Dict:
         """
         获取当前加载的 YOLO 模型信息
@@ -1387,8 +3408,8 @@ class ECWDA:
             dict: 模型信息
         """
         try:
-            resp = requests.get(
-                f"{self.base_url}/wda/yolo/modelInfo",
+            resp = self._request(
+                "GET", "/wda/yolo/modelInfo",
                 timeout=self.timeout
             )
             return resp.json().get("value", {})
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+多设备批量运行
+同一个脚本在多台手机上并行运行，限制同时运行的设备数，失败自动重试，
+实时输出每台设备的进度，最后汇总结果和耗时
+
+脚本是一个函数 script(ec, device)，ec 为该设备的 ECWDA 客户端，device 为设备信息，
+返回值作为该设备的结果，抛出异常视为失败。
+
+用法:
+    # 命令行: 设备列表每行一个地址 (可写成 名称=地址)，脚本为 文件.py:函数名 (默认 run)
+    python fleet.py devices.txt my_script.py:run --workers 20 --retries 2 --output result.json
+
+    # 代码中
+    from fleet import Fleet
+    fleet = Fleet(["http://10.0.0.11:8100", "http://10.0.0.12:8100"], my_script, max_workers=10)
+    report = fleet.run()
+    print(report.summary())
+"""
+
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError,
+                                as_completed)
+from typing import Optional, Dict, List, Any, Callable, Iterator, Union
+
+from ecwda import ECWDA
+
+
+# 进度事件
+STARTED = "started"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+RETRYING = "retrying"
+
+
+def parse_devices(items: List[Union[str, Dict]]) -> List[Dict[str, str]]:
+    """
+    统一设备格式
+
+    Args:
+        items: 地址字符串、"名称=地址" 或 {"name", "url", "udid"} 字典 (udid 可省略)
+
+    Returns:
+        list: [{"name", "url", ...}]
+    """
+    devices = []
+    for item in items:
+        if isinstance(item, dict):
+            device = dict(item)
+            device.setdefault("name", device["url"])
+        else:
+            name, sep, url = item.strip().partition("=")
+            device = {"name": name, "url": url} if sep else {"name": item.strip(),
+                                                              "url": item.strip()}
+        devices.append(device)
+    return devices
+
+
+def load_devices(path: str) -> List[Dict[str, str]]:
+    """从文件读取设备列表: JSON 数组，或每行一个地址 (# 开头为注释)"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        return parse_devices(json.loads(text))
+    lines = [line.strip() for line in text.splitlines()]
+    return parse_devices([line for line in lines if line and not line.startswith("#")])
+
+
+_scripts: Dict[str, Callable] = {}
+
+
+def load_script(ref: str) -> Callable:
+    """
+    按引用加载脚本函数
+
+    Args:
+        ref: "path/to/script.py:函数名" 或 "模块名:函数名"，函数名默认 run
+    """
+    if ref in _scripts:
+        return _scripts[ref]
+    target, _, name = ref.partition(":")
+    if target.endswith(".py"):
+        module_name = "_fleet_" + os.path.splitext(os.path.basename(target))[0]
+        spec = importlib.util.spec_from_file_location(module_name, target)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    fn = getattr(module, name or "run")
+    _scripts[ref] = fn
+    return fn
+
+
+def connect(device: Dict[str, str]) -> ECWDA:
+    """
+    按设备信息创建客户端
+
+    设备档案以 udid 区分，没有 udid 时使用地址；显示名称可能重复，不能作为 device_id
+
+    Args:
+        device: parse_devices 返回的设备
+
+    Returns:
+        ECWDA: 客户端
+    """
+    return ECWDA(device["url"], device.get("udid") or device["url"])
+
+
+def _attempt(script: Union[Callable, str], device: Dict[str, str]) -> Dict[str, Any]:
+    """在当前线程 / 进程里跑一次脚本 (进程池要求可 pickle，因此是模块级函数)"""
+    fn = load_script(script) if isinstance(script, str) else script
+    start = time.time()
+    try:
+        result = fn(connect(device), device)
+        return {"ok": True, "result": result, "error": None,
+                "started": start, "seconds": time.time() - start}
+    except Exception as e:
+        return {"ok": False, "result": None, "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(),
+                "started": start, "seconds": time.time() - start}
+
+
+class FleetReport:
+    """批量运行结果"""
+
+    def __init__(self, results: List[Dict[str, Any]], wall: float, max_workers: int):
+        self.results = results
+        self.wall = wall
+        self.max_workers = max_workers
+
+    @property
+    def succeeded(self) -> List[Dict[str, Any]]:
+        return [r for r in self.results if r["ok"]]
+
+    @property
+    def failed(self) -> List[Dict[str, Any]]:
+        return [r for r in self.results if not r["ok"]]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总
+
+        Returns:
+            dict: {"devices", "succeeded", "failed", "retried", "wall", "device_seconds",
+                   "p50", "max", "devices_per_minute", "parallelism"}；
+                  parallelism 为设备总耗时 / 墙钟时间，接近 max_workers 说明并发被充分利用
+        """
+        durations = sorted(r["seconds"] for r in self.results)
+        busy = sum(durations)
+        return {
+            "devices": len(self.results),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "retried": sum(1 for r in self.results if r["attempts"] > 1),
+            "wall": self.wall,
+            "device_seconds": busy,
+            "p50": durations[len(durations) // 2] if durations else 0.0,
+            "max": durations[-1] if durations else 0.0,
+            "devices_per_minute": len(self.results) / self.wall * 60 if self.wall > 0 else 0.0,
+            "parallelism": busy / self.wall if self.wall > 0 else 0.0,
+            "max_workers": self.max_workers,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"summary": self.summary(), "results": self.results}
+
+
+class Fleet:
+    """
+    多设备批量运行器
+
+    - mode="thread": 线程池，适合大部分脚本 (主要时间在等设备响应)
+    - mode="process": 进程池，脚本在电脑端做大量图像处理时使用；脚本必须可 pickle
+      (模块级函数) 或传 "文件.py:函数名" 字符串
+    - mode="async": 脚本为 async 函数时使用，同一事件循环里运行，信号量限制并发
+    """
+
+    def __init__(self, devices: List[Union[str, Dict]], script: Union[Callable, str],
+                 max_workers: int = 10, mode: str = "thread", retries: int = 1,
+                 retry_delay: float = 5.0,
+                 on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        """
+        Args:
+            devices: 设备列表，见 parse_devices
+            script: 脚本函数 script(ec, device)，或 "文件.py:函数名"
+            max_workers: 同时运行的设备数上限
+            mode: "thread" / "process" / "async"
+            retries: 失败后的重试次数
+            retry_delay: 重试前等待的秒数
+            on_progress: 进度回调 on_progress(event, info)，event 为 started / succeeded /
+                         failed / retrying，info 含 device、attempt 等
+        """
+        if mode not in ("thread", "process", "async"):
+            raise ValueError(f"不支持的模式: {mode}")
+        self.devices = parse_devices(devices)
+        self.script = script
+        self.max_workers = max(1, max_workers)
+        self.mode = mode
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+
+    def _emit(self, event: str, info: Dict[str, Any]):
+        if self.on_progress:
+            with self._lock:
+                self.on_progress(event, info)
+
+    def _finish(self, device: Dict[str, str], attempt: int,
+                outcome: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """处理一次尝试的结果；需要重试时返回 None"""
+        info = {"device": device["name"], "url": device["url"], "attempts": attempt}
+        info.update(outcome)
+        if outcome["ok"]:
+            self._emit(SUCCEEDED, info)
+            return info
+        if attempt <= self.retries:
+            self._emit(RETRYING, info)
+            return None
+        self._emit(FAILED, info)
+        return info
+
+    # ========== 运行 ==========
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        """
+        按完成顺序逐个返回设备结果
+
+        Yields:
+            dict: {"device", "url", "ok", "result", "error", "attempts", "started", "seconds"}，
+                  seconds 为最后一次尝试的耗时
+        """
+        if self.mode == "async":
+            yield from self._iter_async()
+        elif self.mode == "process":
+            yield from self._iter_pool(ProcessPoolExecutor(max_workers=self.max_workers))
+        else:
+            yield from self._iter_pool(ThreadPoolExecutor(max_workers=self.max_workers,
+                                                          thread_name_prefix="fleet"))
+
+    def run(self) -> FleetReport:
+        """运行全部设备并汇总"""
+        start = time.time()
+        results = list(self.iter_results())
+        return FleetReport(results, time.time() - start, self.max_workers)
+
+    def _iter_pool(self, pool) -> Iterator[Dict[str, Any]]:
+        # 同时提交的任务不超过 max_workers，提交即开始运行，started 事件才准确
+        waiting = deque((device, 1) for device in self.devices)
+        retry_at: List[tuple] = []
+        pending = {}
+
+        with pool:
+            while waiting or pending or retry_at:
+                now = time.time()
+                for item in [r for r in retry_at if r[0] <= now]:
+                    retry_at.remove(item)
+                    waiting.append(item[1:])
+                while waiting and len(pending) < self.max_workers:
+                    device, attempt = waiting.popleft()
+                    self._emit(STARTED, {"device": device["name"], "url": device["url"],
+                                         "attempts": attempt})
+                    pending[pool.submit(_attempt, self.script, device)] = (device, attempt)
+
+                timeout = None
+                if retry_at:
+                    timeout = max(0.0, min(r[0] for r in retry_at) - time.time())
+                if not pending:
+                    time.sleep(timeout or 0.0)
+                    continue
+                try:
+                    future = next(as_completed(list(pending), timeout=timeout))
+                except TimeoutError:
+                    continue
+
+                device, attempt = pending.pop(future)
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    # 进程崩溃、脚本无法 pickle 等
+                    outcome = {"ok": False, "result": None, "error": f"{type(e).__name__}: {e}",
+                               "started": time.time(), "seconds": 0.0}
+                info = self._finish(device, attempt, outcome)
+                if info is None:
+                    retry_at.append((time.time() + self.retry_delay, device, attempt + 1))
+                else:
+                    yield info
+
+    def _iter_async(self) -> Iterator[Dict[str, Any]]:
+        # 事件循环在后台线程运行，结果经队列交给调用方，完成一台返回一台
+        script = load_script(self.script) if isinstance(self.script, str) else self.script
+        results: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def one(device, semaphore, executor):
+            attempt = 1
+            while True:
+                async with semaphore:
+                    self._emit(STARTED, {"device": device["name"], "url": device["url"],
+                                         "attempts": attempt})
+                    start = time.time()
+                    try:
+                        if inspect.iscoroutinefunction(script):
+                            result = await script(connect(device), device)
+                        else:
+                            # 默认线程池的线程数有上限，同步脚本改用 max_workers 个线程的专用线程池
+                            result = await asyncio.get_running_loop().run_in_executor(
+                                executor, script, connect(device), device)
+                        outcome = {"ok": True, "result": result, "error": None}
+                    except Exception as e:
+                        outcome = {"ok": False, "result": None,
+                                   "error": f"{type(e).__name__}: {e}",
+                                   "traceback": traceback.format_exc()}
+                    outcome.update(started=start, seconds=time.time() - start)
+                info = self._finish(device, attempt, outcome)
+                if info is not None:
+                    results.put(info)
+                    return
+                attempt += 1
+                await asyncio.sleep(self.retry_delay)
+
+        async def main():
+            semaphore = asyncio.Semaphore(self.max_workers)
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="fleet") as executor:
+                await asyncio.gather(*(one(d, semaphore, executor) for d in self.devices))
+
+        def loop():
+            try:
+                asyncio.run(main())
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(done)
+
+        threading.Thread(target=loop, name="fleet-async", daemon=True).start()
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def _print_progress(event: str, info: Dict[str, Any]):
+    name = info["device"]
+    if event == STARTED:
+        suffix = f" (第 {info['attempts']} 次)" if info["attempts"] > 1 else ""
+        print(f"[开始] {name}{suffix}", flush=True)
+    elif event == SUCCEEDED:
+        print(f"[成功] {name}  {info['seconds']:.1f}s  结果: {info['result']!r}", flush=True)
+    elif event == RETRYING:
+        print(f"[重试] {name}  {info['error']}", flush=True)
+    else:
+        print(f"[失败] {name}  {info['error']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多设备批量运行脚本")
+    parser.add_argument("devices", help="设备列表文件 (每行一个地址或 名称=地址，或 JSON 数组)")
+    parser.add_argument("script", help="脚本 文件.py:函数名 或 模块:函数名，函数名默认 run")
+    parser.add_argument("--workers", type=int, default=10, help="同时运行的设备数")
+    parser.add_argument("--mode", choices=["thread", "process", "async"], default="thread")
+    parser.add_argument("--retries", type=int, default=1, help="失败后的重试次数")
+    parser.add_argument("--retry-delay", type=float, default=5.0)
+    parser.add_argument("--quiet", action="store_true", help="不输出每台设备的进度")
+    parser.add_argument("--output", default=None, help="保存 JSON 结果")
+    args = parser.parse_args()
+
+    devices = load_devices(args.devices)
+    script = args.script if args.mode == "process" else load_script(args.script)
+    fleet = Fleet(devices, script, max_workers=args.workers, mode=args.mode,
+                  retries=args.retries, retry_delay=args.retry_delay,
+                  on_progress=None if args.quiet else _print_progress)
+    report = fleet.run()
+
+    s = report.summary()
+    print(f"\n设备 {s['devices']}  成功 {s['succeeded']}  失败 {s['failed']}  "
+          f"重试过 {s['retried']}")
+    print(f"总耗时 {s['wall']:.1f}s  单台 p50 {s['p50']:.1f}s / 最长 {s['max']:.1f}s  "
+          f"并行度 {s['parallelism']:.1f}/{s['max_workers']}  "
+          f"{s['devices_per_minute']:.1f} 台/分钟")
+    for r in report.failed:
+        print(f"  失败: {r['device']}  {r['error']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2, default=repr)
+        print(f"\n结果已保存: {args.output}")
+    sys.exit(1 if report.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
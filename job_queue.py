@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+分布式任务队列
+多台电脑 (各自连着一批手机) 共用一个任务队列：worker 登记自己管理的设备，
+空闲设备租用 (lease) 任务执行，运行中定时心跳续租；worker 崩溃或断网后租约过期，
+任务自动回到队列由其他设备执行。
+
+不需要额外的服务，队列存放在 SQLite 文件中 (JobStore 可替换为其他实现)。
+多台电脑共用时把数据库放在支持文件锁的共享目录 (如 SMB/NFS 且开启锁)。
+
+任务 = 脚本 + 参数，脚本签名为 script(ec, device, **args)，与 fleet.py 相同。
+
+用法:
+    # 提交任务
+    python job_queue.py --db jobs.db submit daily.py:run --args '{"level": 3}' --host hub-a
+    # 每台电脑启动 worker
+    python job_queue.py --db jobs.db worker iphone1=http://10.0.0.11:8100 iphone2=http://10.0.0.12:8100
+    # 查看状态
+    python job_queue.py --db jobs.db status
+"""
+
+import abc
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Optional, Dict, List, Any, Callable
+
+from fleet import connect, load_script, parse_devices
+
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore(abc.ABC):
+    """
+    任务存储接口
+
+    所有方法都必须是原子的，多个进程 / 多台电脑会同时调用。
+    """
+
+    @abc.abstractmethod
+    def submit(self, script: str, args: Dict[str, Any], device: Optional[str] = None,
+               host: Optional[str] = None, priority: int = 0, max_attempts: int = 3) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def register(self, worker_id: str, host: str, devices: List[str]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def unregister(self, worker_id: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def heartbeat(self, worker_id: str, lease_ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def lease(self, worker_id: str, host: str, device: str, lease_ttl: float,
+              locality_wait: float) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, job_id: int, worker_id: str, result: Any):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, job_id: int, worker_id: str, error: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def requeue_expired(self) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def workers(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite 实现；每次操作使用独立连接，写操作在 BEGIN IMMEDIATE 事务中完成"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        script TEXT NOT NULL,
+        args TEXT NOT NULL,
+        device TEXT,
+        host TEXT,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        worker TEXT,
+        leased_device TEXT,
+        lease_expires REAL,
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL,
+        result TEXT,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority DESC, id);
+    CREATE TABLE IF NOT EXISTS workers (
+        id TEXT PRIMARY KEY,
+        host TEXT NOT NULL,
+        devices TEXT NOT NULL,
+        heartbeat REAL NOT NULL,
+        registered REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        """
+        Args:
+            path: 数据库文件路径
+            busy_timeout: 等待其他进程释放锁的最长时间（秒）
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """在写事务中执行"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return value
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["args"] = json.loads(job["args"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    # ========== 提交与查询 ==========
+
+    def submit(self, script: str, args: Dict[str, Any], device: Optional[str] = None,
+               host: Optional[str] = None, priority: int = 0, max_attempts: int = 3) -> int:
+        def insert(conn):
+            cur = conn.execute(
+                "INSERT INTO jobs (script, args, device, host, priority, status, max_attempts,"
+                " created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (script, json.dumps(args, ensure_ascii=False), device, host, priority, QUEUED,
+                 max_attempts, time.time()))
+            return cur.lastrowid
+        return self._write(insert)
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            if status:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                    (status, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?",
+                                    (limit,)).fetchall()
+            return [self._job(r) for r in rows]
+        finally:
+            conn.close()
+
+    def workers(self) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM workers ORDER BY host, id").fetchall()
+            return [dict(r, devices=json.loads(r["devices"])) for r in rows]
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+            result = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+            result.update({status: count for status, count in rows})
+            return result
+        finally:
+            conn.close()
+
+    # ========== worker ==========
+
+    def register(self, worker_id: str, host: str, devices: List[str]):
+        now = time.time()
+        self._write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO workers (id, host, devices, heartbeat, registered)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (worker_id, host, json.dumps(devices, ensure_ascii=False), now, now)))
+
+    def unregister(self, worker_id: str):
+        def remove(conn):
+            conn.execute("UPDATE jobs SET status = ?, worker = NULL, leased_device = NULL,"
+                         " lease_expires = NULL WHERE worker = ? AND status = ?",
+                         (QUEUED, worker_id, LEASED))
+            conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+        self._write(remove)
+
+    def heartbeat(self, worker_id: str, lease_ttl: float):
+        now = time.time()
+
+        def beat(conn):
+            conn.execute("UPDATE workers SET heartbeat = ? WHERE id = ?", (now, worker_id))
+            conn.execute("UPDATE jobs SET lease_expires = ? WHERE worker = ? AND status = ?",
+                         (now + lease_ttl, worker_id, LEASED))
+        self._write(beat)
+
+    def lease(self, worker_id: str, host: str, device: str, lease_ttl: float,
+              locality_wait: float) -> Optional[Dict[str, Any]]:
+        """
+        为一台空闲设备租用任务
+
+        优先级: 指定本设备的任务 > 指定本机的任务 > 未指定位置的任务 >
+        指定其他电脑但已等待超过 locality_wait 秒的任务；同一类中按 priority、提交顺序。
+        """
+        now = time.time()
+
+        def take(conn):
+            row = conn.execute(
+                """SELECT * FROM jobs
+                   WHERE status = ?
+                     AND (device = ? OR (device IS NULL AND
+                          (host IS NULL OR host = ? OR created <= ?)))
+                   ORDER BY CASE WHEN device = ? THEN 0
+                                 WHEN host = ? THEN 1
+                                 WHEN host IS NULL THEN 2
+                                 ELSE 3 END,
+                            priority DESC, id
+                   LIMIT 1""",
+                (QUEUED, device, host, now - locality_wait, device, host)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, leased_device = ?, lease_expires = ?,"
+                " attempts = attempts + 1, started = ? WHERE id = ?",
+                (LEASED, worker_id, device, now + lease_ttl, now, row["id"]))
+            return row["id"]
+
+        job_id = self._write(take)
+        return self.get(job_id) if job_id is not None else None
+
+    def complete(self, job_id: int, worker_id: str, result: Any):
+        self._write(lambda conn: conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, finished = ?,"
+            " lease_expires = NULL WHERE id = ? AND worker = ? AND status = ?",
+            (DONE, json.dumps(result, ensure_ascii=False, default=repr), time.time(),
+             job_id, worker_id, LEASED)))
+
+    def fail(self, job_id: int, worker_id: str, error: str):
+        """失败: 未达到 max_attempts 时回到队列"""
+        def update(conn):
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+                " error = ?, finished = ?, worker = NULL, leased_device = NULL,"
+                " lease_expires = NULL WHERE id = ? AND worker = ? AND status = ?",
+                (FAILED, QUEUED, error, time.time(), job_id, worker_id, LEASED))
+        self._write(update)
+
+    def requeue_expired(self) -> int:
+        """租约过期 (worker 失去心跳) 的任务回到队列或标记失败，返回处理的任务数"""
+        now = time.time()
+
+        def sweep(conn):
+            cur = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,"
+                " error = 'lease expired', worker = NULL, leased_device = NULL,"
+                " lease_expires = NULL WHERE status = ? AND lease_expires < ?",
+                (FAILED, QUEUED, LEASED, now))
+            return cur.rowcount
+        return self._write(sweep)
+
+
+class JobQueue:
+    """提交和等待任务的客户端"""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+
+    def submit(self, script: str, args: Optional[Dict[str, Any]] = None,
+               device: Optional[str] = None, host: Optional[str] = None,
+               priority: int = 0, max_attempts: int = 3) -> int:
+        """
+        提交任务
+
+        Args:
+            script: 脚本引用 "文件.py:函数名" 或 "模块:函数名" (worker 所在电脑上可加载)
+            args: 传给脚本的关键字参数 (可 JSON 序列化)
+            device: 只在该设备上运行 (设备名)
+            host: 优先在该电脑上运行，等待超过 locality_wait 后其他电脑也可执行
+            priority: 越大越先执行
+            max_attempts: 最多执行次数 (含租约过期)
+
+        Returns:
+            int: 任务 ID
+        """
+        return self.store.submit(script, args or {}, device, host, priority, max_attempts)
+
+    def status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def wait(self, job_id: int, timeout: Optional[float] = None,
+             interval: float = 0.5) -> Optional[Dict[str, Any]]:
+        """等待任务结束 (done / failed)，超时返回当前状态"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.time() >= deadline:
+                return job
+            time.sleep(interval)
+
+
+class Worker:
+    """
+    任务执行端: 每台设备一个线程，空闲时租用任务执行
+
+    另有一个心跳线程定时续租并回收其他 worker 过期的任务。
+    """
+
+    def __init__(self, store: JobStore, devices: List, host: Optional[str] = None,
+                 lease_ttl: float = 60.0, heartbeat_interval: float = 10.0,
+                 poll_interval: float = 1.0, locality_wait: float = 30.0,
+                 on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        """
+        Args:
+            store: 任务存储
+            devices: 本机管理的设备，格式同 fleet.parse_devices
+            host: 本机名称，默认 socket.gethostname()
+            lease_ttl: 租约时长（秒），超过未续租视为 worker 已失联
+            heartbeat_interval: 心跳间隔（秒），应明显小于 lease_ttl
+            poll_interval: 没有任务时的轮询间隔（秒）
+            locality_wait: 指定其他电脑的任务等待多久后本机也可以执行
+            on_event: 事件回调 on_event(event, info)，event 为 leased / done / failed
+        """
+        self.store = store
+        self.devices = parse_devices(devices)
+        self.host = host or socket.gethostname()
+        self.id = f"{self.host}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.locality_wait = locality_wait
+        self.on_event = on_event
+        self.completed = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._drained = threading.Event()  # 设备线程全部结束后心跳才停止
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._unreported: List[tuple] = []  # 写入失败、等待心跳线程重写的结果 (方法, 参数)
+
+    def _emit(self, event: str, info: Dict[str, Any]):
+        if self.on_event:
+            self.on_event(event, info)
+
+    def start(self):
+        """登记设备并启动线程"""
+        self._stop.clear()
+        self._drained.clear()
+        self.store.register(self.id, self.host, [d["name"] for d in self.devices])
+        self._threads = [threading.Thread(target=self._heartbeat_loop, daemon=True,
+                                          name="job-heartbeat")]
+        for device in self.devices:
+            self._threads.append(threading.Thread(target=self._device_loop, args=(device,),
+                                                  daemon=True, name=f"job-{device['name']}"))
+        for t in self._threads:
+            t.start()
+
+    def stop(self, wait: bool = True):
+        """
+        停止领取新任务；正在运行的任务继续执行并续租，全部结束后注销
+
+        Args:
+            wait: True 时等待任务结束后返回；False 时立即返回，由后台线程等待并注销
+                  (进程在此之前退出的话，任务在租约过期后回到队列)
+        """
+        self._stop.set()
+        if wait:
+            self._drain()
+        else:
+            threading.Thread(target=self._drain, daemon=True, name="job-drain").start()
+
+    def _drain(self):
+        """等待设备线程结束，再停止心跳并注销 (此时没有运行中的任务会被放回队列)"""
+        for t in self._threads[1:]:
+            t.join()
+        self._drained.set()
+        for t in self._threads[:1]:
+            t.join()
+        self._flush_reports()
+        self.store.unregister(self.id)
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _heartbeat_loop(self):
+        while not self._drained.wait(self.heartbeat_interval):
+            try:
+                self.store.heartbeat(self.id, self.lease_ttl)
+                self.store.requeue_expired()
+            except Exception as e:
+                print(f"心跳失败: {e}")
+            self._flush_reports()
+
+    def _device_loop(self, device: Dict[str, str]):
+        while not self._stop.is_set():
+            try:
+                job = self.store.lease(self.id, self.host, device["name"], self.lease_ttl,
+                                       self.locality_wait)
+            except Exception as e:
+                print(f"租用任务失败: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._run(job, device)
+
+    def _run(self, job: Dict[str, Any], device: Dict[str, str]):
+        info = {"job": job["id"], "device": device["name"], "attempt": job["attempts"]}
+        self._emit("leased", info)
+        try:
+            script = load_script(job["script"])
+            result = script(connect(device), device, **job["args"])
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            error = f"{type(e).__name__}: {e}"
+            self._report(self.store.fail, job["id"], self.id, error + "\n" + traceback.format_exc())
+            self._emit("failed", dict(info, error=error))
+            return
+        with self._lock:
+            self.completed += 1
+        self._report(self.store.complete, job["id"], self.id, result)
+        self._emit("done", dict(info, result=result))
+
+    def _report(self, method: Callable, *args, retries: int = 3):
+        """
+        写入任务结果 (store.complete / store.fail)，数据库繁忙时重试
+
+        仍然失败时交给心跳线程稍后重写 (期间心跳继续续租，任务不会被其他设备重复执行)，
+        设备线程继续租用下一个任务。
+        """
+        for attempt in range(retries):
+            try:
+                method(*args)
+                return
+            except Exception as e:
+                print(f"写入任务结果失败 (第 {attempt + 1} 次): {e}")
+                time.sleep(0.5 * 2 ** attempt)
+        with self._lock:
+            self._unreported.append((method, args))
+
+    def _flush_reports(self):
+        """重写之前失败的任务结果"""
+        with self._lock:
+            pending, self._unreported = self._unreported, []
+        for i, (method, args) in enumerate(pending):
+            try:
+                method(*args)
+            except Exception as e:
+                print(f"写入任务结果失败: {e}")
+                with self._lock:
+                    self._unreported.extend(pending[i:])
+                return
+
+
+def _print_event(event: str, info: Dict[str, Any]):
+    if event == "leased":
+        print(f"[开始] 任务 {info['job']} -> {info['device']} (第 {info['attempt']} 次)", flush=True)
+    elif event == "done":
+        print(f"[完成] 任务 {info['job']} @ {info['device']}: {info['result']!r}", flush=True)
+    else:
+        print(f"[失败] 任务 {info['job']} @ {info['device']}: {info['error']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式任务队列")
+    parser.add_argument("--db", default="jobs.db", help="SQLite 数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="提交任务")
+    p.add_argument("script", help="脚本 文件.py:函数名")
+    p.add_argument("--args", default="{}", help="JSON 参数")
+    p.add_argument("--device", default=None, help="只在该设备运行")
+    p.add_argument("--host", default=None, help="优先在该电脑运行")
+    p.add_argument("--priority", type=int, default=0)
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument("--count", type=int, default=1, help="提交份数")
+    p.add_argument("--wait", action="store_true", help="等待全部完成")
+
+    p = sub.add_parser("worker", help="启动 worker")
+    p.add_argument("devices", nargs="+", help="设备 名称=地址")
+    p.add_argument("--host", default=None)
+    p.add_argument("--lease-ttl", type=float, default=60.0)
+    p.add_argument("--heartbeat", type=float, default=10.0)
+    p.add_argument("--locality-wait", type=float, default=30.0)
+
+    p = sub.add_parser("status", help="查看队列")
+    p.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    store = SQLiteJobStore(args.db)
+
+    if args.command == "submit":
+        queue = JobQueue(store)
+        ids = [queue.submit(args.script, json.loads(args.args), args.device, args.host,
+                            args.priority, args.max_attempts) for _ in range(args.count)]
+        print(f"已提交: {', '.join(map(str, ids))}")
+        if args.wait:
+            for job_id in ids:
+                job = queue.wait(job_id)
+                print(f"任务 {job_id}: {job['status']} {job['result'] if job['status'] == DONE else job['error']}")
+    elif args.command == "worker":
+        worker = Worker(store, args.devices, host=args.host, lease_ttl=args.lease_ttl,
+                        heartbeat_interval=args.heartbeat, locality_wait=args.locality_wait,
+                        on_event=_print_event)
+        print(f"worker {worker.id} 已启动，设备: {', '.join(d['name'] for d in worker.devices)}")
+        worker.run_forever()
+    else:
+        print(json.dumps(store.stats(), ensure_ascii=False))
+        for w in store.workers():
+            age = time.time() - w["heartbeat"]
+            print(f"worker {w['id']}  {w['host']}  设备 {', '.join(w['devices'])}  心跳 {age:.0f}s 前")
+        for job in store.jobs(limit=args.limit):
+            where = job["leased_device"] or job["device"] or job["host"] or "-"
+            print(f"  #{job['id']:<5} {job['status']:<7} {job['script']:<30} {where:<16} "
+                  f"第 {job['attempts']} 次")
+
+
+if __name__ == "__main__":
+    main()
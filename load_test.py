@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+WDA 压力测试
+通过 SDK 按配置的接口比例 (截图、点击、找色、节点查询、OCR) 逐级增加并发和速率，
+测出单个 WDA 能承受的负载，每一级输出吞吐、延迟分位数和错误率
+
+每个并发线程使用独立的 ECWDA 客户端 (相当于多个脚本同时连接)，
+关闭请求合并、自适应超时和熔断，测的是设备本身的表现。
+
+用法:
+    python load_test.py --url http://localhost:8100 --mix screenshot=3 tap=1 findColor=1 \\
+        --concurrency 1 2 4 8 --duration 10
+
+    python load_test.py --mock --mock-latency 0.02 --concurrency 1 4 16 --rates 0 50
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Any, Callable
+
+from ecwda import ECWDA
+
+
+# 每种操作: 调用一次 SDK 方法 (内部可能发多个请求)
+OPERATIONS: Dict[str, Callable[[ECWDA, random.Random], Any]] = {
+    "screenshot": lambda ec, rnd: ec.screenshot(),
+    "tap": lambda ec, rnd: ec.click(rnd.randint(10, ec.screen_width - 10),
+                                    rnd.randint(100, ec.screen_height - 100)),
+    "swipe": lambda ec, rnd: ec.swipe(ec.screen_width // 2, ec.screen_height * 2 // 3,
+                                      ec.screen_width // 2, ec.screen_height // 3, 0.1),
+    "findColor": lambda ec, rnd: ec.find_color_native("#FF0000"),
+    "pixel": lambda ec, rnd: ec.get_pixel_native(rnd.randint(0, ec.screen_width - 1),
+                                                 rnd.randint(0, ec.screen_height - 1)),
+    "node": lambda ec, rnd: ec.find_node_by_text("设置", use_cache=False),
+    "nodes": lambda ec, rnd: ec.get_all_nodes(),
+    "ocr": lambda ec, rnd: ec.ocr_native(use_cache=False),
+    "status": lambda ec, rnd: ec.is_connected(),
+}
+
+DEFAULT_MIX = {"screenshot": 3, "tap": 1, "findColor": 1, "node": 1, "ocr": 1}
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """已排序样本的分位数 (最近秩)"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    """["screenshot=3", "tap"] -> {"screenshot": 3.0, "tap": 1.0}"""
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"未知操作: {name}，可选: {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class _Outcome:
+    """记录一次操作内所有请求的结果 (SDK 方法会吞掉异常，只能在传输层判断)"""
+
+    def __init__(self, send: Callable):
+        self._send = send
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.requests = 0
+        self._local.error = None
+
+    @property
+    def requests(self) -> int:
+        return getattr(self._local, "requests", 0)
+
+    @property
+    def error(self) -> Optional[str]:
+        return getattr(self._local, "error", None)
+
+    def __call__(self, method: str, url: str, **kwargs):
+        self._local.requests = self.requests + 1
+        try:
+            resp = self._send(method, url, **kwargs)
+        except Exception as e:
+            self._local.error = type(e).__name__
+            raise
+        if resp.status_code >= 400 and self.error is None:
+            self._local.error = f"HTTP {resp.status_code}"
+        return resp
+
+
+class LoadTest:
+    """分级压力测试"""
+
+    def __init__(self, url: str, mix: Optional[Dict[str, float]] = None,
+                 timeout: float = 10, seed: Optional[int] = None):
+        """
+        Args:
+            url: WDA 地址
+            mix: 操作及权重，如 {"screenshot": 3, "tap": 1}
+            timeout: 单个请求超时（秒）
+            seed: 随机种子，固定后操作顺序可复现
+        """
+        self.url = url
+        self.mix = dict(mix or DEFAULT_MIX)
+        self.timeout = timeout
+        self.seed = seed
+        self.results: List[Dict[str, Any]] = []
+
+        # 先建一次会话，各线程的客户端共用
+        setup = ECWDA(url)
+        setup.create_session()
+        self.session_id = setup.session_id
+        self.geometry = setup.geometry
+
+    def _client(self) -> ECWDA:
+        ec = ECWDA(self.url)
+        ec.session_id = self.session_id
+        ec.geometry = self.geometry
+        ec.timeout = self.timeout
+        ec.adaptive_timeouts = False
+        ec.freshness = {}
+        ec.breaker.failure_threshold = float("inf")
+        ec.metrics = None
+        return ec
+
+    def run_step(self, concurrency: int, rate: float = 0, duration: float = 10) -> Dict[str, Any]:
+        """
+        运行一级负载
+
+        Args:
+            concurrency: 并发线程数
+            rate: 目标总速率 (操作/秒)，0 表示不限速，每个线程做完一个立即做下一个
+            duration: 持续时间（秒）
+
+        Returns:
+            dict: 本级结果，见 summarize
+        """
+        names = list(self.mix)
+        weights = [self.mix[n] for n in names]
+        samples: List[Tuple[str, float, Optional[str], int]] = []
+        lock = threading.Lock()
+        slot = [0]
+        start = time.perf_counter()
+        deadline = start + duration
+
+        def worker(index: int):
+            ec = self._client()
+            outcome = _Outcome(ec._send)
+            ec._send = outcome
+            rnd = random.Random(None if self.seed is None else self.seed * 1000 + index)
+            local = []
+            while True:
+                if rate > 0:
+                    # 开环: 按全局时间表发出，不受前一个请求耗时影响
+                    with lock:
+                        due = start + slot[0] / rate
+                        slot[0] += 1
+                    if due >= deadline:
+                        break
+                    wait = due - time.perf_counter()
+                    if wait > 0:
+                        time.sleep(wait)
+                if time.perf_counter() >= deadline:
+                    # 并发不足时跟不上目标速率，到时间即停止，实际速率见 throughput
+                    break
+                name = rnd.choices(names, weights)[0]
+                outcome.reset()
+                t0 = time.perf_counter()
+                try:
+                    OPERATIONS[name](ec, rnd)
+                except Exception as e:
+                    outcome._local.error = type(e).__name__
+                local.append((name, time.perf_counter() - t0, outcome.error, outcome.requests))
+            with lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(i,), daemon=True)
+                   for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        result = {"concurrency": concurrency, "rate": rate, "duration": elapsed}
+        result.update(self.summarize(samples, elapsed))
+        self.results.append(result)
+        return result
+
+    @staticmethod
+    def summarize(samples: List[Tuple[str, float, Optional[str], int]],
+                  elapsed: float) -> Dict[str, Any]:
+        """
+        汇总一级的样本
+
+        Returns:
+            dict: {"total": {...}, "operations": {名称: {...}}}，每项包含
+                  count / errors / error_rate / throughput / requests / p50 / p90 / p99 / max / errors_by_type
+        """
+        def stats(rows) -> Dict[str, Any]:
+            latencies = sorted(r[1] for r in rows)
+            errors = [r[2] for r in rows if r[2]]
+            by_type: Dict[str, int] = {}
+            for e in errors:
+                by_type[e] = by_type.get(e, 0) + 1
+            ok = len(rows) - len(errors)
+            return {
+                "count": len(rows),
+                "errors": len(errors),
+                "error_rate": len(errors) / len(rows) if rows else 0.0,
+                "throughput": ok / elapsed if elapsed > 0 else 0.0,
+                "requests": sum(r[3] for r in rows),
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else 0.0,
+                "errors_by_type": by_type,
+            }
+
+        operations = {}
+        for name in sorted({s[0] for s in samples}):
+            operations[name] = stats([s for s in samples if s[0] == name])
+        return {"total": stats(samples), "operations": operations}
+
+    def run(self, concurrency: List[int], rates: Optional[List[float]] = None,
+            duration: float = 10, cooldown: float = 1.0,
+            max_error_rate: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        逐级运行 (并发 x 速率 的所有组合，按顺序递增)
+
+        Args:
+            concurrency: 并发级别列表
+            rates: 速率级别列表，0 表示不限速，默认只有 0
+            duration: 每级持续时间（秒）
+            cooldown: 两级之间的间隔（秒），让设备恢复
+            max_error_rate: 某级错误率超过该值时停止后续级别
+
+        Returns:
+            list: 每级结果
+        """
+        for c in concurrency:
+            for r in rates or [0]:
+                result = self.run_step(c, r, duration)
+                print(format_step(result))
+                if max_error_rate is not None and result["total"]["error_rate"] > max_error_rate:
+                    print(f"错误率超过 {max_error_rate:.0%}，停止加压")
+                    return self.results
+                time.sleep(cooldown)
+        return self.results
+
+
+def format_step(result: Dict[str, Any]) -> str:
+    """一级结果的文本表格"""
+    rate = f"{result['rate']:g}/s" if result["rate"] else "不限速"
+    lines = [f"\n并发 {result['concurrency']}  速率 {rate}  时长 {result['duration']:.1f}s",
+             f"  {'操作':<12}{'次数':>7}{'吞吐/s':>9}{'错误率':>8}"
+             f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+    rows = list(result["operations"].items()) + [("合计", result["total"])]
+    for name, s in rows:
+        lines.append(f"  {name:<12}{s['count']:>7}{s['throughput']:>9.1f}{s['error_rate']:>8.1%}"
+                     f"{s['p50'] * 1000:>9.1f}{s['p90'] * 1000:>9.1f}"
+                     f"{s['p99'] * 1000:>9.1f}{s['max'] * 1000:>9.1f}")
+        if s["errors_by_type"]:
+            lines.append(f"  {'':<12}错误: {s['errors_by_type']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WDA 分级压力测试")
+    parser.add_argument("--url", default="http://localhost:8100", help="WDA 地址")
+    parser.add_argument("--mock", action="store_true", help="启动本地 MockWDA 作为目标")
+    parser.add_argument("--mock-latency", type=float, default=0.02, help="MockWDA 基础延迟（秒）")
+    parser.add_argument("--mix", nargs="*", default=None,
+                        help=f"操作=权重，可选: {' '.join(OPERATIONS)}")
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--rates", nargs="*", type=float, default=[0], help="目标总速率，0 为不限速")
+    parser.add_argument("--duration", type=float, default=10, help="每级持续时间（秒）")
+    parser.add_argument("--cooldown", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=10, help="单个请求超时（秒）")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="超过该错误率时停止")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="保存 JSON 结果")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    mock = None
+    url = args.url
+    if args.mock:
+        from mock_wda import MockWDA
+        mock = MockWDA(latency=args.mock_latency, seed=args.seed)
+        url = mock.start()
+
+    try:
+        test = LoadTest(url, mix, timeout=args.timeout, seed=args.seed)
+        results = test.run(args.concurrency, args.rates, args.duration, args.cooldown,
+                           args.max_error_rate)
+    except KeyboardInterrupt:
+        sys.exit(1)
+    finally:
+        if mock:
+            mock.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "mix": test.mix, "results": results}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
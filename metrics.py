@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+ECWDA 请求指标
+按设备、按接口统计请求数、错误数、收发字节数和延迟分布，
+可以通过 Python API 读取，也可以启动本地 HTTP 服务以 Prometheus 文本格式导出
+
+用法:
+    from metrics import REGISTRY
+    REGISTRY.serve(9108)                 # http://127.0.0.1:9108/metrics
+    print(REGISTRY.snapshot())
+"""
+
+import threading
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, List, Tuple, Any
+
+
+# 延迟直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Series:
+    """单个 (设备, 接口, 方法) 的累计值"""
+
+    __slots__ = ("count", "errors", "bytes_sent", "bytes_received", "seconds", "buckets")
+
+    def __init__(self, n_buckets: int):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (n_buckets + 1)  # 最后一个为 +Inf
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    请求指标注册表 (线程安全)
+
+    ECWDA 默认使用模块级的 REGISTRY，同一进程里的所有设备汇总在一起，
+    由 device 标签区分。
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: 延迟直方图的桶上界（秒），升序
+        """
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def observe(self, device: str, endpoint: str, method: str, seconds: float,
+                bytes_sent: int = 0, bytes_received: int = 0, error: bool = False):
+        """
+        记录一次请求
+
+        Args:
+            device: 设备 (WDA 地址)
+            endpoint: 接口路径 (已去掉会话 ID)
+            method: GET / POST
+            seconds: 耗时
+            bytes_sent: 请求体字节数
+            bytes_received: 响应体字节数
+            error: 是否失败 (连接错误、超时或 HTTP 状态码 >= 400)
+        """
+        key = (device, endpoint, method)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets))
+            series.count += 1
+            series.errors += bool(error)
+            series.bytes_sent += bytes_sent
+            series.bytes_received += bytes_received
+            series.seconds += seconds
+            series.buckets[index] += 1
+
+    def snapshot(self, device: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        当前指标
+
+        Args:
+            device: 只返回该设备，不传返回全部
+
+        Returns:
+            dict: {设备: {"方法 接口": {"count", "errors", "bytes_sent", "bytes_received",
+                   "seconds", "avg"}}}
+        """
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for (dev, endpoint, method), s in self._series.items():
+                if device is not None and dev != device:
+                    continue
+                result.setdefault(dev, {})[f"{method} {endpoint}"] = {
+                    "count": s.count,
+                    "errors": s.errors,
+                    "bytes_sent": s.bytes_sent,
+                    "bytes_received": s.bytes_received,
+                    "seconds": s.seconds,
+                    "avg": s.seconds / s.count if s.count else 0.0,
+                }
+        return result
+
+    def top(self, n: int = 10) -> List[Tuple[str, str, float]]:
+        """累计耗时最多的接口: [(设备, "方法 接口", 总秒数)]"""
+        with self._lock:
+            rows = [(dev, f"{method} {endpoint}", s.seconds)
+                    for (dev, endpoint, method), s in self._series.items()]
+        rows.sort(key=lambda r: r[2], reverse=True)
+        return rows[:n]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            items = sorted(self._series.items())
+            copies = [(key, s.count, s.errors, s.bytes_sent, s.bytes_received,
+                       s.seconds, list(s.buckets)) for key, s in items]
+
+        lines: List[str] = []
+        counters = [
+            ("ecwda_requests_total", "Requests sent to the device", 1),
+            ("ecwda_request_errors_total", "Requests that failed", 2),
+            ("ecwda_request_bytes_total", "Request body bytes sent", 3),
+            ("ecwda_response_bytes_total", "Response body bytes received", 4),
+        ]
+        for name, help_text, field in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for row in copies:
+                lines.append(f"{name}{{{self._labels(row[0])}}} {row[field]}")
+
+        name = "ecwda_request_duration_seconds"
+        lines.append(f"# HELP {name} Request latency")
+        lines.append(f"# TYPE {name} histogram")
+        for key, count, _, _, _, seconds, buckets in copies:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, hits in zip(self.buckets, buckets):
+                cumulative += hits
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {seconds}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(key: Tuple[str, str, str]) -> str:
+        device, endpoint, method = key
+        return (f'device="{_escape(device)}",endpoint="{_escape(endpoint)}",'
+                f'method="{_escape(method)}"')
+
+    # ========== HTTP 导出 ==========
+
+    def serve(self, port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        在后台线程启动 /metrics HTTP 服务 (重复调用返回已启动的服务)
+
+        Args:
+            port: 端口，0 表示随机端口
+            host: 监听地址，默认只允许本机访问
+
+        Returns:
+            ThreadingHTTPServer: 服务对象，server.server_port 为实际端口
+        """
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def stop(self):
+        """停止 HTTP 服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+本地模拟 ECWDA / WDA 服务
+不需要真机即可运行 SDK、投屏和回放的基准测试与回归测试
+
+支持 ecwda.py / screen_mirror.py 调用的全部路由，截图从磁盘读取，
+可以注入延迟、抖动和失败，并记录每个请求。
+
+用法:
+    # 命令行
+    python mock_wda.py --port 8100 --screenshots shots/ --latency 0.03 --jitter 0.01
+
+    # 代码中
+    with MockWDA(screenshots=["home.png"], latency=0.02) as mock:
+        ec = ECWDA(mock.url)
+        ec.click(100, 200)
+        print(mock.requests[-1])
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, List, Tuple, Any, Callable
+from xml.sax.saxutils import quoteattr
+
+from PIL import Image
+
+
+# 默认屏幕: iPhone 14 (390 x 844 点, 3 倍屏)
+DEFAULT_SIZE = (390, 844)
+DEFAULT_SCALE = 3
+
+DEFAULT_NODES = [
+    {"type": "XCUIElementTypeNavigationBar", "name": "设置", "label": "设置", "value": "",
+     "x": 0, "y": 47, "width": 390, "height": 96, "enabled": True, "visible": True},
+    {"type": "XCUIElementTypeButton", "name": "通用", "label": "通用", "value": "",
+     "x": 16, "y": 200, "width": 358, "height": 44, "enabled": True, "visible": True},
+    {"type": "XCUIElementTypeButton", "name": "显示与亮度", "label": "显示与亮度", "value": "",
+     "x": 16, "y": 244, "width": 358, "height": 44, "enabled": True, "visible": True},
+    {"type": "XCUIElementTypeSwitch", "name": "飞行模式", "label": "飞行模式", "value": "0",
+     "x": 16, "y": 300, "width": 358, "height": 44, "enabled": True, "visible": True},
+]
+
+
+def _placeholder_screenshot(size: Tuple[int, int], scale: int) -> bytes:
+    """生成一张带色块的占位截图 (PNG)"""
+    w, h = size[0] * scale, size[1] * scale
+    img = Image.new("RGB", (w, h), (242, 242, 247))
+    blocks = [((255, 59, 48), 0.2), ((52, 199, 89), 0.45), ((0, 122, 255), 0.7)]
+    for color, fy in blocks:
+        y = int(h * fy)
+        img.paste(color, (w // 8, y, w // 8 + w // 4, y + h // 20))
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+class _Screen:
+    """一张截图: PNG 的 base64 以及懒加载的解码图像"""
+
+    def __init__(self, png: bytes, name: str):
+        self.name = name
+        self.base64 = base64.b64encode(png).decode("ascii")
+        self._png = png
+        self._image: Optional[Image.Image] = None
+        self._lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        with self._lock:
+            if self._image is None:
+                self._image = Image.open(io.BytesIO(self._png)).convert("RGB")
+            return self._image
+
+
+class MockWDA:
+    """模拟 WDA 服务"""
+
+    def __init__(self, port: int = 0, host: str = "127.0.0.1",
+                 screenshots: Optional[List[str]] = None, frame_mode: str = "fixed",
+                 screen_size: Tuple[int, int] = DEFAULT_SIZE,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, drop_rate: float = 0.0,
+                 route_latency: Optional[Dict[str, float]] = None,
+                 nodes: Optional[List[Dict]] = None,
+                 ocr_results: Optional[List[Dict]] = None,
+                 detections: Optional[List[Dict]] = None,
+                 log_path: Optional[str] = None, seed: Optional[int] = None):
+        """
+        Args:
+            port: 端口，0 表示随机端口
+            host: 监听地址
+            screenshots: 截图文件或目录列表 (png/jpg)，不传使用生成的占位图
+            frame_mode: 截图切换方式 fixed (固定当前帧) / cycle (每次截图切换) /
+                        input (每次点击、滑动等输入后切换)
+            screen_size: 屏幕尺寸（点）
+            latency: 每个请求的基础延迟（秒）
+            jitter: 延迟抖动（秒），实际延迟在 latency ± jitter 内均匀分布
+            failure_rate: 返回 HTTP 500 的概率
+            drop_rate: 不返回响应直接断开连接的概率 (客户端表现为连接错误)
+            route_latency: 按路由覆盖基础延迟，如 {"/screenshot": 0.15}
+            nodes: /wda/node/* 和 /source 使用的节点列表
+            ocr_results: /wda/ocr/recognize 返回的结果
+            detections: /wda/yolo/detect 返回的检测结果
+            log_path: 请求日志 JSONL 文件路径
+            seed: 随机种子，用于复现延迟和失败
+        """
+        self.host = host
+        self.port = port
+        self.frame_mode = frame_mode
+        self.screen_size = screen_size
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.route_latency = dict(route_latency or {})
+        self.nodes = list(DEFAULT_NODES if nodes is None else nodes)
+        self.ocr_results = list(ocr_results or [])
+        self.detections = list(detections or [])
+        self.log_path = log_path
+
+        self.requests: List[Dict[str, Any]] = []
+        self.sessions: List[str] = []
+        self.clipboard = ""
+        self.files: Dict[str, str] = {}
+        self.model: Optional[Dict] = None
+        self.current_app = "com.apple.springboard"
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._log_file = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._screens = self._load_screens(screenshots)
+        self._frame = 0
+        self._routes = self._build_routes()
+
+    # ========== 截图 ==========
+
+    def _load_screens(self, paths: Optional[List[str]]) -> List[_Screen]:
+        files: List[str] = []
+        for path in paths or []:
+            if os.path.isdir(path):
+                files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                             if name.lower().endswith((".png", ".jpg", ".jpeg")))
+            else:
+                files.append(path)
+
+        screens = []
+        for path in files:
+            with open(path, "rb") as f:
+                data = f.read()
+            if not data.startswith(b"\x89PNG"):
+                # WDA 总是返回 PNG
+                buf = io.BytesIO()
+                Image.open(io.BytesIO(data)).convert("RGB").save(buf, "PNG")
+                data = buf.getvalue()
+            screens.append(_Screen(data, os.path.basename(path)))
+        if not screens:
+            screens.append(_Screen(_placeholder_screenshot(self.screen_size, DEFAULT_SCALE),
+                                   "placeholder"))
+        return screens
+
+    @property
+    def screen(self) -> _Screen:
+        """当前帧"""
+        return self._screens[self._frame]
+
+    def set_frame(self, index: int):
+        """切换到指定帧"""
+        with self._lock:
+            self._frame = index % len(self._screens)
+
+    def _advance(self):
+        with self._lock:
+            self._frame = (self._frame + 1) % len(self._screens)
+
+    # ========== 服务 ==========
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        """在后台线程启动服务，返回地址"""
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                mock._handle(self, "GET")
+
+            def do_POST(self):
+                mock._handle(self, "POST")
+
+            def do_DELETE(self):
+                mock._handle(self, "DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128  # 默认 5，多个线程同时建立连接时会被拒绝
+
+            def handle_error(self, request, client_address):
+                pass  # 注入的断连会让处理线程写入失败，忽略
+
+        if self.log_path:
+            self._log_file = open(self.log_path, "a", encoding="utf-8")
+        self._server = Server((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, path: Optional[str] = None, method: Optional[str] = None) -> int:
+        """已收到的请求数，可按路由 (会话 ID 替换为 {id}) 和方法过滤"""
+        with self._lock:
+            return sum(1 for r in self.requests
+                       if (path is None or r["route"] == path)
+                       and (method is None or r["method"] == method))
+
+    def reset_log(self):
+        with self._lock:
+            self.requests.clear()
+
+    # ========== 请求处理 ==========
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        start = time.perf_counter()
+        path = handler.path.split("?")[0].rstrip("/") or "/"
+        route, session_id = self._route_of(path)
+
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+
+        delay = self.route_latency.get(route, self.latency)
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = self._random.random()
+        if roll < self.drop_rate:
+            status, payload = 0, None
+        elif roll < self.drop_rate + self.failure_rate:
+            status, payload = 500, {"value": {"error": "unknown error",
+                                              "message": "injected failure"}}
+        else:
+            fn = self._routes.get((method, route))
+            if fn is None:
+                status, payload = 404, {"value": {"error": "unknown command",
+                                                  "message": f"Unhandled endpoint: {path}"}}
+            else:
+                try:
+                    status, value = 200, fn(body)
+                    payload = {"value": value, "sessionId": session_id}
+                    if route == "/session":
+                        payload = value
+                except Exception as e:
+                    status, payload = 500, {"value": {"error": "unknown error",
+                                                      "message": str(e)}}
+
+        sent = 0
+        if status == 0:
+            handler.close_connection = True
+            try:
+                handler.connection.shutdown(2)
+            except OSError:
+                pass
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            sent = len(data)
+            handler.send_response(status)
+            handler.send_header("Content-Type", "application/json; charset=utf-8")
+            handler.send_header("Content-Length", str(sent))
+            handler.end_headers()
+            handler.wfile.write(data)
+
+        self._log(method, path, route, status, body, len(raw), sent,
+                  time.perf_counter() - start)
+
+    def _log(self, method: str, path: str, route: str, status: int, body: Dict,
+             bytes_in: int, bytes_out: int, seconds: float):
+        entry = {
+            "time": time.time(), "method": method, "path": path, "route": route,
+            "status": status, "body": body if bytes_in < 4096 else {"size": bytes_in},
+            "bytes_in": bytes_in, "bytes_out": bytes_out, "duration": seconds,
+        }
+        with self._lock:
+            self.requests.append(entry)
+            if self._log_file is not None:
+                self._log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._log_file.flush()
+
+    @staticmethod
+    def _route_of(path: str) -> Tuple[str, Optional[str]]:
+        """把 /session/<id>/xxx 归一化为 /session/{id}/xxx"""
+        m = re.match(r"^/session/([^/]+)(/.*)?$", path)
+        if not m:
+            return path, None
+        return "/session/{id}" + (m.group(2) or ""), m.group(1)
+
+    def _build_routes(self) -> Dict[Tuple[str, str], Callable[[Dict], Any]]:
+        s = "/session/{id}"
+        routes = {
+            ("GET", "/status"): self._status,
+            ("POST", "/session"): self._create_session,
+            ("GET", s + "/window/size"): lambda b: {"width": self.screen_size[0],
+                                                    "height": self.screen_size[1]},
+            ("GET", "/screenshot"): self._screenshot,
+            ("GET", s + "/screenshot"): self._screenshot,
+            ("GET", "/source"): lambda b: self._source_xml(),
+            ("GET", s + "/source"): lambda b: self._source_xml(),
+            ("POST", "/wda/homescreen"): self._input,
+            ("POST", "/wda/inputText"): self._input,
+            ("POST", "/wda/openUrl"): self._input,
+            ("GET", "/wda/ecwda/info"): lambda b: {
+                "version": "1.0.0", "name": "ECWDA",
+                "features": ["findColor", "multiColor", "cmpColor", "pixel", "ocr",
+                             "longPress", "doubleTap", "clickText"]},
+            ("POST", "/wda/findColor"): self._find_color,
+            ("POST", "/wda/pixel"): self._pixel,
+            ("POST", "/wda/ocr/recognize"): lambda b: {"results": list(self.ocr_results)},
+            ("POST", "/wda/findImage"): lambda b: {"found": False, "x": -1, "y": -1},
+            ("POST", "/wda/qrcode/decode"): lambda b: {"codes": []},
+            ("GET", "/wda/node/all"): lambda b: {"nodes": list(self.nodes)},
+            ("POST", "/wda/node/findByText"): self._find_by_text,
+            ("POST", "/wda/node/findByType"): self._find_by_type,
+            ("POST", "/wda/node/click"): self._node_click,
+            ("POST", "/wda/yolo/loadModel"): self._load_model,
+            ("POST", "/wda/yolo/detect"): self._detect,
+            ("GET", "/wda/yolo/modelInfo"): lambda b: self.model or {"loaded": False},
+            ("GET", "/wda/clipboard"): lambda b: {"content": self.clipboard},
+            ("POST", "/wda/clipboard"): self._set_clipboard,
+            ("GET", "/wda/file/sandbox"): lambda b: {"documents": "/mock/Documents",
+                                                     "tmp": "/mock/tmp"},
+            ("POST", "/wda/file/read"): lambda b: {"content": self.files.get(b.get("path"), "")},
+            ("POST", "/wda/file/write"): self._write_file,
+            ("POST", "/wda/file/list"): lambda b: {"files": [
+                {"name": p.rsplit("/", 1)[-1], "path": p} for p in sorted(self.files)
+                if p.startswith(b.get("path", ""))]},
+            ("POST", "/wda/file/delete"): lambda b: {"success": self.files.pop(
+                b.get("path"), None) is not None},
+            ("POST", "/wda/script/execute"): lambda b: {"scriptId": b.get("scriptId") or "mock",
+                                                        "running": False},
+            ("GET", "/wda/script/status"): lambda b: {"running": False},
+            ("POST", "/wda/script/stop"): lambda b: {"success": True},
+            ("POST", "/wda/utils/random"): lambda b: {"value": self._random.randint(
+                int(b.get("min", 0)), int(b.get("max", 100)))},
+            ("POST", "/wda/utils/md5"): lambda b: {"md5": hashlib.md5(
+                str(b.get("text", "")).encode("utf-8")).hexdigest()},
+            ("POST", "/wda/utils/base64/encode"): lambda b: {"result": base64.b64encode(
+                str(b.get("text", "")).encode("utf-8")).decode("ascii")},
+            ("POST", "/wda/utils/base64/decode"): lambda b: {"result": base64.b64decode(
+                b.get("base64", "")).decode("utf-8", "replace")},
+            ("POST", "/wda/utils/vibrate"): lambda b: {"success": True},
+            ("POST", "/wda/utils/saveToAlbum"): lambda b: {"success": True},
+            ("GET", "/wda/app/current"): lambda b: {"bundleId": self.current_app},
+        }
+        for gesture in ("/wda/tap/0", "/wda/touchAndHold", "/wda/doubleTap",
+                        "/wda/dragFromToForDuration", "/wda/dragfromtoforduration"):
+            routes[("POST", s + gesture)] = self._input
+        routes[("POST", s + "/wda/apps/launch")] = self._launch
+        routes[("POST", s + "/wda/apps/terminate")] = self._terminate
+        return routes
+
+    # ========== 路由实现 ==========
+
+    def _status(self, body: Dict) -> Dict:
+        return {"ready": True, "message": "MockWDA is ready",
+                "ios": {"sdkVersion": "17.0", "name": "MockPhone"},
+                "state": "success"}
+
+    def _create_session(self, body: Dict) -> Dict:
+        session_id = uuid.uuid4().hex.upper()
+        bundle_id = body.get("capabilities", {}).get("bundleId")
+        with self._lock:
+            self.sessions.append(session_id)
+            if bundle_id:
+                self.current_app = bundle_id
+        return {"sessionId": session_id, "value": {"sessionId": session_id,
+                                                   "capabilities": body.get("capabilities", {})}}
+
+    def _screenshot(self, body: Dict) -> str:
+        screen = self.screen
+        if self.frame_mode == "cycle":
+            self._advance()
+        return screen.base64
+
+    def _input(self, body: Dict) -> None:
+        if self.frame_mode == "input":
+            self._advance()
+        return None
+
+    def _launch(self, body: Dict) -> None:
+        self.current_app = body.get("bundleId", self.current_app)
+        return self._input(body)
+
+    def _terminate(self, body: Dict) -> bool:
+        if body.get("bundleId") == self.current_app:
+            self.current_app = "com.apple.springboard"
+        return True
+
+    def _set_clipboard(self, body: Dict) -> Dict:
+        self.clipboard = str(body.get("content", ""))
+        return {"success": True}
+
+    def _write_file(self, body: Dict) -> Dict:
+        self.files[body.get("path", "")] = str(body.get("content", ""))
+        return {"success": True}
+
+    def _pixel(self, body: Dict) -> Dict:
+        img = self.screen.image
+        x = min(max(0, int(body.get("x", 0))), img.width - 1)
+        y = min(max(0, int(body.get("y", 0))), img.height - 1)
+        r, g, b = img.getpixel((x, y))
+        return {"color": f"#{r:02X}{g:02X}{b:02X}", "value": (r << 16) | (g << 8) | b,
+                "r": r, "g": g, "b": b}
+
+    def _find_color(self, body: Dict) -> Dict:
+        """
+        在当前截图中按行优先顺序查找第一个匹配的像素
+
+        与服务端规则一致: 三通道差值之和 <= (1 - similarity) * 765，
+        请求体没有 similarity 时按 1 - tolerance / 255 换算
+        """
+        import numpy as np
+
+        color = str(body.get("color", "#000000")).lstrip("#")
+        target = np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.int16)
+        similarity = float(body.get("similarity", 1 - int(body.get("tolerance", 10)) / 255))
+        img = self.screen.image
+        region = body.get("region") or {}
+        x0, y0 = max(0, int(region.get("x", 0))), max(0, int(region.get("y", 0)))
+        x1 = min(img.width, int(region.get("x", 0)) + int(region.get("width", img.width)))
+        y1 = min(img.height, int(region.get("y", 0)) + int(region.get("height", img.height)))
+        if x1 <= x0 or y1 <= y0:
+            return {"found": False, "x": -1, "y": -1}
+        pixels = np.asarray(img.crop((x0, y0, x1, y1)).convert("RGB"), dtype=np.int16)
+        distance = np.abs(pixels - target).sum(axis=2)
+        hits = np.flatnonzero(distance <= (1 - similarity) * 765)
+        if not hits.size:
+            return {"found": False, "x": -1, "y": -1}
+        y, x = divmod(int(hits[0]), x1 - x0)
+        return {"found": True, "x": x0 + x, "y": y0 + y}
+
+    def _find_by_text(self, body: Dict) -> Dict:
+        text = str(body.get("text", ""))
+        partial = body.get("partial", True)
+        nodes = []
+        for node in self.nodes:
+            field = str(node.get("label") or node.get("name") or "")
+            if (text in field) if partial else (text == field):
+                nodes.append(node)
+        return {"nodes": nodes}
+
+    def _find_by_type(self, body: Dict) -> Dict:
+        wanted = str(body.get("type", "")).lower().replace("xcuielementtype", "")
+        return {"nodes": [n for n in self.nodes
+                          if str(n.get("type", "")).lower().replace("xcuielementtype", "")
+                          == wanted]}
+
+    def _node_click(self, body: Dict) -> Dict:
+        found = self._find_by_text({"text": body.get("text", ""), "partial": True})["nodes"]
+        if not found:
+            return {"success": False, "message": "Element not found"}
+        self._input(body)
+        return {"success": True}
+
+    def _load_model(self, body: Dict) -> Dict:
+        self.model = {"loaded": True, "name": body.get("modelName") or body.get("name"),
+                      "labels": body.get("labels", [])}
+        return {"success": True}
+
+    def _detect(self, body: Dict) -> Dict:
+        confidence = float(body.get("confidence", 0.5))
+        labels = {label.lower() for label in body.get("labels") or []}
+        results = [d for d in self.detections
+                   if d.get("confidence", 0) >= confidence
+                   and (not labels or d.get("label", "").lower() in labels)]
+        results.sort(key=lambda d: d.get("confidence", 0), reverse=True)
+        return {"detections": results[:int(body.get("maxResults", 10))]}
+
+    def _source_xml(self) -> str:
+        w, h = self.screen_size
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 f'<XCUIElementTypeApplication type="XCUIElementTypeApplication" name="Mock" '
+                 f'label="Mock" enabled="true" visible="true" x="0" y="0" '
+                 f'width="{w}" height="{h}">']
+        for node in self.nodes:
+            node_type = node.get("type", "XCUIElementTypeOther")
+            attrs = " ".join(f"{k}={quoteattr(str(node.get(k, '')))}"
+                             for k in ("type", "name", "label", "value"))
+            geometry = " ".join(f'{k}="{int(node.get(k, 0))}"'
+                                for k in ("x", "y", "width", "height"))
+            flags = (f'enabled="{str(node.get("enabled", True)).lower()}" '
+                     f'visible="{str(node.get("visible", True)).lower()}"')
+            lines.append(f"  <{node_type} {attrs} {flags} {geometry}/>")
+        lines.append("</XCUIElementTypeApplication>")
+        return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟 ECWDA / WDA 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--screenshots", nargs="*", default=None, help="截图文件或目录")
+    parser.add_argument("--frame-mode", default="fixed", choices=["fixed", "cycle", "input"])
+    parser.add_argument("--latency", type=float, default=0.0, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="直接断开连接的概率")
+    parser.add_argument("--nodes", default=None, help="节点列表 JSON 文件")
+    parser.add_argument("--log", default=None, help="请求日志 JSONL 文件")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    nodes = None
+    if args.nodes:
+        with open(args.nodes, "r", encoding="utf-8") as f:
+            nodes = json.load(f)
+
+    mock = MockWDA(port=args.port, host=args.host, screenshots=args.screenshots,
+                   frame_mode=args.frame_mode, latency=args.latency, jitter=args.jitter,
+                   failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+                   nodes=nodes, log_path=args.log, seed=args.seed)
+    mock.start()
+    print(f"MockWDA 已启动: {mock.url}  (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
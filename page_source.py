@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+页面源码流式解析
+边下载边解析 /source 返回的 XML 页面树，无需先把整段 XML 读入内存
+
+/source 的响应是 {"value": "<?xml ...>", "sessionId": ...} 形式的 JSON，
+XML 作为 JSON 字符串嵌在其中。这里先从字节流中增量解出 value 字符串，
+再喂给 XMLPullParser，逐个产出元素；找到目标后可立即停止下载。
+"""
+
+import codecs
+import requests
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Optional, Dict, List, Iterable, Iterator, Callable, Any, Tuple
+
+
+# 转为整数的几何属性
+_RECT_KEYS = ("x", "y", "width", "height")
+
+# 转为布尔值的属性
+_BOOL_KEYS = ("enabled", "visible", "accessible", "selected", "focused")
+
+_ESCAPES = {
+    '"': '"', "\\": "\\", "/": "/",
+    "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t",
+}
+
+
+class _JSONValueStream:
+    """
+    从 JSON 响应的字节块中增量提取顶层 "value" 字符串
+
+    只实现扫描顶层对象所需的最小状态机: 跳过其它键值，
+    遇到字符串类型的 value 后逐块解码转义字符并输出。
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[List[str]] = None
+        self._last_key: Optional[str] = None
+        self._expect_value = False
+        self._streaming = False
+        self._pending = ""
+        self.done = False
+
+    def feed(self, chunk: bytes) -> str:
+        """输入一块字节，返回本块中解出的 value 文本"""
+        if self.done:
+            return ""
+        text = self._pending + self._decoder.decode(chunk)
+        self._pending = ""
+        if self._streaming:
+            return self._decode_string(text, 0)
+        return self._scan(text)
+
+    def _scan(self, text: str) -> str:
+        i, n = 0, len(text)
+        while i < n:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key is not None:
+                        self._last_key = "".join(self._key)
+                        self._key = None
+                elif self._key is not None:
+                    self._key.append(ch)
+                i += 1
+                continue
+
+            if ch == '"':
+                if self._depth == 1 and self._expect_value and self._last_key == "value":
+                    self._streaming = True
+                    return self._decode_string(text, i + 1)
+                self._in_string = True
+                if self._depth == 1 and not self._expect_value:
+                    self._key = []
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = True
+            elif ch == "," and self._depth == 1:
+                self._expect_value = False
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+                    return ""
+            i += 1
+        return ""
+
+    def _decode_string(self, text: str, start: int) -> str:
+        out = []
+        i, n = start, len(text)
+        while i < n:
+            j = text.find("\\", i)
+            q = text.find('"', i)
+            if q != -1 and (j == -1 or q < j):
+                out.append(text[i:q])
+                self._streaming = False
+                self.done = True
+                return "".join(out)
+            if j == -1:
+                out.append(text[i:])
+                return "".join(out)
+            out.append(text[i:j])
+            if j + 1 >= n:
+                self._pending = text[j:]
+                return "".join(out)
+            esc = text[j + 1]
+            if esc == "u":
+                if j + 6 > n:
+                    self._pending = text[j:]
+                    return "".join(out)
+                code = int(text[j + 2:j + 6], 16)
+                if 0xD800 <= code < 0xDC00:
+                    # 代理对，需要连同低位一起解码
+                    if j + 12 > n:
+                        self._pending = text[j:]
+                        return "".join(out)
+                    low = int(text[j + 8:j + 12], 16)
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i = j + 12
+                else:
+                    out.append(chr(code))
+                    i = j + 6
+            else:
+                out.append(_ESCAPES.get(esc, esc))
+                i = j + 2
+        return "".join(out)
+
+
+def _convert_attrib(attrib: Dict[str, str]) -> Dict[str, Any]:
+    """将 XML 属性转换为节点字典 (几何属性转整数，状态属性转布尔值)"""
+    node: Dict[str, Any] = dict(attrib)
+    for key in _RECT_KEYS:
+        if key in node:
+            try:
+                node[key] = int(float(node[key]))
+            except ValueError:
+                pass
+    for key in _BOOL_KEYS:
+        if key in node:
+            node[key] = node[key] == "true"
+    return node
+
+
+def iter_xml_elements(text_chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    增量解析 XML 文本块，按文档顺序逐个产出元素
+
+    Args:
+        text_chunks: XML 文本块
+
+    Yields:
+        dict: 元素属性，附加 type / depth / index / parent 字段
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack: List[int] = []
+    index = 0
+    for chunk in text_chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                node = _convert_attrib(elem.attrib)
+                node.setdefault("type", elem.tag)
+                node["depth"] = len(stack)
+                node["index"] = index
+                node["parent"] = stack[-1] if stack else -1
+                stack.append(index)
+                index += 1
+                yield node
+            else:
+                stack.pop()
+                # 已产出的元素不再需要，释放子树
+                elem.clear()
+    parser.close()
+
+
+def stream_source(base_url: str, timeout: float = 30, chunk_size: int = 64 * 1024,
+                  send: Callable[..., requests.Response] = requests.request) -> Iterator[str]:
+    """
+    流式下载 /source，逐块产出解码后的 XML 文本
+
+    生成器关闭时 (例如提前找到目标) 立即断开连接，不再下载剩余内容。
+
+    Args:
+        base_url: WDA 服务地址
+        timeout: 超时时间
+        chunk_size: 每次读取的字节数
+        send: 发送请求的函数，签名同 requests.request，需要支持 stream=True；
+              ECWDA 传入自己的传输层，请求经过熔断、自适应超时、指标和录制
+    """
+    resp = send("GET", f"{base_url.rstrip('/')}/source", stream=True, timeout=timeout)
+    try:
+        resp.raise_for_status()
+        stream = _JSONValueStream()
+        for chunk in resp.iter_content(chunk_size=chunk_size):
+            text = stream.feed(chunk)
+            if text:
+                yield text
+            if stream.done:
+                break
+    finally:
+        resp.close()
+
+
+def iter_source_elements(base_url: str, predicate: Optional[Callable[[Dict], bool]] = None,
+                         timeout: float = 30,
+                         send: Callable[..., requests.Response] = requests.request
+                         ) -> Iterator[Dict[str, Any]]:
+    """
+    流式获取页面元素
+
+    Args:
+        base_url: WDA 服务地址
+        predicate: 过滤条件，只产出满足条件的元素
+        timeout: 超时时间
+        send: 发送请求的函数，见 stream_source
+
+    Yields:
+        dict: 元素
+    """
+    chunks = stream_source(base_url, timeout, send=send)
+    try:
+        for node in iter_xml_elements(chunks):
+            if predicate is None or predicate(node):
+                yield node
+    finally:
+        chunks.close()
+
+
+def find_source_element(base_url: str, predicate: Callable[[Dict], bool],
+                        timeout: float = 30,
+                        send: Callable[..., requests.Response] = requests.request
+                        ) -> Optional[Dict[str, Any]]:
+    """查找第一个满足条件的元素，找到后立即停止下载和解析"""
+    elements = iter_source_elements(base_url, predicate, timeout, send)
+    try:
+        return next(elements, None)
+    finally:
+        elements.close()
+
+
+class CompactTree:
+    """
+    紧凑页面树
+
+    用定长数组按列存储节点 (父节点、深度、几何、状态)，字符串统一驻留到字符串池，
+    几万个元素的整页树只占用很少内存，需要时再按下标还原为节点字典。
+    """
+
+    _STRING_KEYS = ("type", "name", "label", "value")
+
+    def __init__(self):
+        self.parent = array("i")
+        self.depth = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.x = array("i")
+        self.y = array("i")
+        self.width = array("i")
+        self.height = array("i")
+        self.flags = array("B")
+        self.type_id = array("i")
+        self.name_id = array("i")
+        self.label_id = array("i")
+        self.value_id = array("i")
+        self._last_child = array("i")
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[Dict[str, Any]]) -> "CompactTree":
+        """由 iter_xml_elements / iter_source_elements 的输出构建"""
+        tree = cls()
+        for node in elements:
+            tree.append(node)
+        return tree
+
+    def _intern(self, text: Optional[str]) -> int:
+        if text is None:
+            return -1
+        sid = self._string_ids.get(text)
+        if sid is None:
+            sid = len(self._strings)
+            self._strings.append(text)
+            self._string_ids[text] = sid
+        return sid
+
+    def append(self, node: Dict[str, Any]) -> int:
+        """按文档顺序追加节点 (父节点必须已存在)，返回节点下标"""
+        i = len(self.parent)
+        parent = node.get("parent", -1)
+        self.parent.append(parent)
+        self.depth.append(node.get("depth", 0))
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self._last_child.append(-1)
+        if parent >= 0:
+            prev = self._last_child[parent]
+            if prev < 0:
+                self.first_child[parent] = i
+            else:
+                self.next_sibling[prev] = i
+            self._last_child[parent] = i
+
+        for key, column in zip(_RECT_KEYS, (self.x, self.y, self.width, self.height)):
+            value = node.get(key, 0)
+            column.append(value if isinstance(value, int) else 0)
+        flags = 0
+        for bit, key in enumerate(_BOOL_KEYS):
+            if node.get(key):
+                flags |= 1 << bit
+        self.flags.append(flags)
+
+        self.type_id.append(self._intern(node.get("type")))
+        self.name_id.append(self._intern(node.get("name")))
+        self.label_id.append(self._intern(node.get("label")))
+        self.value_id.append(self._intern(node.get("value")))
+        return i
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def string(self, sid: int) -> Optional[str]:
+        """字符串池查询"""
+        return self._strings[sid] if sid >= 0 else None
+
+    def node(self, i: int) -> Dict[str, Any]:
+        """还原为节点字典"""
+        node: Dict[str, Any] = {"index": i, "parent": self.parent[i], "depth": self.depth[i]}
+        for key, column in zip(self._STRING_KEYS,
+                               (self.type_id, self.name_id, self.label_id, self.value_id)):
+            text = self.string(column[i])
+            if text is not None:
+                node[key] = text
+        node["x"], node["y"] = self.x[i], self.y[i]
+        node["width"], node["height"] = self.width[i], self.height[i]
+        for bit, key in enumerate(_BOOL_KEYS):
+            node[key] = bool(self.flags[i] & (1 << bit))
+        return node
+
+    def children(self, i: int) -> List[int]:
+        """子节点下标"""
+        result = []
+        child = self.first_child[i]
+        while child >= 0:
+            result.append(child)
+            child = self.next_sibling[child]
+        return result
+
+    def find(self, predicate: Callable[[Dict], bool]) -> List[Dict[str, Any]]:
+        """查找所有满足条件的节点"""
+        return [node for node in map(self.node, range(len(self))) if predicate(node)]
+
+    def to_nodes(self) -> List[Dict[str, Any]]:
+        """全部节点字典 (用于建立 NodeSnapshot 索引)"""
+        return [self.node(i) for i in range(len(self))]
+
+    def memory_bytes(self) -> int:
+        """数组部分的内存占用估算（字节，不含字符串池）"""
+        columns = (self.parent, self.depth, self.first_child, self.next_sibling,
+                   self.x, self.y, self.width, self.height, self.flags,
+                   self.type_id, self.name_id, self.label_id, self.value_id)
+        return sum(col.itemsize * len(col) for col in columns)
+
+
+def load_source_tree(base_url: str, timeout: float = 30,
+                     send: Callable[..., requests.Response] = requests.request) -> CompactTree:
+    """流式下载并解析整页源码为紧凑树"""
+    return CompactTree.from_elements(iter_source_elements(base_url, timeout=timeout, send=send))
+
+
+def _own_key(tree: CompactTree, i: int) -> tuple:
+    """节点自身内容 (不含位置和子节点)"""
+    return (tree.string(tree.type_id[i]), tree.string(tree.name_id[i]),
+            tree.string(tree.label_id[i]), tree.string(tree.value_id[i]),
+            tree.width[i], tree.height[i], tree.flags[i])
+
+
+def _position(tree: CompactTree, i: int) -> tuple:
+    return tree.x[i], tree.y[i]
+
+
+def _identity(tree: CompactTree, i: int) -> tuple:
+    """节点身份 (用于在两次快照之间配对同一个节点)"""
+    return (tree.string(tree.type_id[i]), tree.string(tree.name_id[i]),
+            tree.string(tree.label_id[i]))
+
+
+def subtree_hashes(tree: CompactTree) -> List[int]:
+    """
+    计算每个节点的子树哈希
+
+    节点按文档顺序存储 (父节点下标总小于子节点)，倒序遍历即可自底向上计算。
+    哈希只包含节点内容和子节点相对于父节点的偏移，不含自身的绝对位置:
+    整体平移 (列表滚动) 的子树哈希不变。子树哈希相同即认为整棵子树内容未变化。
+    """
+    n = len(tree)
+    hashes = [0] * n
+    for i in range(n - 1, -1, -1):
+        x, y = tree.x[i], tree.y[i]
+        children = tuple((hashes[c], tree.x[c] - x, tree.y[c] - y) for c in tree.children(i))
+        hashes[i] = hash((_own_key(tree, i), children))
+    return hashes
+
+
+class TreeDiff:
+    """两次页面树快照之间的差异"""
+
+    def __init__(self, old: Optional[CompactTree] = None, new: Optional[CompactTree] = None):
+        self.inserted: List[Dict[str, Any]] = []
+        self.removed: List[Dict[str, Any]] = []
+        self.modified: List[tuple] = []  # (旧节点, 新节点)，内容变化
+        self.moved: List[tuple] = []     # (旧节点, 新节点)，只有位置变化 (整棵子树一起平移)
+        self.old = old
+        self.new = new
+        self._same_subtrees: List[Tuple[int, int]] = []  # 内容相同的子树 (旧下标, 新下标)
+        self._same_nodes: List[Tuple[int, int]] = []     # 内容相同的单个节点
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.removed or self.modified or self.moved)
+
+    def __repr__(self) -> str:
+        return (f"TreeDiff(inserted={len(self.inserted)}, removed={len(self.removed)}, "
+                f"modified={len(self.modified)}, moved={len(self.moved)})")
+
+    def index_map(self) -> Dict[int, int]:
+        """
+        新树下标 -> 旧树下标，只包含内容未变化的节点 (位置可能不同)
+
+        Returns:
+            dict: {新下标: 旧下标}
+        """
+        mapping = dict((j, i) for i, j in self._same_nodes)
+        for i, j in self._same_subtrees:
+            mapping.update(zip(_subtree(self.new, j), _subtree(self.old, i)))
+        return mapping
+
+
+def _subtree(tree: CompactTree, i: int) -> List[int]:
+    """子树内所有节点下标 (前序)"""
+    result, stack = [], [i]
+    while stack:
+        node = stack.pop()
+        result.append(node)
+        stack.extend(reversed(tree.children(node)))
+    return result
+
+
+def _roots(tree: CompactTree) -> List[int]:
+    return [i for i in range(len(tree)) if tree.parent[i] < 0]
+
+
+def tree_diff(old: CompactTree, new: CompactTree,
+              old_hashes: Optional[List[int]] = None,
+              new_hashes: Optional[List[int]] = None) -> TreeDiff:
+    """
+    计算两棵页面树的差异
+
+    子树哈希相同的子树直接跳过 (O(1))，只深入发生变化的分支。
+    子节点配对顺序: 先按子树哈希精确配对 (处理列表滚动造成的平移)，
+    再按 (类型, name, label) 依次配对，剩余的记为插入/删除。
+    内容变化记为 modified，内容相同只有位置变化记为 moved (平移的子树只记录根节点)。
+
+    Args:
+        old: 旧树
+        new: 新树
+        old_hashes: 旧树子树哈希 (可传入缓存结果避免重复计算)
+        new_hashes: 新树子树哈希
+
+    Returns:
+        TreeDiff: inserted / removed 为节点字典列表，modified / moved 为 (旧节点, 新节点) 列表
+    """
+    if old_hashes is None:
+        old_hashes = subtree_hashes(old)
+    if new_hashes is None:
+        new_hashes = subtree_hashes(new)
+
+    diff = TreeDiff(old, new)
+    pending = [(_roots(old), _roots(new))]
+    while pending:
+        old_ids, new_ids = pending.pop()
+
+        # 1. 子树完全相同的节点直接配对
+        by_hash: Dict[int, List[int]] = {}
+        for j in new_ids:
+            by_hash.setdefault(new_hashes[j], []).append(j)
+        old_left = []
+        matched_new = set()
+        for i in old_ids:
+            candidates = by_hash.get(old_hashes[i])
+            if candidates:
+                j = candidates.pop(0)
+                matched_new.add(j)
+                diff._same_subtrees.append((i, j))
+                if _position(old, i) != _position(new, j):
+                    diff.moved.append((old.node(i), new.node(j)))
+            else:
+                old_left.append(i)
+        new_left = [j for j in new_ids if j not in matched_new]
+
+        # 2. 按身份配对，深入比较
+        by_identity: Dict[tuple, List[int]] = {}
+        for j in new_left:
+            by_identity.setdefault(_identity(new, j), []).append(j)
+        paired_new = set()
+        for i in old_left:
+            candidates = by_identity.get(_identity(old, i))
+            if not candidates:
+                diff.removed.extend(old.node(k) for k in _subtree(old, i))
+                continue
+            j = candidates.pop(0)
+            paired_new.add(j)
+            if _own_key(old, i) != _own_key(new, j):
+                diff.modified.append((old.node(i), new.node(j)))
+            else:
+                diff._same_nodes.append((i, j))
+                if _position(old, i) != _position(new, j):
+                    diff.moved.append((old.node(i), new.node(j)))
+            pending.append((old.children(i), new.children(j)))
+
+        # 3. 剩余的新节点为插入
+        for j in new_left:
+            if j not in paired_new:
+                diff.inserted.extend(new.node(k) for k in _subtree(new, j))
+    return diff
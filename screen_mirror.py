@@ -12,7 +12,7 @@ import io
 import base64
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from ecwda import CommandScheduler
 
 
 class iOSScreenMirror:
@@ -28,8 +28,8 @@ class iOSScreenMirror:
         self.drag_start = None
         self.drag_moved = False
         
-        # 线程池用于异步操作
-        self.executor = ThreadPoolExecutor(max_workers=3)
+        # 命令调度器: 点击/滑动按顺序执行，并优先于截图
+        self.scheduler = CommandScheduler(name="mirror")
         
         # 当前图片缓存
         self.current_photo = None
@@ -205,8 +205,13 @@ class iOSScreenMirror:
         if not self.session_id:
             return
             
+        future = self.scheduler.try_submit(CommandScheduler.SCREENSHOT, requests.get,
+                                           f"{self.wda_url}/screenshot", timeout=3)
+        if future is None:
+            return  # 截图队列已满，跳过这一帧
+            
         try:
-            resp = requests.get(f"{self.wda_url}/screenshot", timeout=3)
+            resp = future.result()
             data = resp.json()
             
             if "value" in data:
@@ -256,7 +261,7 @@ class iOSScreenMirror:
             x = int(self.drag_start[0] / self.scale)
             y = int(self.drag_start[1] / self.scale)
             self.status_var.set(f"点击: ({x}, {y})")
-            self.executor.submit(self._do_tap, x, y)
+            self._submit_input(self._do_tap, x, y)
         else:
             # 滑动
             from_x = int(self.drag_start[0] / self.scale)
@@ -269,11 +274,16 @@ class iOSScreenMirror:
             duration = max(duration, 0.1)
             
             self.status_var.set(f"滑动: ({from_x},{from_y}) → ({to_x},{to_y})")
-            self.executor.submit(self._do_swipe, from_x, from_y, to_x, to_y, duration)
+            self._submit_input(self._do_swipe, from_x, from_y, to_x, to_y, duration)
             
         self.drag_start = None
         self.drag_moved = False
         
+    def _submit_input(self, fn, *args):
+        """提交输入操作，队列已满时提示而不是阻塞界面"""
+        if self.scheduler.try_submit(CommandScheduler.INPUT, fn, *args) is None:
+            self.status_var.set("操作过快，设备繁忙")
+            
     def _do_tap(self, x, y):
         """执行点击 - 异步"""
         try:
@@ -307,7 +317,7 @@ class iOSScreenMirror:
         if not self.session_id:
             return
         self.status_var.set("返回主屏幕...")
-        self.executor.submit(self._do_home)
+        self._submit_input(self._do_home)
         
     def _do_home(self):
         """执行 Home - 异步"""
@@ -322,7 +332,8 @@ class iOSScreenMirror:
         if not self.session_id:
             return
         self.status_var.set("正在截图...")
-        self.executor.submit(self._do_screenshot)
+        if self.scheduler.try_submit(CommandScheduler.SCREENSHOT, self._do_screenshot) is None:
+            self.status_var.set("截图队列已满，请稍后")
         
     def _do_screenshot(self):
         """执行截图 - 异步"""
@@ -342,7 +353,7 @@ class iOSScreenMirror:
     def _on_close(self):
         """关闭窗口"""
         self.running = False
-        self.executor.shutdown(wait=False)
+        self.scheduler.shutdown()
         self.root.destroy()
         
     def run(self):
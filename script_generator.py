@@ -19,7 +19,7 @@ import json
 import base64
 import io
 from datetime import datetime
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, Callable, Union
 
 try:
     from PIL import Image, ImageTk, ImageDraw, ImageFont
@@ -30,6 +30,238 @@ except ImportError:
 from ecwda import ECWDA
 
 
+def play_actions(ec: ECWDA, actions: List[Dict], sleep=time.sleep):
+    """
+    回放录制的动作
+    
+    Args:
+        ec: ECWDA 客户端
+        actions: 录制的动作列表 [{"action": "tap", "params": {...}}, ...]
+        sleep: 等待函数，基准测试时可替换
+    """
+    for action in actions:
+        name, p = action['action'], action.get('params', {})
+        if name == 'tap':
+            ec.click(p['x'], p['y'])
+        elif name == 'longPress':
+            ec.long_click(p['x'], p['y'], p.get('duration', 1))
+        elif name == 'doubleTap':
+            ec.double_click(p['x'], p['y'])
+        elif name == 'swipe':
+            ec.swipe(p['fromX'], p['fromY'], p['toX'], p['toY'])
+        elif name == 'sleep':
+            sleep(p['seconds'])
+        elif name == 'home':
+            ec.home()
+        elif name == 'swipe_up':
+            ec.swipe_up()
+        elif name == 'swipe_down':
+            ec.swipe_down()
+
+
+def read_actions(path: str) -> List[Dict]:
+    """
+    读取动作文件
+    
+    Args:
+        path: .json (动作数组) 或 .jsonl (每行一个动作，录制时实时写入的格式)
+        
+    Returns:
+        list: 动作列表；.jsonl 最后一行不完整 (录制中途退出) 时忽略该行
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if not path.endswith('.jsonl'):
+            return json.load(f)
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    actions = []
+    for i, line in enumerate(lines):
+        try:
+            actions.append(json.loads(line))
+        except ValueError:
+            if i < len(lines) - 1:
+                raise
+    return actions
+
+
+class ActionLog:
+    """
+    录制的动作 (只追加)
+    
+    追加的开销与已有动作数量无关，界面通过 on_append / on_reset 回调增量更新。
+    设置 stream_to 后每个动作立即写入一行 JSON 并刷新到磁盘，长时间录制中途退出也不会丢失。
+    """
+    
+    def __init__(self, actions: Optional[List[Dict]] = None):
+        self._actions: List[Dict] = list(actions or [])
+        self._stream = None
+        self.stream_path: Optional[str] = None
+        self.on_append: List[Callable[[int, Dict], None]] = []
+        self.on_reset: List[Callable[[], None]] = []
+    
+    def append(self, action: Dict) -> int:
+        """追加动作，返回序号 (从 0 开始)"""
+        index = len(self._actions)
+        self._actions.append(action)
+        if self._stream:
+            self._write(action)
+            self._stream.flush()
+        for callback in self.on_append:
+            callback(index, action)
+        return index
+    
+    def extend(self, actions: List[Dict]):
+        """批量追加"""
+        for action in actions:
+            self.append(action)
+    
+    def clear(self):
+        """清空，并停止写入文件 (已写入的文件保持不变，之后的动作不再写入)"""
+        self._actions = []
+        self.stop_stream()
+        for callback in self.on_reset:
+            callback()
+    
+    def snapshot(self) -> List[Dict]:
+        """当前动作列表的副本 (用于 JSON 序列化和后台回放)"""
+        return list(self._actions)
+    
+    def stream_to(self, path: str):
+        """
+        写入 JSONL 文件: 先写入已有动作，之后每追加一个动作写入一行
+        
+        Args:
+            path: 文件路径，已存在时覆盖
+        """
+        self.stop_stream()
+        self._stream = open(path, 'w', encoding='utf-8')
+        self.stream_path = path
+        for action in self._actions:
+            self._write(action)
+        self._stream.flush()
+    
+    def stop_stream(self):
+        """停止写入文件"""
+        if self._stream:
+            self._stream.close()
+        self._stream = None
+        self.stream_path = None
+    
+    def _write(self, action: Dict):
+        self._stream.write(json.dumps(action, ensure_ascii=False) + "\n")
+    
+    def __len__(self) -> int:
+        return len(self._actions)
+    
+    def __iter__(self):
+        return iter(self._actions)
+    
+    def __getitem__(self, index):
+        return self._actions[index]
+
+
+class ScriptView:
+    """
+    脚本区的虚拟化显示
+    
+    文本框中只放当前可见的几十行，滚动条按总行数换算；新增一行只记录行号，
+    在界面空闲时重绘一次可见区域，开销与脚本长度无关。停在末尾时自动跟随新动作。
+    """
+    
+    def __init__(self, text: tk.Text, scrollbar: ttk.Scrollbar, log: ActionLog):
+        """
+        Args:
+            text: 显示用的文本框
+            scrollbar: 纵向滚动条
+            log: 动作记录
+        """
+        self.text = text
+        self.scrollbar = scrollbar
+        self.log = log
+        # 每行是动作序号 (int) 或备注文本 (str)
+        self.rows: List[Union[int, str]] = []
+        self.first = 0
+        self.follow = True
+        self._pending = False
+        
+        scrollbar.configure(command=self._on_scrollbar)
+        text.bind("<Configure>", lambda e: self.schedule())
+        text.bind("<MouseWheel>", self._on_wheel)
+        text.bind("<Button-4>", lambda e: self._scroll(-3))
+        text.bind("<Button-5>", lambda e: self._scroll(3))
+        log.on_append.append(self._on_append)
+        log.on_reset.append(self.reset)
+        self.rows.extend(range(len(log)))
+    
+    def add_note(self, note: str):
+        """添加备注 (坐标、颜色、生成的代码)，不属于动作"""
+        self.rows.extend(note.split("\n"))
+        self.schedule()
+    
+    def reset(self):
+        """清空显示"""
+        self.rows = []
+        self.first = 0
+        self.follow = True
+        self.schedule()
+    
+    def schedule(self):
+        """在界面空闲时重绘 (同一轮事件中多次变化只重绘一次)"""
+        if not self._pending:
+            self._pending = True
+            self.text.after_idle(self.refresh)
+    
+    def page_size(self) -> int:
+        """可见行数"""
+        line_height = int(self.text.tk.call("font", "metrics", self.text.cget("font"), "-linespace"))
+        return max(1, self.text.winfo_height() // max(1, line_height))
+    
+    def refresh(self):
+        """重绘可见区域"""
+        self._pending = False
+        total, page = len(self.rows), self.page_size()
+        if self.follow:
+            self.first = total - page
+        self.first = max(0, min(self.first, total - page))
+        lines = [self._row_text(row) for row in self.rows[self.first:self.first + page]]
+        # 文本框只读，只在重绘时临时打开；保留横向滚动位置
+        left = self.text.xview()[0]
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.configure(state=tk.DISABLED)
+        self.text.xview_moveto(left)
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + page) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _row_text(self, row: Union[int, str]) -> str:
+        if isinstance(row, str):
+            return row
+        return f"{row + 1}. {json.dumps(self.log[row], ensure_ascii=False)}"
+    
+    def _on_append(self, index: int, action: Dict):
+        self.rows.append(index)
+        self.schedule()
+    
+    def _scroll(self, delta: int):
+        page = self.page_size()
+        self.first = max(0, min(self.first + delta, len(self.rows) - page))
+        self.follow = self.first + page >= len(self.rows)
+        self.refresh()
+        return "break"
+    
+    def _on_wheel(self, event):
+        return self._scroll(-3 if event.delta > 0 else 3)
+    
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self._scroll(int(float(args[1]) * len(self.rows)) - self.first)
+        elif args[0] == "scroll":
+            step = self.page_size() if args[2] == "pages" else 1
+            self._scroll(int(args[1]) * step)
+
+
 class ScriptGenerator:
     """脚本生成器主界面"""
     
@@ -51,7 +283,7 @@ class ScriptGenerator:
         
         # 录制状态
         self.recording = False
-        self.recorded_actions: List[Dict] = []
+        self.recorded_actions = ActionLog()
         self.last_action_time = 0
         
         # 拾取模式
@@ -201,8 +433,15 @@ class ScriptGenerator:
         script_frame = ttk.LabelFrame(right_frame, text="脚本", padding=5)
         script_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.script_text = scrolledtext.ScrolledText(script_frame, height=15, font=('Consolas', 9))
+        script_scroll = ttk.Scrollbar(script_frame, orient=tk.VERTICAL)
+        script_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        script_xscroll = ttk.Scrollbar(script_frame, orient=tk.HORIZONTAL)
+        script_xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.script_text = tk.Text(script_frame, height=15, font=('Consolas', 9), wrap=tk.NONE,
+                                   state=tk.DISABLED, xscrollcommand=script_xscroll.set)
         self.script_text.pack(fill=tk.BOTH, expand=True)
+        script_xscroll.configure(command=self.script_text.xview)
+        self.script_view = ScriptView(self.script_text, script_scroll, self.recorded_actions)
         
         # 底部按钮
         bottom_frame = ttk.Frame(right_frame)
@@ -529,22 +768,13 @@ if pos:
                     'params': {'seconds': round(delay, 2)}
                 })
         
+        # 脚本区通过 ActionLog 的回调增量更新
         self.recorded_actions.append(action)
         self.last_action_time = now
-        
-        # 更新显示
-        self._update_script_display()
-    
-    def _update_script_display(self):
-        """更新脚本显示"""
-        self.script_text.delete(1.0, tk.END)
-        for i, action in enumerate(self.recorded_actions, 1):
-            self.script_text.insert(tk.END, f"{i}. {json.dumps(action, ensure_ascii=False)}\n")
     
     def _clear_recording(self):
         """清空录制"""
-        self.recorded_actions = []
-        self.script_text.delete(1.0, tk.END)
+        self.recorded_actions.clear()
         self.record_status.config(text="已清空", foreground='black')
     
     def _playback(self):
@@ -552,27 +782,8 @@ if pos:
         if not self.ec or not self.recorded_actions:
             return
         
-        def run_playback():
-            for action in self.recorded_actions:
-                if action['action'] == 'tap':
-                    self.ec.click(action['params']['x'], action['params']['y'])
-                elif action['action'] == 'longPress':
-                    self.ec.long_click(action['params']['x'], action['params']['y'], action['params'].get('duration', 1))
-                elif action['action'] == 'doubleTap':
-                    self.ec.double_click(action['params']['x'], action['params']['y'])
-                elif action['action'] == 'swipe':
-                    p = action['params']
-                    self.ec.swipe(p['fromX'], p['fromY'], p['toX'], p['toY'])
-                elif action['action'] == 'sleep':
-                    time.sleep(action['params']['seconds'])
-                elif action['action'] == 'home':
-                    self.ec.home()
-                elif action['action'] == 'swipe_up':
-                    self.ec.swipe_up()
-                elif action['action'] == 'swipe_down':
-                    self.ec.swipe_down()
-        
-        threading.Thread(target=run_playback, daemon=True).start()
+        actions = list(self.recorded_actions)
+        threading.Thread(target=play_actions, args=(self.ec, actions), daemon=True).start()
     
     def _add_action(self):
         """手动添加动作"""
@@ -591,37 +802,40 @@ if pos:
             action['params'] = {'seconds': float(x) if x else 1.0}
         
         self.recorded_actions.append(action)
-        self._update_script_display()
     
     def _add_to_script(self, text: str):
         """添加文本到脚本"""
-        self.script_text.insert(tk.END, text + "\n")
+        self.script_view.add_note(text)
     
     def _save_script(self):
         """保存脚本"""
         filename = filedialog.asksaveasfilename(
             defaultextension=".json",
-            filetypes=[("JSON", "*.json"), ("Python", "*.py")],
+            filetypes=[("JSON", "*.json"), ("JSON Lines (录制时实时写入)", "*.jsonl"), ("Python", "*.py")],
             initialfile="script.json"
         )
         if filename:
             if filename.endswith('.py'):
                 with open(filename, 'w', encoding='utf-8') as f:
                     f.write(self._generate_python_code())
+            elif filename.endswith('.jsonl'):
+                self.recorded_actions.stream_to(filename)
+                messagebox.showinfo("保存成功", f"脚本已保存到:\n{filename}\n之后录制的动作会实时写入该文件")
+                return
             else:
                 with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(self.recorded_actions, f, indent=2, ensure_ascii=False)
+                    json.dump(self.recorded_actions.snapshot(), f, indent=2, ensure_ascii=False)
             messagebox.showinfo("保存成功", f"脚本已保存到:\n{filename}")
     
     def _load_script(self):
         """加载脚本"""
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON", "*.json"), ("所有文件", "*.*")]
+            filetypes=[("JSON", "*.json"), ("JSON Lines", "*.jsonl"), ("所有文件", "*.*")]
         )
         if filename:
-            with open(filename, 'r', encoding='utf-8') as f:
-                self.recorded_actions = json.load(f)
-            self._update_script_display()
+            actions = read_actions(filename)
+            self.recorded_actions.clear()
+            self.recorded_actions.extend(actions)
     
     def _generate_python(self):
         """生成 Python 代码"""
@@ -689,7 +903,7 @@ if pos:
     
     def _generate_json(self):
         """生成 JSON 脚本"""
-        json_str = json.dumps(self.recorded_actions, indent=2, ensure_ascii=False)
+        json_str = json.dumps(self.recorded_actions.snapshot(), indent=2, ensure_ascii=False)
         
         # 显示在新窗口
         win = tk.Toplevel(self.root)
@@ -705,12 +919,13 @@ if pos:
         if not self.ec or not self.recorded_actions:
             return
         
-        result = self.ec.execute_script(self.recorded_actions)
+        result = self.ec.execute_script(self.recorded_actions.snapshot())
         messagebox.showinfo("发送成功", f"脚本已发送到设备\n{json.dumps(result, ensure_ascii=False)}")
     
     def _on_close(self):
         """关闭窗口"""
         self.running = False
+        self.recorded_actions.stop_stream()
         self.root.destroy()
 
 
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+脚本空跑 (dry-run)
+用录制好的帧序列 (图片目录或视频) 代替手机运行脚本：截图类查询从当前帧回答，
+点击、滑动等输入操作不做任何事，只切换到下一帧。没有网络和真实等待，
+几千帧的脚本逻辑几秒内就能跑完。
+
+用法:
+    from simulate import SimulatedECWDA
+
+    ec = SimulatedECWDA("frames/")            # 或 "record.mp4" (需要 opencv-python)
+    report = ec.run(my_script, ec)
+    print(report["frames"], report["fps"])
+    for action in ec.actions:
+        print(action["frame"], action["path"], action["body"])
+"""
+
+import base64
+import io
+import math
+import os
+import time
+from typing import Optional, Dict, List, Tuple, Any, Callable
+
+from PIL import Image
+
+from ecwda import ECWDA, color_mask
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+# 会切换到下一帧的输入类接口 (会话 ID 已去掉)
+INPUT_ROUTES = (
+    "/wda/tap/0", "/wda/touchAndHold", "/wda/doubleTap",
+    "/wda/dragFromToForDuration", "/wda/dragfromtoforduration",
+    "/wda/homescreen", "/wda/inputText", "/wda/openUrl",
+    "/wda/apps/launch", "/wda/apps/terminate", "/wda/node/click",
+)
+
+
+class SimulationFinished(BaseException):
+    """
+    帧序列已用完
+
+    继承 BaseException，不会被 SDK 方法内部的 except Exception 吞掉，
+    由 SimulatedECWDA.run 捕获并结束脚本。
+    """
+
+
+class FrameSequence:
+    """按顺序读取的帧来源: 图片目录、图片列表或视频文件"""
+
+    def __init__(self, source, step: int = 1):
+        """
+        Args:
+            source: 图片目录、视频文件路径或图片路径列表
+            step: 每次前进跳过的帧数 (视频帧率高于脚本节奏时使用)
+        """
+        self.step = max(1, int(step))
+        self.index = 0
+        self._video = None
+        self._ended = False
+        self._current: Optional[str] = None
+
+        if isinstance(source, (list, tuple)):
+            self._files = list(source)
+        elif os.path.isdir(source):
+            self._files = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                           if name.lower().endswith(IMAGE_EXTENSIONS)]
+        elif source.lower().endswith(IMAGE_EXTENSIONS):
+            self._files = [source]
+        else:
+            self._files = None
+            self._video = self._open_video(source)
+        if self._files is not None and not self._files:
+            raise ValueError(f"没有找到帧图片: {source}")
+
+    @staticmethod
+    def _open_video(path: str):
+        try:
+            import cv2
+        except ImportError:
+            raise ImportError("读取视频需要 opencv-python: pip install opencv-python")
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"无法打开视频: {path}")
+        return capture
+
+    def __len__(self) -> int:
+        if self._files is not None:
+            return len(self._files)
+        import cv2
+        return int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    @property
+    def finished(self) -> bool:
+        if self._files is None:
+            return self._ended
+        return self.index >= len(self._files)
+
+    def current(self) -> Optional[str]:
+        """当前帧的 base64，帧已用完返回 None"""
+        if self._current is None:
+            self._current = self._load()
+        return self._current
+
+    def advance(self):
+        """前进到下一帧"""
+        if self._video is not None:
+            for _ in range(self.step - 1):
+                self._video.grab()
+        self.index += self.step
+        self._current = None
+
+    def _load(self) -> Optional[str]:
+        if self._files is not None:
+            if self.index >= len(self._files):
+                return None
+            with open(self._files[self.index], "rb") as f:
+                return base64.b64encode(f.read()).decode("ascii")
+
+        if self._ended:
+            return None
+        ok, bgr = self._video.read()
+        if not ok:
+            self._ended = True
+            return None
+        # BMP 编码几乎不耗 CPU，PIL 解码结果与 PNG 相同
+        buf = io.BytesIO()
+        Image.fromarray(bgr[:, :, ::-1]).save(buf, "BMP")
+        return base64.b64encode(buf.getvalue()).decode("ascii")
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+
+
+class _SimResponse:
+    """_request 的返回值，只实现 SDK 用到的部分"""
+
+    def __init__(self, value: Any, status_code: int = 200, session_id: Optional[str] = None):
+        self.status_code = status_code
+        self._payload = {"value": value, "sessionId": session_id}
+
+    def json(self) -> Dict:
+        return self._payload
+
+    @property
+    def content(self) -> bytes:
+        return b""
+
+
+class SimulatedECWDA(ECWDA):
+    """
+    帧序列驱动的 ECWDA
+
+    - 截图、找色、多点找色、比色、区域统计等从当前帧计算
+    - find_color_native / get_pixel_native / find_image 在电脑端实现
+    - 点击、滑动、输入文本、启动应用等只记录到 actions 并切换到下一帧
+    - sleep 和 wait_color 不真实等待，每次等待前进一帧
+    - OCR / YOLO / 节点查询返回 ocr_results / detections / nodes (默认为空)
+    """
+
+    def __init__(self, source, scale: float = 3.0, screen_size: Optional[Tuple[int, int]] = None,
+                 step: int = 1, advance_on_screenshot: bool = False):
+        """
+        Args:
+            source: 图片目录、视频文件路径或图片路径列表
+            scale: 截图像素 / 屏幕点，iPhone 14 等为 3，iPhone SE 等为 2
+            screen_size: 屏幕大小 (点)，不传按第一帧尺寸 / scale 计算
+            step: 每次前进跳过的帧数
+            advance_on_screenshot: 每次截图后也前进一帧 (用于没有输入、只看画面的脚本)
+        """
+        super().__init__("http://simulated", cache_profile=False)
+        self.metrics = None
+        self.adaptive_timeouts = False
+        self.session_id = "simulated"
+        self.routing = "local"
+        self.frames = FrameSequence(source, step)
+        self.scale = scale
+        self.advance_on_screenshot = advance_on_screenshot
+        self.actions: List[Dict[str, Any]] = []
+        self.screenshots = 0
+        self.ocr_results: List[Dict] = []
+        self.detections: List[Dict] = []
+        self.nodes: List[Dict] = []
+        self._pixels = None
+        self._routes = self._build_routes()
+
+        if screen_size is None:
+            first = self.frames.current()
+            if first is None:
+                raise ValueError("帧序列为空")
+            with Image.open(io.BytesIO(base64.b64decode(first))) as img:
+                screen_size = (round(img.width / scale), round(img.height / scale))
+        self.screen_width, self.screen_height = screen_size
+
+    @property
+    def frame_index(self) -> int:
+        """当前帧序号"""
+        return self.frames.index
+
+    # ========== 运行 ==========
+
+    def run(self, script: Callable[..., Any], *args, **kwargs) -> Dict[str, Any]:
+        """
+        运行脚本直到结束或帧序列用完
+
+        Args:
+            script: 脚本函数
+            *args, **kwargs: 传给脚本的参数
+
+        Returns:
+            dict: {"frames", "screenshots", "inputs", "seconds", "fps", "finished", "result"}，
+                  finished 表示因帧用完而结束
+        """
+        start_frame = self.frames.index
+        start = time.perf_counter()
+        result, finished = None, False
+        try:
+            result = script(*args, **kwargs)
+        except SimulationFinished:
+            finished = True
+        seconds = time.perf_counter() - start
+        frames = self.frames.index - start_frame
+        return {
+            "frames": frames,
+            "screenshots": self.screenshots,
+            "inputs": len(self.actions),
+            "seconds": seconds,
+            "fps": frames / seconds if seconds > 0 else 0.0,
+            "finished": finished,
+            "result": result,
+        }
+
+    def _advance(self):
+        self._last_frame = None
+        self.frames.advance()
+
+    def _current(self) -> str:
+        img_base64 = self.frames.current()
+        if img_base64 is None:
+            raise SimulationFinished()
+        return img_base64
+
+    # ========== 传输层 ==========
+
+    def _request(self, method: str, path: str, json: Any = None, **kwargs) -> _SimResponse:
+        """按路由在本地回答请求，不访问网络"""
+        body = json or {}
+        route = path
+        if path.startswith("/session/"):
+            _, _, tail = path[len("/session/"):].partition("/")
+            route = "/" + tail if tail else "/session"
+
+        if method == "POST" and route in INPUT_ROUTES:
+            self._current()
+            self.actions.append({"frame": self.frames.index, "method": method,
+                                 "path": route, "body": body})
+            self._advance()
+            value = {"success": True} if route == "/wda/node/click" else None
+            return _SimResponse(value, session_id=self.session_id)
+
+        if route == "/screenshot":
+            value = self._current()
+            self.screenshots += 1
+            if self.advance_on_screenshot:
+                self._advance()
+            return _SimResponse(value, session_id=self.session_id)
+
+        handler = self._routes.get((method, route))
+        if handler is None:
+            return _SimResponse({"error": "unknown command",
+                                 "message": f"模拟器不支持: {method} {path}"}, 404)
+        return _SimResponse(handler(body), session_id=self.session_id)
+
+    def _build_routes(self) -> Dict[Tuple[str, str], Callable[[Dict], Any]]:
+        return {
+            ("GET", "/status"): lambda b: {"ready": True, "message": "simulated"},
+            ("POST", "/session"): lambda b: {"sessionId": self.session_id},
+            ("GET", "/window/size"): lambda b: {"width": self.screen_width,
+                                                "height": self.screen_height},
+            ("GET", "/wda/ecwda/info"): lambda b: {"version": "simulated", "name": "ECWDA",
+                                                   "features": ["findColor", "pixel"]},
+            ("POST", "/wda/pixel"): self._pixel,
+            ("POST", "/wda/findColor"): self._find_color,
+            ("POST", "/wda/findImage"): self._find_image,
+            ("POST", "/wda/ocr/recognize"): lambda b: {"results": list(self.ocr_results)},
+            ("POST", "/wda/yolo/detect"): lambda b: {"detections": list(self.detections)},
+            ("POST", "/wda/qrcode/decode"): lambda b: {"codes": []},
+            ("GET", "/wda/node/all"): lambda b: {"nodes": list(self.nodes)},
+            ("POST", "/wda/node/findByText"): lambda b: {"nodes": [
+                n for n in self.nodes if str(b.get("text", "")) in str(n.get("label") or "")]},
+            ("POST", "/wda/node/findByType"): lambda b: {"nodes": [
+                n for n in self.nodes if n.get("type") == b.get("type")]},
+            ("GET", "/wda/app/current"): lambda b: {"bundleId": "simulated"},
+        }
+
+    def _pixel(self, body: Dict) -> Dict:
+        color = self.get_pixel_color(int(body.get("x", 0)), int(body.get("y", 0)))
+        if not color:
+            return {}
+        value = int(color[1:], 16)
+        return {"color": color, "value": value,
+                "r": value >> 16, "g": (value >> 8) & 0xFF, "b": value & 0xFF}
+
+    def _find_color(self, body: Dict) -> Dict:
+        pos = self.find_color(body.get("color", "#000000"), body.get("region"),
+                              int(body.get("tolerance", 10)))
+        if not pos:
+            return {"found": False, "x": -1, "y": -1}
+        return {"found": True, "x": pos["x"], "y": pos["y"]}
+
+    def _find_image(self, body: Dict) -> Dict:
+        """模板匹配 (灰度平均绝对差)，坐标单位为点"""
+        not_found = {"found": False, "x": -1, "y": -1}
+        frame = self._frame_bands()
+        if frame is None:
+            return not_found
+        img = frame[0]
+        template = Image.open(io.BytesIO(base64.b64decode(body["template"])))
+        s = img.width / self.screen_width
+        box = (0, 0, img.width, img.height)
+        region = body.get("region")
+        if region:
+            box = (max(0, int(region["x"] * s)), max(0, int(region["y"] * s)),
+                   min(img.width, int((region["x"] + region["width"]) * s)),
+                   min(img.height, int((region["y"] + region["height"]) * s)))
+        found = match_template(img.crop(box), template)
+        if found is None or found[0] < float(body.get("threshold", 0.9)):
+            return not_found
+        score, x, y = found
+        return {"found": True, "score": score,
+                "x": round((box[0] + x) / s), "y": round((box[1] + y) / s),
+                "width": round(template.width / s), "height": round(template.height / s)}
+
+    # ========== 图色 (快速版) ==========
+    #
+    # SDK 的找色逐像素调用 getpixel，一帧要 1 秒以上；空跑时按通道查表 (PIL point)，
+    # 结果与逐像素版本相同 (按行优先返回第一个匹配点，坐标单位为像素)
+
+    def _frame_bands(self) -> Optional[Tuple[Image.Image, Tuple[Image.Image, ...]]]:
+        """当前帧的 RGB 图和 R/G/B 通道，同一帧只解码一次；与真机一样每次查询都截图"""
+        index = self.frames.index
+        img_base64 = self.screenshot()
+        if not img_base64:
+            return None
+        if self._pixels is None or self._pixels[0] != index:
+            img = Image.open(io.BytesIO(base64.b64decode(img_base64))).convert("RGB")
+            self._pixels = (index, img, img.split())
+        return self._pixels[1], self._pixels[2]
+
+    def get_pixel_color(self, x: int, y: int) -> Optional[str]:
+        frame = self._frame_bands()
+        if frame is None:
+            return None
+        img = frame[0]
+        if not (0 <= x < img.width and 0 <= y < img.height):
+            return None
+        r, g, b = img.getpixel((x, y))
+        return f"#{r:02X}{g:02X}{b:02X}"
+
+    def find_color(self, color: str, region: Optional[Dict] = None,
+                   tolerance: int = 10) -> Optional[Dict[str, int]]:
+        return self.find_multi_color(color, [], region, tolerance)
+
+    def find_multi_color(self, first_color: str, offset_colors: List[Dict],
+                         region: Optional[Dict] = None,
+                         tolerance: int = 10) -> Optional[Dict[str, int]]:
+        frame = self._frame_bands()
+        target = self._parse_color(first_color)
+        if frame is None or not target:
+            return None
+        img, bands = frame
+        width, height = img.size
+        if region:
+            x0, y0 = max(0, region.get("x", 0)), max(0, region.get("y", 0))
+            x1 = min(width, region.get("x", 0) + region.get("width", width))
+            y1 = min(height, region.get("y", 0) + region.get("height", height))
+        else:
+            x0, y0, x1, y1 = 0, 0, width, height
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        mask = color_mask(bands, target, tolerance, box=(x0, y0, x1, y1))
+        bbox = mask.getbbox()
+        if not bbox:
+            return None
+        offsets = [(oc["offset"], self._parse_color(oc["color"])) for oc in offset_colors]
+        offsets = [(offset, c) for offset, c in offsets if c]
+        if not offsets:
+            row = mask.crop((0, bbox[1], mask.width, bbox[1] + 1)).tobytes()
+            return {"x": x0 + row.find(b"\xff"), "y": y0 + bbox[1]}
+
+        import numpy as np
+
+        # 只需检查首色出现过的行
+        y0, y1 = y0 + bbox[1], y0 + bbox[3]
+        matched = np.asarray(mask)[bbox[1]:bbox[3]] > 0
+        for (ox, oy), c in offsets:
+            # 偏移点超出屏幕的位置视为不匹配
+            shifted = np.zeros_like(matched)
+            sx0, sy0 = max(x0, -ox), max(y0, -oy)
+            sx1, sy1 = min(x1, width - ox), min(y1, height - oy)
+            if sx1 > sx0 and sy1 > sy0:
+                box = (sx0 + ox, sy0 + oy, sx1 + ox, sy1 + oy)
+                shifted[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = \
+                    np.asarray(color_mask(bands, c, tolerance, box=box)) > 0
+            matched &= shifted
+
+        index = int(np.argmax(matched))
+        if not matched.flat[index]:
+            return None
+        y, x = divmod(index, matched.shape[1])
+        return {"x": x0 + x, "y": y0 + y}
+
+    # ========== 等待 ==========
+
+    def sleep(self, seconds: float):
+        """不真实等待，前进一帧"""
+        self._current()
+        self._advance()
+
+    def wait_color(self, color: str, region: Optional[Dict] = None,
+                   timeout: float = 10, interval: float = 0.5) -> Optional[Dict[str, int]]:
+        """每次检查之间前进一帧，最多检查 timeout / interval 次"""
+        for _ in range(max(1, math.ceil(timeout / interval))):
+            pos = self.find_color(color, region)
+            if pos:
+                return pos
+            self.sleep(interval)
+        return None
+
+
+def match_template(image: Image.Image, template: Image.Image) -> Optional[Tuple[float, int, int]]:
+    """
+    在图片中查找模板 (先缩小粗搜，再在原尺寸附近精搜)
+
+    Args:
+        image: 被搜索的图片
+        template: 模板
+
+    Returns:
+        tuple: (相似度 0-1, x, y)，模板比图片大时返回 None
+    """
+    import numpy as np
+
+    scene = np.asarray(image.convert("L"), dtype=np.float32)
+    tmpl = np.asarray(template.convert("L"), dtype=np.float32)
+    th, tw = tmpl.shape
+    if th > scene.shape[0] or tw > scene.shape[1]:
+        return None
+
+    def sad_map(scene_part, tmpl_part):
+        """每个位置的平均绝对差；按位置数和模板像素数中较少的一方循环"""
+        th, tw = tmpl_part.shape
+        h = scene_part.shape[0] - th + 1
+        w = scene_part.shape[1] - tw + 1
+        total = np.zeros((h, w), dtype=np.float32)
+        if h * w < th * tw:
+            for y in range(h):
+                for x in range(w):
+                    total[y, x] = np.abs(scene_part[y:y + th, x:x + tw] - tmpl_part).sum()
+        else:
+            for dy in range(th):
+                for dx in range(tw):
+                    total += np.abs(scene_part[dy:dy + h, dx:dx + w] - tmpl_part[dy, dx])
+        return total / tmpl_part.size
+
+    # 粗搜: 模板缩到约 8 像素，取最好的几个位置到原尺寸精搜
+    f = max(1, min(th, tw) // 8)
+    coarse = sad_map(scene[::f, ::f], tmpl[::f, ::f])
+    candidates = np.argsort(coarse, axis=None)[:5]
+
+    best = None
+    for index in candidates:
+        cy, cx = np.unravel_index(index, coarse.shape)
+        x0, y0 = max(0, cx * f - f), max(0, cy * f - f)
+        x1 = min(scene.shape[1], cx * f + f + tw)
+        y1 = min(scene.shape[0], cy * f + f + th)
+        fine = sad_map(scene[y0:y1, x0:x1], tmpl)
+        fy, fx = np.unravel_index(np.argmin(fine), fine.shape)
+        score = 1.0 - float(fine[fy, fx]) / 255.0
+        if best is None or score > best[0]:
+            best = (score, int(x0 + fx), int(y0 + fy))
+    return best
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+ECWDA 并发压力测试
+多个线程同时使用同一个客户端 (会话创建、截图、输入)，对本地 MockWDA 运行，不需要真机
+
+用法:
+    python -m pytest -q test_thread_safety.py
+"""
+
+import threading
+
+from ecwda import ECWDA, DeviceGeometry
+from mock_wda import MockWDA
+
+
+THREADS = 32
+ROUNDS = 5
+
+# MockWDA 的屏幕尺寸与客户端默认尺寸不同，读到其它组合即为撕裂
+DEVICE_SIZE = (400, 900)
+
+
+def _worker(ec: ECWDA, index: int, barrier: threading.Barrier, errors: list):
+    try:
+        barrier.wait()
+        for n in range(ROUNDS):
+            ec._ensure_session()
+            kind = (index + n) % 3
+            if kind == 0:
+                ec.get_frame(max_age=0)
+            elif kind == 1:
+                ec.click(10 + index, 20 + n)
+            else:
+                ec.swipe(10, 100, 10, 50 + index, 0.05)
+    except Exception as e:
+        errors.append(e)
+
+
+def _watch_geometry(ec: ECWDA, stop: threading.Event, seen: set):
+    while not stop.is_set():
+        seen.add(tuple(ec.geometry))
+
+
+def test_shared_client_under_concurrency():
+    with MockWDA(screen_size=DEVICE_SIZE, latency=0.01) as mock:
+        ec = ECWDA(mock.url, cache_profile=False)
+        initial = tuple(ec.geometry)
+        barrier = threading.Barrier(THREADS)
+        errors, seen = [], set()
+        stop = threading.Event()
+
+        watcher = threading.Thread(target=_watch_geometry, args=(ec, stop, seen))
+        watcher.start()
+        threads = [threading.Thread(target=_worker, args=(ec, i, barrier, errors))
+                   for i in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=60)
+        stop.set()
+        watcher.join()
+
+        assert not errors, errors
+        assert not any(t.is_alive() for t in threads)
+        assert mock.count("/session", "POST") == 1
+        assert len(mock.sessions) == 1 and ec.session_id == mock.sessions[0]
+        assert seen <= {initial, DEVICE_SIZE}, seen
+        assert ec.geometry == DeviceGeometry(*DEVICE_SIZE)
+
+
+def test_dimension_setters_do_not_lose_updates():
+    ec = ECWDA("http://127.0.0.1:1", cache_profile=False)
+    barrier = threading.Barrier(2)
+
+    def set_width():
+        barrier.wait()
+        for _ in range(2000):
+            ec.screen_width = 400
+
+    def set_height():
+        barrier.wait()
+        for _ in range(2000):
+            ec.screen_height = 900
+
+    threads = [threading.Thread(target=set_width), threading.Thread(target=set_height)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ec.geometry == DeviceGeometry(400, 900)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+ECWDA 分层耗时追踪
+记录 SDK 公共方法及其内部阶段 (HTTP 请求、base64 解码、PNG 解码、像素搜索等) 的嵌套耗时，
+导出为 JSONL 或 Chrome trace-event 格式 (chrome://tracing / Perfetto 打开)
+
+未开启时每次调用只多一次属性判断，可以常驻在代码里。
+
+用法:
+    from tracing import TRACER
+    TRACER.enable()
+    ec.find_multi_color("#FF0000", [{"offset": [10, 0], "color": "#00FF00"}])
+    TRACER.export_chrome("trace.json")
+    print(TRACER.summary())
+"""
+
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, List, Any, Callable
+
+
+class _NoopSpan:
+    """未开启追踪时使用的空 span"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """一段计时，可嵌套"""
+
+    __slots__ = ("tracer", "name", "attrs", "id", "parent", "depth", "thread",
+                 "start", "duration")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = 0
+        self.parent: Optional[int] = None
+        self.depth = 0
+        self.thread = 0
+        self.start = 0.0
+        self.duration = 0.0
+
+    def set(self, **attrs):
+        """附加属性 (如状态码、结果数量)"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1].id
+            self.depth = len(stack)
+        self.id = next(self.tracer._ids)
+        self.thread = threading.get_ident()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._spans.append(self)
+        return False
+
+
+class Tracer:
+    """耗时追踪器"""
+
+    def __init__(self, max_spans: int = 200000):
+        """
+        Args:
+            max_spans: 最多保留的 span 数量，超出后丢弃最早的
+        """
+        self.enabled = False
+        self._spans: deque = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._epoch = time.perf_counter()
+        self._epoch_wall = time.time()
+
+    def enable(self, clear: bool = True):
+        """开始记录"""
+        if clear:
+            self.clear()
+        self.enabled = True
+
+    def disable(self):
+        """停止记录 (已记录的 span 保留)"""
+        self.enabled = False
+
+    def clear(self):
+        self._spans.clear()
+        self._epoch = time.perf_counter()
+        self._epoch_wall = time.time()
+
+    def span(self, name: str, **attrs):
+        """
+        创建计时段，用于 with 语句；未开启时返回空 span
+
+        示例:
+            with TRACER.span("decode.png", size=len(data)):
+                img = Image.open(...)
+        """
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    # ========== 导出 ==========
+
+    def spans(self) -> List[Dict[str, Any]]:
+        """
+        已完成的 span，按开始时间排序
+
+        Returns:
+            list: [{"id", "parent", "name", "depth", "thread", "start", "duration", "attrs"}]，
+                  start 为相对开启时刻的秒数
+        """
+        result = [{
+            "id": s.id,
+            "parent": s.parent,
+            "name": s.name,
+            "depth": s.depth,
+            "thread": s.thread,
+            "start": s.start - self._epoch,
+            "duration": s.duration,
+            "attrs": s.attrs,
+        } for s in list(self._spans)]
+        result.sort(key=lambda s: s["start"])
+        return result
+
+    def export_jsonl(self, path: str) -> int:
+        """
+        导出为 JSONL，每行一个 span，附带 wall_time (Unix 时间戳)
+
+        Returns:
+            int: 写入的 span 数量
+        """
+        spans = self.spans()
+        with open(path, "w", encoding="utf-8") as f:
+            for s in spans:
+                s["wall_time"] = self._epoch_wall + s["start"]
+                f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    def export_chrome(self, path: str) -> int:
+        """
+        导出为 Chrome trace-event 格式 (complete 事件，时间单位微秒)
+
+        Returns:
+            int: 写入的 span 数量
+        """
+        pid = os.getpid()
+        events = [{
+            "name": s["name"],
+            "ph": "X",
+            "ts": s["start"] * 1e6,
+            "dur": s["duration"] * 1e6,
+            "pid": pid,
+            "tid": s["thread"],
+            "args": s["attrs"],
+        } for s in self.spans()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f,
+                      ensure_ascii=False, default=str)
+        return len(events)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        按名称汇总
+
+        Returns:
+            dict: {名称: {"count", "total", "self", "max"}}，self 为扣除子 span 后的耗时，
+                  按 total 降序
+        """
+        spans = list(self._spans)
+        child_time: Dict[int, float] = {}
+        for s in spans:
+            if s.parent is not None:
+                child_time[s.parent] = child_time.get(s.parent, 0.0) + s.duration
+        result: Dict[str, Dict[str, float]] = {}
+        for s in spans:
+            entry = result.setdefault(s.name, {"count": 0, "total": 0.0, "self": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += s.duration
+            entry["self"] += max(0.0, s.duration - child_time.get(s.id, 0.0))
+            entry["max"] = max(entry["max"], s.duration)
+        return dict(sorted(result.items(), key=lambda kv: kv[1]["total"], reverse=True))
+
+
+TRACER = Tracer()
+
+
+def span(name: str, **attrs):
+    """TRACER.span 的简写"""
+    if not TRACER.enabled:
+        return _NOOP
+    return Span(TRACER, name, attrs)
+
+
+def traced(fn: Callable, name: Optional[str] = None) -> Callable:
+    """把函数整体包在一个 span 里"""
+    label = name or fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not TRACER.enabled:
+            return fn(*args, **kwargs)
+        with Span(TRACER, label, {}):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def trace_methods(cls: type) -> type:
+    """为类的所有公共方法加上 span (属性和静态方法除外)"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, traced(value, f"{cls.__name__}.{attr}"))
+    return cls
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+WDA 请求录制与回放
+录制 ECWDA 发出的每个请求和响应 (包括截图)，离线按原速或最快速度回放，
+用来复现长脚本中的问题并单独分析 SDK 的耗时
+
+目录结构:
+    traffic/
+        log.jsonl        每行一次请求: 方法、路径、请求体、状态码、响应体、耗时
+        blobs/<sha1>     截图等大块 base64 数据的原始字节，按内容寻址去重
+
+用法:
+    ec.record_traffic("traffic/")       # 录制
+    run_script(ec)
+    ec.stop_recording()
+
+    ec = ECWDA()
+    ec.replay_traffic("traffic/", speed="max")   # 回放，不访问网络
+    run_script(ec)
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional, Dict, List, Tuple, Any, Callable, Union
+
+import requests
+
+
+# 超过该长度的 base64 字符串单独存为 blob
+BLOB_MIN_LENGTH = 1024
+
+_ERRORS = {
+    "ConnectTimeout": requests.ConnectTimeout,
+    "ReadTimeout": requests.ReadTimeout,
+    "Timeout": requests.Timeout,
+    "ConnectionError": requests.ConnectionError,
+}
+
+
+def _endpoint_key(method: str, path: str, body: Any) -> Tuple[str, str, str]:
+    """回放匹配键: 方法 + 去掉会话 ID 的路径 + 请求体"""
+    if path.startswith("/session/"):
+        _, _, tail = path[len("/session/"):].partition("/")
+        path = "/session/{id}/" + tail if tail else "/session/{id}"
+    return (method, path, json.dumps(body, sort_keys=True, ensure_ascii=False))
+
+
+class BlobStore:
+    """按内容寻址的二进制存储"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._encoded: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha1(data).hexdigest()
+        path = os.path.join(self.root, digest)
+        if not os.path.exists(path):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get_base64(self, digest: str) -> str:
+        """读取 blob 并编码为 base64 (结果缓存，回放时同一帧只编码一次)"""
+        with self._lock:
+            cached = self._encoded.get(digest)
+        if cached is None:
+            with open(os.path.join(self.root, digest), "rb") as f:
+                cached = base64.b64encode(f.read()).decode("ascii")
+            with self._lock:
+                self._encoded[digest] = cached
+        return cached
+
+
+def _pack(value: Any, blobs: BlobStore) -> Any:
+    """把大块 base64 字符串替换为 {"$blob": sha1}"""
+    if isinstance(value, str) and len(value) >= BLOB_MIN_LENGTH:
+        try:
+            data = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            return value
+        if base64.b64encode(data).decode("ascii") != value:
+            return value  # 非标准编码 (如带换行)，原样保存
+        return {"$blob": blobs.put(data)}
+    if isinstance(value, dict):
+        return {k: _pack(v, blobs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_pack(v, blobs) for v in value]
+    return value
+
+
+def _unpack(value: Any, blobs: BlobStore) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 1 and "$blob" in value:
+            return blobs.get_base64(value["$blob"])
+        return {k: _unpack(v, blobs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unpack(v, blobs) for v in value]
+    return value
+
+
+class TrafficRecorder:
+    """
+    录制器: 包装真实的发送函数，记录每次请求和响应
+
+    线程安全，多个线程的请求按完成顺序写入。
+    """
+
+    def __init__(self, path: str, send: Callable[..., requests.Response], append: bool = False):
+        """
+        Args:
+            path: 录制目录
+            send: 真实的发送函数，签名同 requests.request
+            append: 追加到已有录制，默认覆盖 log.jsonl (blob 保留复用)
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.count = 0
+        self._send = send
+        self._blobs = BlobStore(os.path.join(path, "blobs"))
+        self._file = open(os.path.join(path, "log.jsonl"), "a" if append else "w",
+                          encoding="utf-8")
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self, method: str, url: str, json: Any = None, timeout: Optional[float] = None,
+                 **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            resp = self._send(method, url, json=json, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._write(method, url, json, start, error=type(e).__name__)
+            raise
+        self._write(method, url, json, start, resp=resp)
+        return resp
+
+    def _write(self, method: str, url: str, body: Any, start: float,
+               resp: Optional[requests.Response] = None, error: Optional[str] = None):
+        duration = time.perf_counter() - start
+        path = "/" + url.split("://", 1)[-1].split("/", 1)[-1] if "://" in url else url
+        entry: Dict[str, Any] = {
+            "t": round(time.time() - self._start - duration, 6),
+            "method": method,
+            "path": path.split("?")[0],
+            "request": _pack(body, self._blobs),
+            "duration": round(duration, 6),
+        }
+        if error:
+            entry["error"] = error
+        else:
+            entry["status"] = resp.status_code
+            try:
+                entry["response"] = _pack(resp.json(), self._blobs)
+            except ValueError:
+                entry["text"] = resp.text
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self.count += 1
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class TrafficReplayer:
+    """
+    回放器: 按录制内容响应请求，不访问网络
+
+    每个 (方法, 接口, 请求体) 按录制顺序依次返回对应的响应；
+    录制中的请求用完后重复返回最后一个。录制中没有的请求抛出 KeyError
+    (strict=False 时返回 404)。
+    """
+
+    def __init__(self, path: str, speed: Union[str, float] = "max", strict: bool = True):
+        """
+        Args:
+            path: 录制目录
+            speed: "max" 不等待；"original" 按录制时的耗时等待；数字表示相对原速的倍数
+            strict: 遇到未录制的请求时是否抛出异常
+        """
+        self.path = path
+        self.speed = speed
+        self.strict = strict
+        self.served = 0
+        self.missed = 0
+        self._blobs = BlobStore(os.path.join(path, "blobs"))
+        self._queues: Dict[Tuple[str, str, str], deque] = defaultdict(deque)
+        self._last: Dict[Tuple[str, str, str], Dict] = {}
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self) -> List[Dict]:
+        entries = []
+        with open(os.path.join(self.path, "log.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                entries.append(entry)
+                key = _endpoint_key(entry["method"], entry["path"], entry.get("request"))
+                self._queues[key].append(entry)
+        return entries
+
+    def _next(self, key: Tuple[str, str, str]) -> Optional[Dict]:
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+                return entry
+            return self._last.get(key)
+
+    def __call__(self, method: str, url: str, json: Any = None, timeout: Optional[float] = None,
+                 **kwargs) -> requests.Response:
+        path = "/" + url.split("://", 1)[-1].split("/", 1)[-1] if "://" in url else url
+        path = path.split("?")[0]
+        body = _pack(json, self._blobs) if json is not None else None
+        entry = self._next(_endpoint_key(method, path, body))
+        if entry is None:
+            self.missed += 1
+            if self.strict:
+                raise KeyError(f"录制中没有该请求: {method} {path}")
+            return self._response(method, url, json, 404, {"value": {"error": "not recorded"}})
+
+        self.served += 1
+        if self.speed != "max":
+            factor = 1.0 if self.speed == "original" else float(self.speed)
+            time.sleep(entry.get("duration", 0.0) / factor)
+        if "error" in entry:
+            raise _ERRORS.get(entry["error"], requests.ConnectionError)(f"回放: {entry['error']}")
+        if "response" in entry:
+            return self._response(method, url, json, entry["status"],
+                                  _unpack(entry["response"], self._blobs))
+        return self._response(method, url, json, entry["status"], None, entry.get("text", ""))
+
+    @staticmethod
+    def _response(method: str, url: str, body: Any, status: int, payload: Any,
+                  text: Optional[str] = None) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = status
+        resp.url = url
+        resp.request = requests.Request(method, url, json=body).prepare()
+        if text is None:
+            resp._content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            resp.headers["Content-Type"] = "application/json; charset=utf-8"
+        else:
+            resp._content = text.encode("utf-8")
+        # 响应体已在内存中，流式读取 (iter_content) 直接切分 _content
+        resp._content_consumed = True
+        resp.encoding = "utf-8"
+        return resp
+
+    def stats(self) -> Dict[str, int]:
+        """已回放 / 未命中 / 剩余未使用的录制请求数"""
+        with self._lock:
+            remaining = sum(len(q) for q in self._queues.values())
+        return {"served": self.served, "missed": self.missed, "remaining": remaining}
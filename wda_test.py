@@ -21,6 +21,8 @@ import sys
 import base64
 from datetime import datetime
 
+from page_source import iter_source_elements, find_source_element
+
 
 class WDAClient:
     """WebDriverAgent 客户端"""
@@ -175,6 +177,21 @@ class WDAClient:
             print(f"❌ 获取源码失败: {e}")
         return None
 
+    def iter_source(self, predicate=None):
+        """流式遍历 UI 元素 (边下载边解析，适合大页面)"""
+        return iter_source_elements(self.base_url, predicate)
+
+    def find_source_element(self, predicate):
+        """在 UI 元素树中查找第一个满足条件的元素，找到后立即停止下载"""
+        try:
+            element = find_source_element(self.base_url, predicate)
+            if element:
+                print(f"🔍 找到元素: {element.get('type')} {element.get('name') or element.get('label') or ''}")
+            return element
+        except Exception as e:
+            print(f"❌ 查找元素失败: {e}")
+        return None
+
     def find_element(self, using="accessibility id", value=""):
         """查找元素"""
         payload = {"using": using, "value": value}
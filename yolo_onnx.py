@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+电脑端 YOLO 推理后端 (ONNX Runtime, CPU)
+把视觉计算从手机转移到电脑/服务器，多台设备的帧合并成一次批量推理
+
+依赖: pip install onnxruntime numpy
+
+用法:
+    backend = OnnxYoloBackend("models/yolov8n.onnx", ["person", "car"])
+    for ec in devices:
+        ec.set_yolo_backend(backend)     # 多台设备共享同一个后端
+    ec.yolo_detect(confidence=0.5)       # 返回格式与设备端完全一致
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, List, Any
+
+from PIL import Image
+
+
+class _Request:
+    """一次待推理的请求"""
+
+    def __init__(self, image: Image.Image, confidence: float, max_results: int,
+                 labels: Optional[List[str]], scale: float, offset: tuple):
+        self.image = image
+        self.confidence = confidence
+        self.max_results = max_results
+        self.labels = labels
+        self.scale = scale
+        self.offset = offset
+        self.future: Future = Future()
+
+
+class OnnxYoloBackend:
+    """
+    ONNX Runtime CPU 推理后端
+
+    支持 YOLOv8 (1, 4 + 类别数, N) 和 YOLOv5 (1, N, 5 + 类别数) 两种输出格式。
+    后台线程在 max_wait 时间内收集最多 max_batch 个请求合并推理，
+    模型不支持动态 batch 时逐个推理。
+    """
+
+    def __init__(self, model_path: str, class_labels: Optional[List[str]] = None,
+                 input_size: int = 640, max_batch: int = 8, max_wait: float = 0.01,
+                 iou_threshold: float = 0.45, threads: Optional[int] = None):
+        """
+        Args:
+            model_path: 本地 .onnx 模型路径
+            class_labels: 类别标签，不传时尝试从模型元数据 names 读取
+            input_size: 模型输入边长
+            max_batch: 单次批量推理的最大帧数
+            max_wait: 收集批量请求的最长等待时间（秒）
+            iou_threshold: NMS 的 IoU 阈值
+            threads: ONNX Runtime 线程数，不传使用默认值
+        """
+        import numpy as np
+        import onnxruntime as ort
+
+        self._np = np
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        self.input_size = input_size
+        self.max_batch = max_batch if self.dynamic_batch else 1
+        self.max_wait = max_wait
+        self.iou_threshold = iou_threshold
+        self.class_labels = class_labels or self._labels_from_metadata()
+
+        self.batches = 0
+        self.frames = 0
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def _labels_from_metadata(self) -> List[str]:
+        """从 Ultralytics 导出的模型元数据中读取类别名"""
+        import ast
+
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        if not names:
+            return []
+        try:
+            parsed = ast.literal_eval(names)
+            if isinstance(parsed, dict):
+                return [parsed[k] for k in sorted(parsed)]
+            return list(parsed)
+        except (ValueError, SyntaxError):
+            return []
+
+    # ========== 对外接口 ==========
+
+    def detect(self, image: Image.Image, confidence: float = 0.5, max_results: int = 10,
+               labels: Optional[List[str]] = None, scale: float = 1.0,
+               offset: tuple = (0, 0), timeout: Optional[float] = 30) -> List[Dict]:
+        """
+        检测一帧 (线程安全，多个线程的请求会被合并为批量推理)
+
+        Args:
+            image: RGB 图像 (截图像素)
+            confidence: 置信度阈值
+            max_results: 最大返回数量
+            labels: 只返回这些标签
+            scale: 截图像素 / 点坐标 的比例，结果按点坐标返回
+            offset: image 左上角在整帧中的像素偏移 (区域检测时使用)
+            timeout: 等待结果的超时时间
+
+        Returns:
+            list: 与 /wda/yolo/detect 相同格式的检测结果
+        """
+        request = _Request(image, confidence, max_results, labels, scale, offset)
+        self._queue.put(request)
+        return request.future.result(timeout)
+
+    # ========== 批量推理 ==========
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            try:
+                self._infer(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _letterbox(self, image: Image.Image):
+        """等比缩放并填充到 input_size x input_size，返回 (CHW 数组, 缩放比, 填充)"""
+        np = self._np
+        size = self.input_size
+        ratio = min(size / image.width, size / image.height)
+        w, h = max(1, round(image.width * ratio)), max(1, round(image.height * ratio))
+        pad_x, pad_y = (size - w) // 2, (size - h) // 2
+        canvas = Image.new("RGB", (size, size), (114, 114, 114))
+        canvas.paste(image.convert("RGB").resize((w, h), Image.Resampling.BILINEAR), (pad_x, pad_y))
+        tensor = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return tensor, ratio, (pad_x, pad_y)
+
+    def _infer(self, batch: List[_Request]):
+        np = self._np
+        prepared = [self._letterbox(request.image) for request in batch]
+        inputs = np.stack([p[0] for p in prepared])
+        output = self.session.run(None, {self.input_name: inputs})[0]
+        self.batches += 1
+        self.frames += len(batch)
+        for request, (_, ratio, pad), pred in zip(batch, prepared, output):
+            request.future.set_result(self._postprocess(pred, request, ratio, pad))
+
+    def _postprocess(self, pred, request: _Request, ratio: float, pad: tuple) -> List[Dict]:
+        np = self._np
+        n_labels = len(self.class_labels)
+        # YOLOv8: (4 + nc, N)；YOLOv5: (N, 5 + nc)，第 5 列为目标置信度
+        if n_labels:
+            transposed = pred.shape[0] in (4 + n_labels, 5 + n_labels)
+        else:
+            transposed = pred.shape[0] < pred.shape[1]
+        if transposed:
+            pred = pred.T
+        if n_labels:
+            has_objectness = pred.shape[1] == 5 + n_labels
+        else:
+            has_objectness = not transposed
+        if has_objectness:
+            boxes, scores = pred[:, :4], pred[:, 5:] * pred[:, 4:5]
+        else:
+            boxes, scores = pred[:, :4], pred[:, 4:]
+
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= request.confidence
+        if request.labels:
+            wanted = {label.lower() for label in request.labels}
+            allowed = [i for i, name in enumerate(self.class_labels) if name.lower() in wanted]
+            keep &= np.isin(class_ids, allowed)
+        boxes, class_ids, confidences = boxes[keep], class_ids[keep], confidences[keep]
+        if not len(boxes):
+            return []
+
+        # 中心点格式转左上角格式，并还原到原图像素
+        xy = (boxes[:, :2] - boxes[:, 2:] / 2 - np.array(pad)) / ratio
+        wh = boxes[:, 2:] / ratio
+        rects = np.concatenate([xy, wh], axis=1)
+
+        results = []
+        for i in self._nms(rects, confidences, class_ids)[:request.max_results]:
+            x = (rects[i, 0] + request.offset[0]) / request.scale
+            y = (rects[i, 1] + request.offset[1]) / request.scale
+            w = rects[i, 2] / request.scale
+            h = rects[i, 3] / request.scale
+            class_id = int(class_ids[i])
+            label = self.class_labels[class_id] if class_id < n_labels else str(class_id)
+            results.append({
+                "label": label,
+                "confidence": float(confidences[i]),
+                "x": float(x), "y": float(y),
+                "width": float(w), "height": float(h),
+                "centerX": float(x + w / 2), "centerY": float(y + h / 2),
+            })
+        return results
+
+    def _nms(self, rects, confidences, class_ids) -> List[int]:
+        """按类别做非极大值抑制，返回按置信度排序的保留下标"""
+        np = self._np
+        order = confidences.argsort()[::-1]
+        x1, y1 = rects[:, 0], rects[:, 1]
+        x2, y2 = x1 + rects[:, 2], y1 + rects[:, 3]
+        areas = rects[:, 2] * rects[:, 3]
+        kept: List[int] = []
+        while len(order):
+            i = order[0]
+            kept.append(int(i))
+            rest = order[1:]
+            iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+            ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+            inter = iw * ih
+            overlap = inter / (areas[i] + areas[rest] - inter + 1e-9)
+            order = rest[(overlap < self.iou_threshold) | (class_ids[rest] != class_ids[i])]
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        """批量推理统计"""
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch": self.frames / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+YOLO 多目标跟踪
+每 N 帧 (或画面大幅变化时) 才做一次完整检测，中间帧在电脑端用
+IoU/中心点关联 + 模板微调传播目标框，并为每个目标分配稳定的跟踪 ID
+
+用法:
+    tracker = ObjectTracker(ec, labels=["enemy", "coin"], detect_every=5)
+    while True:
+        for obj in tracker.update():
+            print(obj["trackId"], obj["label"], obj["centerX"], obj["centerY"])
+"""
+
+import math
+from typing import Optional, Dict, List, Tuple
+
+from PIL import Image, ImageChops, ImageStat
+
+from ecwda import ECWDA, Frame
+
+
+Box = Tuple[float, float, float, float]
+
+
+def iou(a: Box, b: Box) -> float:
+    """两个框 (x, y, width, height) 的交并比"""
+    ix = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _center(box: Box) -> Tuple[float, float]:
+    return (box[0] + box[2] / 2, box[1] + box[3] / 2)
+
+
+class Track:
+    """单个跟踪目标"""
+
+    def __init__(self, track_id: int, label: str, box: Box, confidence: float):
+        self.id = track_id
+        self.label = label
+        self.box = box
+        self.confidence = confidence
+        self.velocity = (0.0, 0.0)  # 每帧位移（点）
+        self.anchor = _center(box)   # 上次完整检测时的中心
+        self.anchor_frame = 0        # 上次完整检测时的帧序号
+        self.age = 0
+        self.misses = 0
+        self.detected = True
+        self.template: Optional[Image.Image] = None
+
+    def to_dict(self) -> Dict:
+        """转换为与 yolo_detect 相同格式的字典，附加 trackId 等字段"""
+        x, y, w, h = self.box
+        return {
+            "trackId": self.id,
+            "label": self.label,
+            "confidence": self.confidence,
+            "x": x, "y": y,
+            "width": w, "height": h,
+            "centerX": x + w / 2, "centerY": y + h / 2,
+            "age": self.age,
+            "detected": self.detected,
+        }
+
+
+class ObjectTracker:
+    """
+    检测 + 跟踪
+
+    坐标与 yolo_detect 返回值一致 (点坐标)，模板匹配在按 scale 换算后的截图像素上进行。
+    """
+
+    def __init__(self, ec: ECWDA, labels: Optional[List[str]] = None,
+                 confidence: float = 0.5, detect_every: int = 5,
+                 scene_change_threshold: float = 0.12, iou_threshold: float = 0.3,
+                 max_misses: int = 2, search_margin: int = 24,
+                 work_scale: float = 0.25, scale: Optional[float] = None):
+        """
+        Args:
+            ec: ECWDA 客户端
+            labels: 只跟踪这些标签，不传跟踪全部
+            confidence: 检测置信度阈值
+            detect_every: 每隔多少帧做一次完整检测
+            scene_change_threshold: 画面平均差异 (0-1) 超过该值时立即重新检测
+            iou_threshold: 检测框与跟踪框关联所需的最小 IoU
+            max_misses: 连续多少次完整检测未匹配后丢弃目标
+            search_margin: 模板微调的搜索范围（点）
+            work_scale: 模板匹配时截图的缩放比例，越小越快
+            scale: 截图像素 / 点坐标 的比例，不传时按截图宽度和屏幕宽度自动计算
+        """
+        self.ec = ec
+        self.labels = labels
+        self.confidence = confidence
+        self.detect_every = max(1, detect_every)
+        self.scene_change_threshold = scene_change_threshold
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.search_margin = search_margin
+        self.work_scale = work_scale
+        self.scale = scale
+
+        self.tracks: List[Track] = []
+        self.frames = 0
+        self.detections_run = 0
+        self._next_id = 1
+        self._since_detect = 0
+        self._reference_thumb: Optional[Image.Image] = None
+        self._factor = 1.0
+
+    # ========== 对外接口 ==========
+
+    def update(self, frame: Optional[Frame] = None) -> List[Dict]:
+        """
+        处理一帧，返回当前所有目标
+
+        Args:
+            frame: 使用的帧，不传则重新截图
+
+        Returns:
+            list: 目标列表 (yolo_detect 格式 + trackId / age / detected)
+        """
+        frame = frame or self.ec.get_frame()
+        if frame is None:
+            return []
+        self.frames += 1
+
+        work = self._work_image(frame)
+        thumb = work.resize((32, 32))
+        if (not self.tracks or self._since_detect + 1 >= self.detect_every
+                or self._scene_changed(thumb)):
+            self._detect(work)
+            self._reference_thumb = thumb
+            self._since_detect = 0
+        else:
+            self._propagate(work)
+            self._since_detect += 1
+
+        return [t.to_dict() for t in self.tracks]
+
+    def get(self, track_id: int) -> Optional[Dict]:
+        """按跟踪 ID 获取目标"""
+        for t in self.tracks:
+            if t.id == track_id:
+                return t.to_dict()
+        return None
+
+    def find(self, label: str) -> Optional[Dict]:
+        """获取指定标签中置信度最高的目标"""
+        candidates = [t for t in self.tracks if t.label.lower() == label.lower()]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda t: t.confidence).to_dict()
+
+    def reset(self):
+        """清空所有目标，下一帧重新检测"""
+        self.tracks = []
+        self._since_detect = 0
+        self._reference_thumb = None
+
+    # ========== 内部实现 ==========
+
+    def _pixel_scale(self, frame: Frame) -> float:
+        if self.scale:
+            return self.scale
+        return self.ec.frame_scale(frame)
+
+    def _work_image(self, frame: Frame) -> Image.Image:
+        """缩小后的灰度图，坐标单位为 点 * _factor"""
+        self._factor = self._pixel_scale(frame) * self.work_scale
+        size = (max(1, int(frame.width * self.work_scale)),
+                max(1, int(frame.height * self.work_scale)))
+        return frame.image.convert("L").resize(size, Image.Resampling.BILINEAR)
+
+    def _scene_changed(self, thumb: Image.Image) -> bool:
+        if self._reference_thumb is None:
+            return True
+        diff = ImageStat.Stat(ImageChops.difference(thumb, self._reference_thumb)).mean[0]
+        return diff / 255 > self.scene_change_threshold
+
+    def _crop(self, work: Image.Image, box: Box) -> Optional[Image.Image]:
+        f = self._factor
+        x0, y0 = int(box[0] * f), int(box[1] * f)
+        x1, y1 = int((box[0] + box[2]) * f), int((box[1] + box[3]) * f)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+        if x0 < 0 or y0 < 0 or x1 > work.width or y1 > work.height:
+            return None
+        return work.crop((x0, y0, x1, y1))
+
+    def _detect(self, work: Image.Image):
+        """完整检测并与已有目标关联"""
+        self.detections_run += 1
+        detections = self.ec.yolo_detect(self.confidence, self.ec.yolo_max_results,
+                                         labels=self.labels)
+        boxes = [(float(d["x"]), float(d["y"]), float(d["width"]), float(d["height"]))
+                 for d in detections]
+
+        # 按 IoU 从高到低贪心配对，同标签才能配对
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for di, det in enumerate(detections):
+                if det.get("label", "").lower() != track.label.lower():
+                    continue
+                score = iou(track.box, boxes[di])
+                if score < self.iou_threshold:
+                    # IoU 不足时用中心点距离兜底 (快速移动的小目标)
+                    (tx, ty), (dx, dy) = _center(track.box), _center(boxes[di])
+                    limit = max(track.box[2], track.box[3])
+                    distance = math.hypot(tx - dx, ty - dy)
+                    if distance > limit:
+                        continue
+                    score = self.iou_threshold * (1 - distance / limit) if limit else 0
+                pairs.append((score, ti, di))
+        pairs.sort(reverse=True)
+
+        used_tracks, used_dets = set(), set()
+        for _, ti, di in pairs:
+            if ti in used_tracks or di in used_dets:
+                continue
+            used_tracks.add(ti)
+            used_dets.add(di)
+            track = self.tracks[ti]
+            # 速度按两次检测之间的真实位移和间隔帧数计算 (track.box 已是传播后的位置)
+            (ax, ay), (nx, ny) = track.anchor, _center(boxes[di])
+            elapsed = max(1, self.frames - track.anchor_frame)
+            track.velocity = ((nx - ax) / elapsed, (ny - ay) / elapsed)
+            track.anchor, track.anchor_frame = (nx, ny), self.frames
+            track.box = boxes[di]
+            track.confidence = detections[di].get("confidence", track.confidence)
+            track.misses = 0
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for di, det in enumerate(detections):
+            if di not in used_dets:
+                track = Track(self._next_id, det.get("label", ""),
+                              boxes[di], det.get("confidence", 0.0))
+                track.anchor_frame = self.frames
+                self.tracks.append(track)
+                self._next_id += 1
+
+        for track in self.tracks:
+            track.age += 1
+            track.detected = track.misses == 0
+            if track.detected:
+                track.template = self._crop(work, track.box)
+
+    def _propagate(self, work: Image.Image):
+        """按速度预测位置，再用模板在附近微调"""
+        for track in self.tracks:
+            x, y, w, h = track.box
+            predicted = (x + track.velocity[0], y + track.velocity[1], w, h)
+            refined = self._refine(work, track, predicted)
+            if refined:
+                (ox, oy), (nx, ny) = _center(track.box), _center(refined)
+                track.velocity = (nx - ox, ny - oy)
+                track.box = refined
+            else:
+                track.box = predicted
+            track.age += 1
+            track.detected = False
+
+    def _refine(self, work: Image.Image, track: Track, box: Box) -> Optional[Box]:
+        """
+        在预测位置附近搜索与模板差异 (绝对差之和) 最小的位置
+
+        先在缩小一半的图上搜索整个窗口，再在原尺寸上只检查粗搜结果周围的几个偏移，
+        每个偏移的差异都用 numpy 整块计算
+        """
+        import numpy as np
+
+        template = track.template
+        if template is None:
+            return None
+        f = self._factor
+        tw, th = template.size
+        cx, cy = int(box[0] * f), int(box[1] * f)
+        margin = max(1, int(self.search_margin * f))
+
+        # 搜索窗口裁剪到图像范围内
+        x0, y0 = max(0, cx - margin), max(0, cy - margin)
+        x1, y1 = min(work.width, cx + margin + tw), min(work.height, cy + margin + th)
+        if x1 - x0 < tw or y1 - y0 < th:
+            return None
+        area = np.asarray(work.crop((x0, y0, x1, y1)), dtype=np.int16)
+        tmpl = np.asarray(template, dtype=np.int16)
+        rows, cols = area.shape[0] - th + 1, area.shape[1] - tw + 1
+
+        if min(rows, cols) > 4 and min(tw, th) >= 8:
+            oy, ox = _best_offset(_half(area), _half(tmpl))
+            candidates = [(y, x) for y in range(2 * oy - 1, 2 * oy + 3)
+                          for x in range(2 * ox - 1, 2 * ox + 3)
+                          if 0 <= y < rows and 0 <= x < cols]
+        else:
+            candidates = [(y, x) for y in range(rows) for x in range(cols)]
+        scores = [int(np.abs(area[y:y + th, x:x + tw] - tmpl).sum()) for y, x in candidates]
+        oy, ox = candidates[scores.index(min(scores))]
+        return ((x0 + ox) / f, (y0 + oy) / f, box[2], box[3])
+
+
+def _half(pixels):
+    """2x2 平均缩小 (奇数行列舍去)"""
+    h, w = pixels.shape[0] // 2 * 2, pixels.shape[1] // 2 * 2
+    p = pixels[:h, :w]
+    return (p[0::2, 0::2] + p[1::2, 0::2] + p[0::2, 1::2] + p[1::2, 1::2]) // 4
+
+
+def _best_offset(area, template) -> Tuple[int, int]:
+    """模板在 area 中绝对差之和最小的 (行, 列) 偏移"""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    windows = sliding_window_view(area, template.shape)
+    scores = np.abs(windows - template).sum(axis=(2, 3), dtype=np.int32)
+    return divmod(int(np.argmin(scores)), scores.shape[1])